@@ -11,6 +11,7 @@ from typing import Dict, Any, Optional
 from datetime import datetime, timezone
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langchain_openai import ChatOpenAI
+from mail_normalizer import normalize_mail_body
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +31,8 @@ def summarize_for_llm(mail: Dict[str, Any], max_body_chars: int = 800) -> str:
     subject = mail.get("subject", "No subject")
     sender = mail.get("sender_email") or (mail.get("sender", {}) or {}).get("email") or mail.get("from") or "Unknown"
     received = mail.get("received") or mail.get("datetime_received") or ""
-    body = (mail.get("body") or mail.get("body_text") or "")[:max_body_chars]
+    # Only the message's own content: quoted history, signature and disclaimers are stripped
+    body = normalize_mail_body(mail)[:max_body_chars]
     attachments = mail.get("has_attachments", False)
     convo = mail.get("conversation_id") or ""
     summary = f"From: {sender}\nSubject: {subject}\nReceived: {received}\nConversation: {convo}\nHas attachments: {attachments}\nBody snippet:\n{body}"
@@ -106,30 +106,18 @@ def run_service():
                 # Reload environment variables to get fresh credentials
                 load_dotenv(override=True)
                 
-                # Force reload of ews_tools2 module to pick up new credentials
-                import sys
-                if 'ews_tools2' in sys.modules:
-                    import importlib
-                    import ews_tools2
-                    importlib.reload(ews_tools2)
-                    logger.debug(f"[Iteration {iteration}] Reloaded EWS credentials")
-                    
-                    # Update ews_tools2 globals with fresh credentials from .env
-                    import os
-                    ews_tools2.EWS_EMAIL = os.getenv('EWS_EMAIL')
-                    ews_tools2.EWS_PASSWORD = os.getenv('EWS_PASSWORD')
-                    ews_tools2.EWS_HOST = os.getenv('EWS_HOST')
-                    
-                    # Clear the account config to force reconnection with new credentials
-                    if hasattr(ews_tools2, '_account_config'):
-                        ews_tools2._account_config = None
-                    logger.debug(f"[Iteration {iteration}] Updated EWS credentials: {ews_tools2.EWS_EMAIL}")
+                # Update ews_tools2 globals; the pooled account is only rebuilt if they changed
+                import ews_tools2
+                if ews_tools2.refresh_credentials_from_env():
+                    logger.info(f"[Iteration {iteration}] EWS credentials changed: {ews_tools2.EMAIL}")
                 
                 # Import here to avoid issues if modules aren't ready at startup
                 from action_plans.executor import execute_scheduled_plans
                 
-                # Execute scheduled plans
-                results = execute_scheduled_plans(hands_free=HANDS_FREE)
+                # Execute scheduled plans (background priority: UI requests go first)
+                from ews_throttle import ews_priority
+                with ews_priority("background"):
+                    results = execute_scheduled_plans(hands_free=HANDS_FREE)
                 
                 if results:
                     logger.info(f"[Iteration {iteration}] Executed {len(results)} action plan(s)")
@@ -677,8 +677,10 @@ from duckduckgo_search import DDGS
 # Import EWS functions
 from ews_tools2 import (
     get_unread_batch,
+    get_unread_page,
     read_email,
     mark_as_read,
+    bulk_mark_as_read,
     forward_email,
     ignore_and_mark_read,
     reply_to_email,
@@ -686,6 +688,7 @@ from ews_tools2 import (
     escalate_to_human,
     schedule_meeting_with_check,
     send_ical_invite,
+    find_free_slots,
     set_credentials,
     get_current_time,
     follow_up_thread,
@@ -1040,18 +1043,20 @@ def dynamic_mail_fetch_tool(
         return json.dumps({"error": str(e)})
     
 @tool
-def fetch_email(item_id: str, changekey: str = "", include_thread: bool = False) -> str:
+def fetch_email(item_id: str, changekey: str = "", include_thread: bool = False, include_html: bool = False) -> str:
     """Fetch details of a specific email (optionally include thread). 
     
     Args:
         item_id: The email ID (required)
         changekey: The email changekey (optional, can be empty string if unknown)
         include_thread: Whether to include conversation thread (default: False)
+        include_html: Also return the raw HTML body (default: False; body_text is usually enough)
     
     Note: If you only have item_id, use empty string for changekey.
     """
     try:
-        data = read_email(item_id=item_id, changekey=changekey, include_thread=bool(include_thread))
+        data = read_email(item_id=item_id, changekey=changekey, include_thread=bool(include_thread),
+                          include_html=bool(include_html))
         result = json.dumps(data, indent=2, default=str)
         record_tool_call("fetch_email", {"item_id": item_id, "changekey": changekey, "include_thread": include_thread}, result)
         return result
@@ -1179,6 +1184,47 @@ def schedule_with_check(customer_email: str, start_iso: str, duration_minutes: i
         return f"[Error] {e}"
 
 
+
+@tool
+def find_meeting_slots(start_iso: str = "", days: int = 5, duration_minutes: int = 30,
+                       attendees: str = "", max_slots: int = 5) -> str:
+    """
+    Propose free meeting slots in working hours (9-18, Mon-Fri), checked against our calendar
+    and, optionally, internal attendees' availability.
+
+    Args:
+        start_iso: Earliest start (ISO); defaults to now
+        days: How many days ahead to search
+        duration_minutes: Meeting length
+        attendees: Optional comma-separated emails whose free/busy must also be free
+        max_slots: Number of slots to return
+    """
+    try:
+        attendee_list = [a.strip() for a in attendees.split(",") if a.strip()]
+        slots = find_free_slots(
+            start_iso=start_iso or datetime.now(timezone.utc).isoformat(),
+            days=days,
+            slot_minutes=duration_minutes,
+            max_slots=max_slots,
+            attendees=attendee_list or None,
+            weekdays=[0, 1, 2, 3, 4],
+        )
+        record_tool_call("find_meeting_slots", {"days": days, "attendees": attendee_list}, f"{len(slots)} slots")
+        return json.dumps({"slots": slots})
+    except Exception as e:
+        return f"[Error] {e}"
+
+
+@tool
+def outbox_delivery_status(outbox_id: str) -> str:
+    """Delivery status of a reply/send that was queued in the outbox (queued, sending, sent or failed)."""
+    try:
+        from outbox import outbox_status
+        status = outbox_status(outbox_id.strip())
+        return json.dumps(status or {"error": f"Unknown outbox id {outbox_id}"})
+    except Exception as e:
+        return f"[Error] {e}"
+
 @tool
 def escalate(item_id: str, changekey: str, reason: str) -> str:
     """Escalate an email to a human with a given reason."""
@@ -1201,6 +1247,41 @@ def mark_read(item_id: str, changekey: str, move_to: Optional[str] = None) -> st
         return f"[Error] {e}"
 
 
+@tool
+def bulk_mark_read(item_ids: str, move_to: Optional[str] = None, max_items: int = 200) -> str:
+    """
+    Mark many emails as read (optionally moving them) in one batched operation.
+    Use this instead of repeated mark_read calls when clearing newsletters, notifications or spam.
+
+    Args:
+        item_ids: Comma-separated list of email IDs (changekeys are refreshed automatically)
+        move_to: Optional folder, e.g. "Junk Email" or "Deleted Items"
+        max_items: Safety limit on the number of emails processed (default: 200)
+
+    Returns:
+        JSON string with per-email results and ok/failed counts
+    """
+    try:
+        id_list = [i.strip() for i in item_ids.split(",") if i.strip()]
+        if not id_list:
+            return json.dumps({"error": "No item_ids provided"})
+        id_list = id_list[:max(1, int(max_items))]
+        results = bulk_mark_as_read(id_list, move_to=move_to)
+        ok = sum(1 for r in results if r.get("ok"))
+        response = {
+            "processed": len(results),
+            "ok": ok,
+            "failed": len(results) - ok,
+            "move_to": move_to,
+            "results": results,
+        }
+        record_tool_call("bulk_mark_read", {"count": len(id_list), "move_to": move_to},
+                         f"{ok}/{len(results)} marked read")
+        return json.dumps(response)
+    except Exception as e:
+        return f"[Error] {e}"
+
+
 @tool
 def ignore_spam(item_id: str, changekey: str) -> str:
     """Ignore/spam."""
@@ -1366,51 +1447,45 @@ def auto_handle_email(
         return f"[Error] auto_handle_email failed: {e}"
 
 @tool
-def list_unread_paginated(limit: int = 100, max_pages: int = 10) -> str:
+def list_unread_paginated(limit: int = 100, max_pages: int = 10, cursor: Optional[str] = None) -> str:
     """
-    Fetch all unread emails with pagination support.
+    Fetch unread emails page by page (newest first) without repeats or gaps.
     
     Args:
-        limit: Total maximum emails to fetch
+        limit: Total maximum emails to fetch in this call
         max_pages: Maximum number of pages to fetch (safety limit)
+        cursor: next_cursor from a previous call, to continue where it stopped
     
     Returns:
-        JSON with all unread emails
+        JSON with the unread emails and next_cursor (null when no unread mail is left)
     """
     try:
         all_unread = []
         page_size = 50
         pages_fetched = 0
+        next_cursor = cursor
         
         while len(all_unread) < limit and pages_fetched < max_pages:
             try:
-                # Fetch batch
-                batch_data = get_unread_batch(batch_size=page_size)
-                if not batch_data:
-                    break
-                
-                # Add to results
-                all_unread.extend(batch_data)
-                pages_fetched += 1
-                
-                # If we got fewer than page_size, we've reached the end
-                if len(batch_data) < page_size:
-                    break
-                    
+                page = get_unread_page(page_size=min(page_size, limit - len(all_unread)), cursor=next_cursor)
             except Exception as e:
                 logging.error(f"[list_unread_paginated] Page {pages_fetched} failed: {e}")
                 break
-        
-        # Trim to limit
-        all_unread = all_unread[:limit]
+            
+            all_unread.extend(page["emails"])
+            pages_fetched += 1
+            next_cursor = page["next_cursor"]
+            if not next_cursor:
+                break
         
         result = json.dumps({
             "total_fetched": len(all_unread),
             "pages": pages_fetched,
+            "next_cursor": next_cursor,
             "emails": all_unread
         }, indent=2)
         
-        record_tool_call("list_unread_paginated", {"limit": limit, "max_pages": max_pages}, result)
+        record_tool_call("list_unread_paginated", {"limit": limit, "max_pages": max_pages, "cursor": cursor}, result)
         return result
         
     except Exception as e:
@@ -1728,6 +1803,8 @@ ALL_TOOLS = [
     send_mail_tool,
     send_ics_invite,
     schedule_with_check,
+    find_meeting_slots,
+    outbox_delivery_status,
     draft_html,
     auto_handle_email,
     reply_mail_directly,
@@ -1739,6 +1816,7 @@ ALL_TOOLS = [
     chat_with_human,
     escalate,
     mark_read,
+    bulk_mark_read,
     ignore_spam,
 ]
 
@@ -2367,6 +2445,8 @@ EXECUTION_TOOLS = [
     send_mail_tool,
     send_ics_invite,
     schedule_with_check,
+    find_meeting_slots,
+    outbox_delivery_status,
     draft_html,
     auto_handle_email,
     reply_mail_directly,
@@ -2377,6 +2457,7 @@ EXECUTION_TOOLS = [
     chat_with_human,
     escalate,
     mark_read,
+    bulk_mark_read,
     ignore_spam,
 ]
 
@@ -7,8 +7,10 @@ import os
 import json
 import logging
 import time
-import uuid
+import sqlite3
+import threading
 from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
 from datetime import datetime, timezone as pytz_timezone
 from pathlib import Path
 from react_agent import ReActAgent
@@ -20,7 +22,6 @@ logger = logging.getLogger(__name__)
 STATE_FILE = os.getenv("AUTOPILOT_STATE_FILE", "autopilot_state.json")
 _PROCESSED_MAIL_IDS_FILE = "processed_mails.json"
 AUTOPILOT_MAX_ACTIONS = int(os.getenv("AUTOPILOT_MAX_ACTIONS", "3"))
-LOCK_FILE = "autopilot.lock"  # Execution lock file
 
 # Default autopilot rules
 _DEFAULT_RULES = [
@@ -160,6 +161,20 @@ CRITICAL BUSINESS RULES:
 # Cached ReAct agent instance
 _cached_autopilot_react_agent = None
 
+# Guards against overlapping sweeps of one mailbox inside a process
+# (cross-process work is split by shard leases)
+_sweep_locks: Dict[str, threading.Lock] = {}
+_sweep_locks_guard = threading.Lock()
+AUTOPILOT_MAILBOX_CONCURRENCY = int(os.getenv("AUTOPILOT_MAILBOX_CONCURRENCY", "4"))
+
+# Per-mailbox timestamps of agent runs (for max_actions_per_hour)
+_mailbox_action_times: Dict[str, List[float]] = {}
+
+
+def _get_sweep_lock(mailbox_key: str) -> threading.Lock:
+    with _sweep_locks_guard:
+        return _sweep_locks.setdefault(mailbox_key, threading.Lock())
+
 
 # ============= STATE MANAGEMENT =============
 def _init_state_file_if_missing():
@@ -171,61 +186,196 @@ def _init_state_file_if_missing():
             "processed_ids": [],
             "autohandle_period_minutes": int(os.getenv("AUTOPILOT_PERIOD_MINUTES", "1")),
             "autopilot_rules": _DEFAULT_RULES.copy(),
-            "autopilot_summaries": [],
         }
-        p.write_text(json.dumps(default, indent=2), encoding="utf-8")
+        tmp_path = p.with_name(p.name + ".init.tmp")
+        tmp_path.write_text(json.dumps(default, indent=2), encoding="utf-8")
+        os.replace(tmp_path, p)
+
+
+# Mailbox sweeps run in parallel threads; every read-modify-write of the state file
+# goes through _edit_state() under this lock, and saves replace the file atomically.
+_state_lock = threading.RLock()
+
+# Set on the defaults returned when the state file could not be parsed; such a dict
+# is never written back (it would replace the user's rules with _DEFAULT_RULES)
+_LOAD_FAILED_KEY = "_load_failed"
 
 
 def _load_state() -> Dict[str, Any]:
     """Load autopilot state from file."""
     try:
-        p = Path(STATE_FILE)
-        if not p.exists():
-            _init_state_file_if_missing()
-        data = json.loads(p.read_text(encoding="utf-8"))
+        with _state_lock:
+            p = Path(STATE_FILE)
+            if not p.exists():
+                _init_state_file_if_missing()
+            data = json.loads(p.read_text(encoding="utf-8"))
         if not isinstance(data, dict):
             data = {}
         data.setdefault("pending_followups", [])
         data.setdefault("processed_ids", [])
         data.setdefault("autohandle_period_minutes", int(os.getenv("AUTOPILOT_PERIOD_MINUTES", "1")))
         data.setdefault("autopilot_rules", _DEFAULT_RULES.copy())
-        data.setdefault("autopilot_summaries", [])
         return data
-    except Exception:
+    except Exception as e:
+        logger.warning(f"[autopilot] failed to read state, using defaults (not saved): {e}")
         return {
             "pending_followups": [],
             "processed_ids": [],
             "autohandle_period_minutes": int(os.getenv("AUTOPILOT_PERIOD_MINUTES", "1")),
             "autopilot_rules": _DEFAULT_RULES.copy(),
-            "autopilot_summaries": []
+            _LOAD_FAILED_KEY: True,
         }
 
 
 def _save_state(state: Dict[str, Any]) -> None:
-    """Save autopilot state to file."""
+    """Save autopilot state to file (atomic replace; defaults from a failed read are refused)."""
+    if state.get(_LOAD_FAILED_KEY):
+        logger.warning("[autopilot] not persisting state: it was loaded from defaults after a read error")
+        return
     try:
-        Path(STATE_FILE).write_text(json.dumps(state, indent=2), encoding="utf-8")
+        with _state_lock:
+            tmp_path = f"{STATE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+            Path(tmp_path).write_text(json.dumps(state, indent=2), encoding="utf-8")
+            os.replace(tmp_path, STATE_FILE)
     except Exception as e:
         logger.warning(f"[autopilot] failed to persist state: {e}")
 
 
+@contextmanager
+def _edit_state():
+    """Locked read-modify-write of the state file: `with _edit_state() as st_data: ...`"""
+    with _state_lock:
+        st_data = _load_state()
+        yield st_data
+        _save_state(st_data)
+
+
+# ============= ACTIVITY LOG =============
+_activity_migrated = False
+
+
+def _record_activity(record: Dict[str, Any], rules: Optional[List[str]] = None):
+    """Append a summary record to the autopilot activity log."""
+    try:
+        from ews_tools2 import current_mailbox
+        mailbox = current_mailbox()
+        if mailbox:
+            record.setdefault("mailbox", mailbox.get("email"))
+        from datetime import datetime
+        from zoneinfo import ZoneInfo
+        from autopilot_activity import get_activity_log
+        record.setdefault("time", datetime.now(ZoneInfo("Asia/Kolkata")).isoformat())
+        get_activity_log().append(record, rules=rules)
+    except Exception as e:
+        logger.warning(f"[autopilot] failed to persist summary: {e}")
+
+
+def _log_triage(logs: List[str], mail: Dict[str, Any], route: str, decision: Dict[str, Any]):
+    """Sweep log line and activity record for a mail handled by triage."""
+    subject = mail.get("subject", "No Subject")
+    logs.append(f"[triage:{route}] {subject} ({decision.get('reason', '')})")
+    _record_activity({
+        "subject": subject,
+        "from": mail.get("sender_email") or "",
+        "action": f"triage-{route}",
+        "read_snippet": (mail.get("snippet") or "")[:500],
+        "outgoing_snippet": decision.get("reason", ""),
+    })
+
+
+def get_autopilot_activity(limit: int = 20, cursor: Optional[int] = None, sender: Optional[str] = None,
+                           rule: Optional[str] = None, action: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Page through autopilot activity newest-first.
+    Summaries left in the state file by older versions are moved into the log on first use.
+
+    Returns:
+        Dict with items and next_cursor (pass back as cursor for the next page)
+    """
+    global _activity_migrated
+    from autopilot_activity import get_activity_log
+    activity_log = get_activity_log()
+    if not _activity_migrated:
+        with _state_lock:
+            st_data = _load_state()
+            legacy = st_data.pop("autopilot_summaries", None)
+            if legacy is not None:
+                imported = activity_log.import_records(legacy)
+                _save_state(st_data)
+                logger.info(f"[autopilot] Moved {imported} legacy summaries into the activity log")
+        _activity_migrated = True
+    return activity_log.query(limit=limit, cursor=cursor, sender=sender, rule=rule, action=action)
+
+
 # ============= PROCESSED IDS MANAGEMENT =============
-def _load_processed_ids() -> set:
+# Processed ids live in SQLite (one row per mailbox and id): workers and concurrent
+# mailbox sweeps only ever insert, so nobody can overwrite ids another writer just saved.
+# The JSON files of earlier versions are imported once and renamed to *.migrated.
+PROCESSED_IDS_DB = os.getenv("AUTOPILOT_PROCESSED_DB", "processed_mails.db")
+_processed_migrated: set = set()
+_processed_lock = threading.Lock()
+
+
+def _processed_ids_file(mailbox_id: Optional[str] = None) -> str:
+    """Legacy processed-ID file of a mailbox (the default mailbox keeps the original file name)."""
+    if not mailbox_id:
+        return _PROCESSED_MAIL_IDS_FILE
+    root, ext = os.path.splitext(_PROCESSED_MAIL_IDS_FILE)
+    return f"{root}.{mailbox_id}{ext}"
+
+
+def _processed_db(mailbox_id: Optional[str]) -> sqlite3.Connection:
+    """Connection to the processed-ids database, with the mailbox's legacy file imported."""
+    conn = sqlite3.connect(PROCESSED_IDS_DB, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout=10000")
+    key = mailbox_id or ""
+    with _processed_lock:
+        if key in _processed_migrated:
+            return conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed ("
+            " mailbox TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (mailbox, id))"
+        )
+        legacy = _processed_ids_file(mailbox_id)
+        try:
+            if os.path.exists(legacy):
+                with open(legacy, "r") as f:
+                    ids = [str(i) for i in json.load(f) if i]
+                conn.executemany("INSERT OR IGNORE INTO processed (mailbox, id) VALUES (?, ?)",
+                                 [(key, i) for i in ids])
+                os.replace(legacy, legacy + ".migrated")
+                logger.info(f"[autopilot] Imported {len(ids)} processed mail IDs from {legacy}")
+        except Exception as e:
+            logger.warning(f"[autopilot] Could not import processed mail IDs from {legacy}: {e}")
+        _processed_migrated.add(key)
+    return conn
+
+
+def _load_processed_ids(mailbox_id: Optional[str] = None) -> set:
     """Load set of processed email IDs."""
     try:
-        with open(_PROCESSED_MAIL_IDS_FILE, "r") as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
-    except Exception:
+        conn = _processed_db(mailbox_id)
+        try:
+            rows = conn.execute("SELECT id FROM processed WHERE mailbox=?", (mailbox_id or "",)).fetchall()
+        finally:
+            conn.close()
+        return {r[0] for r in rows}
+    except Exception as e:
+        logger.warning(f"[autopilot] Failed to load processed mail IDs: {e}")
         return set()
 
 
-def _save_processed_ids(ids: set):
-    """Save set of processed email IDs."""
+def _save_processed_ids(ids: set, mailbox_id: Optional[str] = None):
+    """Save set of processed email IDs (merged with IDs saved by other workers)."""
     try:
-        with open(_PROCESSED_MAIL_IDS_FILE, "w") as f:
-            json.dump(list(ids), f, indent=2)
+        conn = _processed_db(mailbox_id)
+        try:
+            conn.executemany("INSERT OR IGNORE INTO processed (mailbox, id) VALUES (?, ?)",
+                             [(mailbox_id or "", i) for i in ids if i])
+        finally:
+            conn.close()
+        ids.update(_load_processed_ids(mailbox_id))
     except Exception as e:
         logger.warning(f"[autopilot] Failed to save processed mail IDs: {e}")
 
@@ -239,9 +389,8 @@ def get_autopilot_rules() -> List[Dict[str, Any]]:
 
 def set_autopilot_rules(rules: List[Dict[str, Any]]):
     """Set autopilot rules."""
-    st_data = _load_state()
-    st_data["autopilot_rules"] = rules
-    _save_state(st_data)
+    with _edit_state() as st_data:
+        st_data["autopilot_rules"] = rules
 
 
 def update_autopilot_rule_by_id(rule_id: str, updates: Dict[str, Any]) -> bool:
@@ -250,29 +399,28 @@ def update_autopilot_rule_by_id(rule_id: str, updates: Dict[str, Any]) -> bool:
     
     Args:
         rule_id: ID of the rule to update
-        updates: Dictionary of fields to update (name, prompt, priority, enabled)
+        updates: Dictionary of fields to update (name, prompt, priority, enabled, keywords)
     
     Returns:
         True if updated successfully, False if rule not found
     """
-    rules = get_autopilot_rules()
-    
-    for rule in rules:
-        if rule.get("id") == rule_id:
-            # Update allowed fields
-            if "name" in updates:
-                rule["name"] = updates["name"]
-            if "prompt" in updates:
-                rule["prompt"] = updates["prompt"]
-            if "priority" in updates:
-                rule["priority"] = int(updates["priority"])
-            if "enabled" in updates:
-                rule["enabled"] = bool(updates["enabled"])
-            
-            # Save updated rules
-            set_autopilot_rules(rules)
-            logger.info(f"[AutopilotRules] Updated rule {rule_id}: {list(updates.keys())}")
-            return True
+    with _edit_state() as st_data:
+        rules = st_data.setdefault("autopilot_rules", _DEFAULT_RULES.copy())
+        for rule in rules:
+            if rule.get("id") == rule_id:
+                # Update allowed fields
+                if "name" in updates:
+                    rule["name"] = updates["name"]
+                if "prompt" in updates:
+                    rule["prompt"] = updates["prompt"]
+                if "priority" in updates:
+                    rule["priority"] = int(updates["priority"])
+                if "enabled" in updates:
+                    rule["enabled"] = bool(updates["enabled"])
+                if "keywords" in updates:
+                    rule["keywords"] = [str(k) for k in (updates["keywords"] or []) if k]
+                logger.info(f"[AutopilotRules] Updated rule {rule_id}: {list(updates.keys())}")
+                return True
     
     logger.warning(f"[AutopilotRules] Rule {rule_id} not found")
     return False
@@ -286,9 +434,8 @@ def get_autopilot_period_minutes() -> int:
 
 def set_autopilot_period_minutes(minutes: int):
     """Set autopilot period in minutes."""
-    st_data = _load_state()
-    st_data["autohandle_period_minutes"] = int(minutes)
-    _save_state(st_data)
+    with _edit_state() as st_data:
+        st_data["autohandle_period_minutes"] = int(minutes)
 
 
 def get_autopilot_service_enabled() -> bool:
@@ -299,9 +446,8 @@ def get_autopilot_service_enabled() -> bool:
 
 def set_autopilot_service_enabled(enabled: bool):
     """Set autopilot service enabled state."""
-    st_data = _load_state()
-    st_data["service_enabled"] = bool(enabled)
-    _save_state(st_data)
+    with _edit_state() as st_data:
+        st_data["service_enabled"] = bool(enabled)
 
 def get_hands_free_mode() -> bool:
     """Get hands-free mode state."""
@@ -311,17 +457,66 @@ def get_hands_free_mode() -> bool:
 
 def set_hands_free_mode(enabled: bool):
     """Set hands-free mode state."""
+    with _edit_state() as st_data:
+        st_data["hands_free_mode"] = bool(enabled)
+
+# ============= TRIAGE CONFIG & COUNTERS =============
+def get_triage_config() -> Dict[str, Any]:
+    """Get pre-agent triage configuration (allow/deny lists, templates, classifier)."""
+    from autopilot_triage import default_triage_config
     st_data = _load_state()
-    st_data["hands_free_mode"] = bool(enabled)
-    _save_state(st_data)
+    cfg = default_triage_config()
+    cfg.update(st_data.get("triage_config") or {})
+    return cfg
+
+
+def set_triage_config(config: Dict[str, Any]):
+    """Set pre-agent triage configuration."""
+    with _edit_state() as st_data:
+        st_data["triage_config"] = config
+
+
+def get_triage_counters() -> Dict[str, int]:
+    """Get cumulative per-route triage counters."""
+    from autopilot_triage import ROUTES
+    counters = _load_state().get("triage_counters") or {}
+    return {route: int(counters.get(route, 0)) for route in ROUTES}
+
+
+def _record_triage_counts(counts: Dict[str, int]):
+    """Add one sweep's per-route counts to the persisted counters."""
+    if not counts:
+        return
+    with _edit_state() as st_data:
+        counters = st_data.get("triage_counters") or {}
+        for route, n in counts.items():
+            counters[route] = int(counters.get(route, 0)) + int(n)
+        st_data["triage_counters"] = counters
+
+
+def get_queue_config() -> Dict[str, Any]:
+    """Get work queue scoring configuration (sender importance, SLA hours, weights)."""
+    from autopilot_queue import default_queue_config
+    cfg = default_queue_config()
+    cfg.update(_load_state().get("queue_config") or {})
+    return cfg
+
+
+def set_queue_config(config: Dict[str, Any]):
+    """Set work queue scoring configuration."""
+    with _edit_state() as st_data:
+        st_data["queue_config"] = config
+
 
-def get_autopilot_react_agent(tools=None):
+def get_autopilot_react_agent(tools=None, user_name: Optional[str] = None, user_email: Optional[str] = None):
     """
     Get or create ReAct agent for autopilot mode.
     
     Args:
         tools: Optional list of tools to use. If None, uses ALL_TOOLS (default).
                Action plan service should pass EXECUTION_TOOLS to prevent plan management.
+        user_name: Identity the agent acts for (default: AGENT_USER_NAME)
+        user_email: Mailbox the agent acts for (default: EWS_EMAIL)
     """
     global _cached_autopilot_react_agent
     
@@ -349,8 +544,8 @@ def get_autopilot_react_agent(tools=None):
     )
     
     # Get user identity from environment
-    user_name = os.getenv("AGENT_USER_NAME", "Sales Team Cyfuture")
-    user_email = os.getenv("EWS_EMAIL", "sales-ai-agent@cyfuture.com")
+    user_name = user_name or os.getenv("AGENT_USER_NAME", "Sales Team Cyfuture")
+    user_email = user_email or os.getenv("EWS_EMAIL", "sales-ai-agent@cyfuture.com")
     
     # Format system prompt with current time and user identity
     formatted_prompt = AUTOPILOT_SYSTEM_PROMPT.format(
@@ -370,7 +565,8 @@ def get_autopilot_react_agent(tools=None):
 
 
 # ============= AUTOPILOT SWEEP =============
-def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool = False, ignore_stop_flag: bool = False) -> List[str]:
+def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool = False, ignore_stop_flag: bool = False,
+                   mailbox: Optional[Dict[str, Any]] = None) -> List[str]:
     """
     Perform one autopilot sweep: fetch emails, apply rules, execute actions.
     
@@ -378,135 +574,298 @@ def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool =
         max_actions: Maximum number of emails to process
         hands_free: If True, can auto-send; if False, save as drafts
         ignore_stop_flag: If True, ignore autopilot_stop.flag (for background service)
+        mailbox: Mailbox from mailbox_registry to sweep (None = EWS_EMAIL mailbox)
     
     Returns:
         List of log strings
     """
+    from ews_tools2 import use_mailbox
+    from ews_throttle import ews_priority
+    with use_mailbox(mailbox), ews_priority("background"):
+        return _autopilot_sweep(max_actions, hands_free, ignore_stop_flag, mailbox)
+
+
+def autopilot_sweep_mailboxes(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool = False,
+                              ignore_stop_flag: bool = False,
+                              mailboxes: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[str]:
+    """
+    Sweep several mailboxes concurrently (AUTOPILOT_MAILBOX_CONCURRENCY at a time).
+
+    Args:
+        mailboxes: Mailboxes to sweep (default: mailbox_registry.get_autopilot_mailboxes())
+
+    Returns:
+        Combined log strings, prefixed with the mailbox address when sweeping more than one
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from mailbox_registry import get_autopilot_mailboxes
+
+    targets = mailboxes if mailboxes is not None else get_autopilot_mailboxes()
+    if len(targets) <= 1:
+        return autopilot_once(max_actions, hands_free, ignore_stop_flag, mailbox=targets[0] if targets else None)
+
+    def _run(mb):
+        try:
+            return autopilot_once(max_actions, hands_free, ignore_stop_flag, mailbox=mb)
+        except Exception as e:
+            logger.exception(f"[autopilot] Sweep failed for {(mb or {}).get('email')}")
+            return [f"[error] {e}"]
+
+    logs = []
+    with ThreadPoolExecutor(max_workers=max(1, AUTOPILOT_MAILBOX_CONCURRENCY),
+                            thread_name_prefix="autopilot-mailbox") as pool:
+        for mb, mb_logs in zip(targets, pool.map(_run, targets)):
+            label = (mb or {}).get("email") or os.getenv("EWS_EMAIL", "default")
+            logs.extend(f"[{label}] {line}" for line in mb_logs)
+    return logs
+
+
+def _mailbox_action_budget(mailbox: Optional[Dict[str, Any]], max_actions: int) -> int:
+    """Agent runs allowed this sweep under the mailbox's max_actions / max_actions_per_hour."""
+    if not mailbox:
+        return max_actions
+    if mailbox.get("max_actions") is not None:
+        max_actions = min(max_actions, int(mailbox["max_actions"]))
+    per_hour = mailbox.get("max_actions_per_hour")
+    if per_hour is not None:
+        cutoff = time.time() - 3600
+        recent = [t for t in _mailbox_action_times.get(mailbox["id"], []) if t >= cutoff]
+        _mailbox_action_times[mailbox["id"]] = recent
+        max_actions = min(max_actions, max(0, int(per_hour) - len(recent)))
+    return max_actions
+
+
+def _autopilot_sweep(max_actions: int, hands_free: bool, ignore_stop_flag: bool,
+                     mailbox: Optional[Dict[str, Any]]) -> List[str]:
+    """Body of autopilot_once; runs inside the mailbox context."""
     from agent_tools import dynamic_mail_fetch_tool, fetch_email, mark_read
     from action_handlers import handle_action, generate_action_from_llm, summarize_for_llm
+    from mail_normalizer import build_thread_context, normalize_mail_body
 
     logs = []
     
-    # CRITICAL FIX: Execution lock to prevent concurrent runs
-    instance_id = str(uuid.uuid4())
-    lock_path = Path(LOCK_FILE)
-    
+    # Lease-based work distribution: this process only handles conversations
+    # in the shards it holds; other workers (processes or nodes) take the rest.
+    from autopilot_perf import SweepPerf
+    from autopilot_queue import queue_file_for
+    from ews_tools2 import current_email
+    mailbox_id = (mailbox or {}).get("id")
+    our_email = current_email()
+    max_actions = _mailbox_action_budget(mailbox, max_actions)
+    if max_actions <= 0:
+        return ["[SKIPPED] Hourly action limit reached for this mailbox"]
+    sweep_lock = _get_sweep_lock(mailbox_id or "")
+    if not sweep_lock.acquire(blocking=False):
+        logger.warning("[autopilot] Another sweep is running in this process, skipping")
+        return ["[SKIPPED] Another autopilot sweep in progress"]
+    perf = SweepPerf(mailbox=mailbox_id)
     try:
-        # Check if another autopilot is already running
-        if lock_path.exists():
-            # Check if lock is stale (older than 10 minutes)
-            age = time.time() - lock_path.stat().st_mtime
-            if age < 600:  # 10 minutes
-                logger.warning(f"[autopilot] Another sweep is running (lock age: {age:.0f}s), skipping")
-                return ["[SKIPPED] Another autopilot sweep in progress"]
-            else:
-                # Stale lock, remove it
-                logger.warning(f"[autopilot] Removing stale lock (age: {age:.0f}s)")
-                lock_path.unlink()
-        
-        # Create new lock with our instance ID
-        lock_path.write_text(instance_id)
-        
-        # Verify we got the lock (race condition check)
-        time.sleep(0.1)
-        if lock_path.read_text() != instance_id:
-            logger.warning("[autopilot] Lock acquired by another process, skipping")
-            return ["[SKIPPED] Lock acquired by another process"]
-        
-        logger.info(f"[autopilot] Acquired execution lock: {instance_id}")
+        from autopilot_leases import acquire_sweep_lease, release_sweep_lease
+        with perf.phase("lease_wait"):
+            lease_mgr = acquire_sweep_lease()
+            owned_shards = lease_mgr.heartbeat()
+        if not owned_shards:
+            release_sweep_lease(lease_mgr)
+            perf.close()
+            sweep_lock.release()
+            logger.warning(f"[autopilot] Worker {lease_mgr.worker_id} holds no shards, skipping")
+            return ["[SKIPPED] No shards leased to this worker"]
+        logger.info(f"[autopilot] Worker {lease_mgr.worker_id} sweeping shards {sorted(owned_shards)}")
     except Exception as e:
-        logger.error(f"[autopilot] Failed to acquire lock: {e}")
-        return ["[ERROR] Failed to acquire execution lock"]
+        perf.close()
+        sweep_lock.release()
+        logger.error(f"[autopilot] Failed to acquire shard leases: {e}")
+        return ["[ERROR] Failed to acquire shard leases"]
     
+    perf_status = "ok"
+    prefetched: Dict[str, Any] = {}
     try:
         logs = []
         state = _load_state()
-        rules = [r for r in state.get("autopilot_rules", _DEFAULT_RULES.copy()) if r.get("enabled")]
-        # Sort rules by priority (1 = highest priority)
-        rules = sorted(rules, key=lambda r: r.get('priority', 999))
+        # Rules are compiled once per change (sorted by priority, strategies precomputed)
+        from autopilot_rules import get_compiled_rules
+        compiled_rules = get_compiled_rules(
+            [r for r in state.get("autopilot_rules", _DEFAULT_RULES.copy()) if r.get("enabled")]
+        )
+        rules = compiled_rules.rules
         
         if not rules:
             logs.append("No rules enabled.")
             return logs
 
         # ============= PROCESS EMAILS =============
-        processed_ids = _load_processed_ids()
+        processed_ids = _load_processed_ids(mailbox_id)
         logger.info(f"[autopilot] Loaded {len(processed_ids)} already-processed email IDs")
 
         # Fetch unread emails
-        try:
-            unread_resp = dynamic_mail_fetch_tool.invoke({"unread": True, "batch_size": 10})
-            unread_data = json.loads(unread_resp)
-            unread = unread_data.get("unread", []) or []
-            logger.info(f"[autopilot] Fetched {len(unread)} unread emails")
-        except Exception as e:
-            logs.append(f"[error] Failed to fetch unread emails: {e}")
-            unread = []
+        with perf.phase("fetch_unread"):
+            try:
+                unread_resp = dynamic_mail_fetch_tool.invoke({"unread": True, "batch_size": 10})
+                unread_data = json.loads(unread_resp)
+                unread = unread_data.get("unread", []) or []
+                logger.info(f"[autopilot] Fetched {len(unread)} unread emails")
+            except Exception as e:
+                logs.append(f"[error] Failed to fetch unread emails: {e}")
+                unread = []
 
-        new_mails = [m for m in unread if m.get("id") not in processed_ids]
+        new_mails = [m for m in unread if m.get("id") not in processed_ids and lease_mgr.owns(m)]
         logger.info(f"[autopilot] After filtering: {len(new_mails)} new emails to process")
 
-        # Determine additional strategies from rule keywords
-        keyword_map = {
-            "follow": "unresponded",
-            "unresponded": "unresponded",
-            "follow-up": "unresponded",
-            "filter": "filtered",
-            "search": "filtered",
-        }
-        strategies_needed = set()
-        for r in rules:
-            prompt = (r.get("prompt") or "").lower()
-            for kw, strat in keyword_map.items():
-                if kw in prompt:
-                    strategies_needed.add(strat)
-        strategies_needed.discard("unread")
+        strategies_needed = compiled_rules.strategies
 
         # Fetch additional mails based on strategies
         for strat in strategies_needed:
-            try:
-                if strat == "unresponded":
-                    resp = dynamic_mail_fetch_tool.invoke({"unresponded": True, "days": 0, "limit": 10, "only_external": True})
-                    data = json.loads(resp)
-                    threads = data.get("unresponded_threads", []) or []
-                    for t in threads:
-                        mid = t.get("last_message_id")
-                        mck = t.get("last_changekey")
-                        subj = t.get("subject") or ""
-                        if mid and mid not in processed_ids:
-                            synthetic = {
-                                "id": mid,
-                                "changekey": mck or "",
-                                "subject": subj,
-                                "sender_email": t.get("customer_email") or "",
-                                "received": t.get("last_message_time") or "",
-                                "conversation_id": t.get("conversation_id") or "",
-                                "from_unresponded": True,
-                            }
-                            if not any(x.get("id") == synthetic["id"] for x in new_mails):
-                                new_mails.append(synthetic)
-                elif strat == "filtered":
-                    resp = dynamic_mail_fetch_tool.invoke({"limit": 50})
-                    data = json.loads(resp)
-                    filtered = data.get("filtered", []) or []
-                    for m in filtered:
-                        if m.get("id") and m.get("id") not in processed_ids and not any(x.get("id") == m.get("id") for x in new_mails):
-                            new_mails.append(m)
-            except Exception as e:
-                logs.append(f"[warn] Strategy '{strat}' failed: {e}")
+            with perf.phase(f"fetch_{strat}"):
+                try:
+                    if strat == "unresponded":
+                        resp = dynamic_mail_fetch_tool.invoke({"unresponded": True, "days": 0, "limit": 10, "only_external": True})
+                        data = json.loads(resp)
+                        threads = data.get("unresponded_threads", []) or []
+                        for t in threads:
+                            mid = t.get("last_message_id")
+                            mck = t.get("last_changekey")
+                            subj = t.get("subject") or ""
+                            if mid and mid not in processed_ids and lease_mgr.owns(t):
+                                synthetic = {
+                                    "id": mid,
+                                    "changekey": mck or "",
+                                    "subject": subj,
+                                    "sender_email": t.get("customer_email") or "",
+                                    "received": t.get("last_message_time") or "",
+                                    "conversation_id": t.get("conversation_id") or "",
+                                    "from_unresponded": True,
+                                }
+                                if not any(x.get("id") == synthetic["id"] for x in new_mails):
+                                    new_mails.append(synthetic)
+                    elif strat == "filtered":
+                        resp = dynamic_mail_fetch_tool.invoke({"limit": 50})
+                        data = json.loads(resp)
+                        filtered = data.get("filtered", []) or []
+                        for m in filtered:
+                            if m.get("id") and m.get("id") not in processed_ids and lease_mgr.owns(m) and not any(x.get("id") == m.get("id") for x in new_mails):
+                                new_mails.append(m)
+                except Exception as e:
+                    logs.append(f"[warn] Strategy '{strat}' failed: {e}")
 
         if not new_mails:
             logs.append("No new unread emails or unresponded threads to process.")
             return logs
 
-        # Build rules context for LLM
-        rules_context = "\n".join([f"- {r['prompt']}" for r in rules if r.get("prompt")])
+        # ============= TRIAGE (no LLM) =============
+        from autopilot_triage import triage_mail, ROUTE_AGENT, ROUTE_MARK_READ, ROUTE_TEMPLATE, MARK_READ_ROUTES
+        triage_cfg = get_triage_config()
+        route_counts: Dict[str, int] = {}
+        agent_mails = []
+        # Mark-read is applied once for the whole sweep after routing (one bulk EWS round trip)
+        pending_read: List[tuple] = []
+        with perf.phase("triage"):
+            for mail in new_mails:
+                decision = triage_mail(mail, triage_cfg, our_email=our_email)
+                route = decision.get("route", ROUTE_AGENT)
+                route_counts[route] = route_counts.get(route, 0) + 1
+                if route == ROUTE_AGENT:
+                    agent_mails.append(mail)
+                    continue
+
+                mail_id = mail.get("id")
+                subject = mail.get("subject", "No Subject")
+                if not lease_mgr.owns(mail):
+                    logs.append(f"[SKIP] Shard moved to another worker: {subject}")
+                    continue
+                if route not in MARK_READ_ROUTES:
+                    # Skip leaves the mail untouched (stays unread for the user); only remembered
+                    _log_triage(logs, mail, route, decision)
+                    if mail_id:
+                        processed_ids.add(mail_id)
+                    continue
+                try:
+                    if route == ROUTE_TEMPLATE and mail_id:
+                        from agent_tools import reply_inline
+                        reply_inline.invoke({
+                            "item_id": mail_id,
+                            "changekey": mail.get("changekey") or "",
+                            "body_html": decision["template"]["reply_html"],
+                            "save_as_draft": not hands_free,
+                        })
+                except Exception as te:
+                    logs.append(f"[warn] Triage action '{route}' failed for {subject}: {te}")
+                    continue
+                if mail_id:
+                    pending_read.append((mail, route, decision))
+
+            # Mark-read-only mails whose shard moved meanwhile are left to the new owner;
+            # template replies already went out, so those are marked read regardless
+            pending_read = [p for p in pending_read if p[1] != ROUTE_MARK_READ or lease_mgr.owns(p[0])]
+            read_results: Dict[str, Dict[str, Any]] = {}
+            if pending_read:
+                from ews_tools2 import bulk_mark_as_read
+                try:
+                    for r in bulk_mark_as_read([m for m, _, _ in pending_read]):
+                        read_results[r["id"]] = r
+                except Exception as be:
+                    logs.append(f"[warn] Bulk mark-read failed: {be}")
+            for mail, route, decision in pending_read:
+                mail_id = mail["id"]
+                subject = mail.get("subject", "No Subject")
+                result = read_results.get(mail_id) or {}
+                if not result.get("ok"):
+                    logs.append(f"[warn] Mark read failed for {subject}: {result.get('error', 'not processed')}")
+                    if route == ROUTE_MARK_READ:
+                        continue
+                _log_triage(logs, mail, route, decision)
+                processed_ids.add(mail_id)
+        _save_processed_ids(processed_ids, mailbox_id)
+        perf.incr("candidates", len(new_mails))
+        perf.incr("triaged", len(new_mails) - len(agent_mails))
+        _record_triage_counts(route_counts)
+        logger.info(f"[autopilot] Triage routes: {route_counts}")
+
+        # ============= WORK QUEUE (scored, carried across sweeps) =============
+        from autopilot_queue import AutopilotWorkQueue
+        with perf.phase("queue"):
+            work_queue = AutopilotWorkQueue(queue_file_for(mailbox_id))
+            work_queue.push(agent_mails)
+            work_queue.prune(processed_ids)
+            # Entries carried from earlier sweeps may have been read or replied to elsewhere
+            try:
+                from ews_tools2 import get_item_states
+                dropped = work_queue.drop_stale(get_item_states(work_queue.ids()))
+                if dropped:
+                    logger.info(f"[autopilot] Dropped {dropped} queued emails read or deleted elsewhere")
+            except Exception as se:
+                logger.warning(f"[autopilot] Could not re-check queued emails: {se}")
+            ranked = [
+                m for m in work_queue.ranked(rules, get_queue_config(), rule_matcher=compiled_rules.matches)
+                if lease_mgr.owns(m)
+            ]
+            work_queue.save()
+        queue_stats = work_queue.stats()
+        perf.incr("queue_depth", queue_stats["depth"])
+        logger.info(f"[autopilot] Work queue depth={queue_stats['depth']} oldest={queue_stats['oldest_item_age_seconds']}s")
+        new_mails = ranked[:max_actions]
+
+        if not new_mails:
+            logs.append("All new emails handled by triage; no agent runs needed.")
+            return logs
+        logs.append(f"[queue] depth={queue_stats['depth']}, processing top {len(new_mails)} by score")
+
+        # ============= PREFETCH (bulk GetItem + batched thread query) =============
+        with perf.phase("prefetch"):
+            try:
+                from ews_tools2 import prefetch_messages_with_threads
+                prefetched = prefetch_messages_with_threads(new_mails)
+                logger.info(f"[autopilot] Prefetched {len(prefetched)} messages with threads")
+            except Exception as pe:
+                logger.warning(f"[autopilot] Prefetch failed, falling back to per-email fetch: {pe}")
+                prefetched = {}
+
+        # Rules context is narrowed per email below (compiled_rules.relevant_rules)
         logs.append("[rules/context] Active natural-language rules:")
         logs.extend([f"  → {r['prompt']}" for r in rules if r.get("prompt")])
 
         # Process emails
         actions_taken = 0
-        for mail in new_mails[:max_actions]:
+        for mail in new_mails:
             # CRITICAL: Check for stop flag at start of each iteration (unless ignored by service)
             if not ignore_stop_flag:
                 from autopilot_control import should_autopilot_stop
@@ -522,6 +881,7 @@ def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool =
             
             # CRITICAL: Double-check email hasn't been processed (safety net)
             if mail_id in processed_ids:
+                work_queue.remove(mail_id)
                 logger.warning(f"[autopilot] Skipping already processed email: {mail_id}")
                 logs.append(f"[SKIP] Already processed: {mail.get('subject', 'No Subject')}")
                 continue
@@ -535,28 +895,31 @@ def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool =
             # Fetch full email with thread
             body = "[No body text]"
             full_mail = None
-            try:
-                if mail_id:
-                    full_mail_json = fetch_email.invoke({"item_id": mail_id, "changekey": changekey or "", "include_thread": True})
-                    full_mail = json.loads(full_mail_json)
-                    if isinstance(full_mail, dict) and full_mail.get("thread"):
-                        parts = []
-                        for t in full_mail.get("thread", [])[:6]:
-                            who = t.get("sender_email") or t.get("sender_name") or "Unknown"
-                            when = t.get("received") or ""
-                            txt = t.get("body_text") or t.get("body_html") or ""
-                            snippet = (txt or "")
-                            parts.append(f"{who} @ {when}:\n{snippet}\n---")
-                        body = "\n".join(parts)
+            with perf.phase("fetch_email"):
+                try:
+                    if mail_id:
+                        full_mail = prefetched.get(mail_id)
+                        if full_mail is None:
+                            full_mail_json = fetch_email.invoke({"item_id": mail_id, "changekey": changekey or "", "include_thread": True})
+                            full_mail = json.loads(full_mail_json)
+                        # Each message contributes only its new content (quotes/signatures stripped)
+                        if isinstance(full_mail, dict) and full_mail.get("thread"):
+                            body = build_thread_context(full_mail.get("thread", []), max_messages=6)
+                        else:
+                            body = normalize_mail_body(full_mail)[:1500] if isinstance(full_mail, dict) else "[No body text]"
+                        mail_summary = summarize_for_llm(full_mail or mail)
                     else:
-                        body = (full_mail.get("body") or full_mail.get("body_text") or "")[:1500] if isinstance(full_mail, dict) else "[No body text]"
-                    mail_summary = summarize_for_llm(full_mail or mail)
-                else:
+                        mail_summary = summarize_for_llm(mail)
+                except Exception as fe:
+                    logger.warning(f"[autopilot] Failed to fetch full email for {subject}: {fe}")
                     mail_summary = summarize_for_llm(mail)
-            except Exception as fe:
-                logger.warning(f"[autopilot] Failed to fetch full email for {subject}: {fe}")
-                mail_summary = summarize_for_llm(mail)
-                body = mail_summary
+                    body = mail_summary
+
+            # Only rules plausibly relevant to this email go into its prompt
+            mail_rules = compiled_rules.relevant_rules(mail, body)
+            rules_context = compiled_rules.format_context(mail_rules)
+            if len(mail_rules) < len(rules):
+                logger.info(f"[autopilot] Using {len(mail_rules)}/{len(rules)} rules for '{subject[:60]}'")
 
             read_snippet = (body or "")[:2000]
             logs.append(f"[read] {subject} -> {read_snippet[:300]}")
@@ -585,8 +948,8 @@ def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool =
             bcc_recipients = full_mail.get("bcc", []) if full_mail else []
             
             # Get user identity from ENV
-            user_name = os.getenv("AGENT_USER_NAME", "Sales Agent")
-            user_email = os.getenv("EWS_EMAIL", "")
+            user_name = (mailbox or {}).get("name") or os.getenv("AGENT_USER_NAME", "Sales Agent")
+            user_email = our_email
             # Extract recipient info
             to_recipients = full_mail.get("to", []) if full_mail else []
             cc_recipients = full_mail.get("cc", []) if full_mail else []
@@ -681,9 +1044,18 @@ def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool =
     Execute the workflow now.
     """
 
+            # Shards can move to another worker during long agent loops; re-check right before acting
+            if not lease_mgr.owns(mail):
+                logs.append(f"[SKIP] Shard moved to another worker: {subject}")
+                continue
+
+            react_agent = None
+            agent_recorded = False
+            agent_started = time.perf_counter()
+            ews_before = perf.ews_requests()
             try:
                 # Get cached ReAct agent
-                react_agent = get_autopilot_react_agent()
+                react_agent = get_autopilot_react_agent(user_name=user_name, user_email=user_email)
             
                 # Run agent with max 15 iterations to prevent infinite loops
                 logs.append(f"[react-agent] Processing '{subject[:60]}'...")
@@ -691,6 +1063,10 @@ def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool =
                     user_input=agent_instruction,
                     max_iterations=15
                 )
+                agent_seconds = time.perf_counter() - agent_started
+                perf.add_email(subject, agent_seconds, react_agent.last_run_stats,
+                               ews_requests=perf.ews_requests() - ews_before)
+                agent_recorded = True
             
                 logs.append(f"[react-completed] {subject}: {final_answer[:200]}")
             
@@ -703,55 +1079,67 @@ def autopilot_once(max_actions: int = AUTOPILOT_MAX_ACTIONS, hands_free: bool =
                     logs.append(f"[action-result] {final_answer[:200]}")
 
                 # Save summary
-                try:
-                    from datetime import datetime
-                    from zoneinfo import ZoneInfo
-                    st_data = _load_state()
-                    summ_list = st_data.get("autopilot_summaries", [])
-                    summary_record = {
-                        "time": datetime.now(ZoneInfo("Asia/Kolkata")).isoformat(),
-                        "subject": subject,
-                        "from": sender,
-                        "action": "react-processed",
-                        "read_snippet": read_snippet,
-                        "outgoing_snippet": (outgoing or ""),
-                    }
-                    summ_list.insert(0, summary_record)
-                    st_data["autopilot_summaries"] = summ_list[:200]
-                    _save_state(st_data)
-                except Exception as se:
-                    logger.warning(f"[autopilot] failed to persist summary: {se}")
+                _record_activity({
+                    "subject": subject,
+                    "from": sender,
+                    "action": "react-processed",
+                    "read_snippet": read_snippet,
+                    "outgoing_snippet": (outgoing or ""),
+                }, rules=[r.get("id") for r in mail_rules])
 
                 actions_taken += 1
+                if mailbox:
+                    _mailbox_action_times.setdefault(mailbox["id"], []).append(time.time())
 
                 # Mark as read
-                try:
-                    if changekey and mail_id:
-                        mark_read.invoke({"item_id": mail_id, "changekey": changekey})
-                        logs.append(f"[marked-read] {subject}")
-                except Exception as mark_err:
-                    logs.append(f"[warn] Failed to mark as read: {mark_err}")
+                with perf.phase("mark_read"):
+                    try:
+                        if changekey and mail_id:
+                            mark_read.invoke({"item_id": mail_id, "changekey": changekey})
+                            logs.append(f"[marked-read] {subject}")
+                    except Exception as mark_err:
+                        logs.append(f"[warn] Failed to mark as read: {mark_err}")
 
                 # CRITICAL FIX: Save processed ID IMMEDIATELY after processing each email
                 if mail_id:
                     processed_ids.add(mail_id)
-                    _save_processed_ids(processed_ids)  # Save NOW, not at end
+                    _save_processed_ids(processed_ids, mailbox_id)  # Save NOW, not at end
                     logger.info(f"[autopilot] Marked {mail_id} as processed and saved")
+                    work_queue.remove(mail_id)
+                    work_queue.save()
 
             except Exception as e:
                 logs.append(f"[error] {e}")
+                if not agent_recorded:
+                    perf.add_email(subject, time.perf_counter() - agent_started,
+                                   getattr(react_agent, "last_run_stats", None),
+                                   ews_requests=perf.ews_requests() - ews_before, status="error")
+                if mail_id:
+                    work_queue.mark_attempt(mail_id)
+                    work_queue.save()
 
         time.sleep(1.0)
 
         # Final save (redundant but safe)
-        _save_processed_ids(processed_ids)
+        _save_processed_ids(processed_ids, mailbox_id)
         return logs
     
+    except Exception:
+        perf_status = "error"
+        raise
+
     finally:
-        # Always release lock
         try:
-            if lock_path.exists() and lock_path.read_text() == instance_id:
-                lock_path.unlink()
-                logger.info(f"[autopilot] Released execution lock: {instance_id}")
-        except Exception as unlock_err:
-            logger.error(f"[autopilot] Failed to release lock: {unlock_err}")
\ No newline at end of file
+            from ews_tools2 import clear_prefetch_cache
+            clear_prefetch_cache(list(prefetched.keys()))
+        except Exception:
+            pass
+
+        # Structured timing record for the Performance views
+        try:
+            perf.finish(perf_status)
+        except Exception as pe:
+            logger.warning(f"[autopilot] Failed to record sweep performance: {pe}")
+
+        release_sweep_lease(lease_mgr)
+        sweep_lock.release()
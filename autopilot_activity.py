@@ -0,0 +1,194 @@
+"""
+autopilot_activity.py
+Fixed-size activity log for autopilot actions.
+
+Records live in a small SQLite database instead of the autopilot state file:
+    - append is a single INSERT (plus a cheap trim once the ring is full)
+    - rows are indexed by id/time, sender and action for the UIs
+    - queries page newest-first with an opaque cursor (the last row id seen)
+
+The log keeps the most recent AUTOPILOT_ACTIVITY_CAPACITY records.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_DB = os.getenv("AUTOPILOT_ACTIVITY_DB", "autopilot_activity.db")
+ACTIVITY_CAPACITY = int(os.getenv("AUTOPILOT_ACTIVITY_CAPACITY", "5000"))
+ACTIVITY_MAX_PAGE = 200
+
+
+def _record_ts(record: Dict[str, Any]) -> float:
+    """UNIX time of a record from its 'ts' or ISO 'time' field (now if neither parses)."""
+    if record.get("ts"):
+        return float(record["ts"])
+    try:
+        return datetime.fromisoformat(record.get("time") or "").timestamp()
+    except Exception:
+        return time.time()
+
+
+class ActivityLog:
+    """Ring-buffer activity store with cursor pagination and filters."""
+
+    def __init__(self, db_path: str = ACTIVITY_DB, capacity: int = ACTIVITY_CAPACITY):
+        self.db_path = db_path
+        self.capacity = max(1, capacity)
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS activity ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL, sender TEXT, action TEXT, "
+                "rules TEXT, subject TEXT, record TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_activity_ts ON activity(ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_activity_sender ON activity(sender)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_activity_action ON activity(action)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ----- writes -----
+    def append(self, record: Dict[str, Any], rules: Optional[List[str]] = None) -> int:
+        """
+        Append one activity record and trim the ring. Returns the new record id.
+
+        Args:
+            record: Summary dict (time, subject, from, action, read_snippet, outgoing_snippet, ...)
+            rules: IDs of the rules applied to this email (for the rule filter)
+        """
+        rule_ids = [r for r in (rules or record.get("rules") or []) if r]
+        record = dict(record, rules=rule_ids)
+        with self._lock:
+            conn = self._connect()
+            try:
+                cur = conn.execute(
+                    "INSERT INTO activity (ts, sender, action, rules, subject, record) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        _record_ts(record),
+                        (record.get("from") or "").lower(),
+                        record.get("action") or "",
+                        "," + ",".join(rule_ids) + "," if rule_ids else "",
+                        record.get("subject") or "",
+                        json.dumps(record, default=str),
+                    ),
+                )
+                new_id = cur.lastrowid
+                # Ids are monotonic, so the ring boundary is a primary-key range delete
+                if new_id > self.capacity:
+                    conn.execute("DELETE FROM activity WHERE id <= ?", (new_id - self.capacity,))
+                conn.commit()
+                return new_id
+            finally:
+                conn.close()
+
+    # ----- reads -----
+    def query(
+        self,
+        limit: int = 20,
+        cursor: Optional[int] = None,
+        sender: Optional[str] = None,
+        rule: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Page through activity newest-first.
+
+        Args:
+            limit: Page size (capped at ACTIVITY_MAX_PAGE)
+            cursor: Return records older than this id (next_cursor of the previous page)
+            sender: Case-insensitive substring of the sender
+            rule: Rule id applied to the email
+            action: Exact action name (e.g. "react-processed", "triage-mark_read")
+            since: Only records newer than this UNIX timestamp
+
+        Returns:
+            Dict with items (list of records, each with its id) and next_cursor (None at the end)
+        """
+        limit = max(1, min(int(limit or 20), ACTIVITY_MAX_PAGE))
+        where, params = [], []
+        if cursor:
+            where.append("id < ?")
+            params.append(int(cursor))
+        if sender:
+            where.append("sender LIKE ?")
+            params.append(f"%{sender.lower()}%")
+        if rule:
+            where.append("rules LIKE ?")
+            params.append(f"%,{rule},%")
+        if action:
+            where.append("action = ?")
+            params.append(action)
+        if since:
+            where.append("ts >= ?")
+            params.append(float(since))
+        sql = "SELECT id, record FROM activity"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        items = []
+        for row_id, raw in rows[:limit]:
+            try:
+                rec = json.loads(raw)
+            except Exception:
+                rec = {}
+            rec["id"] = row_id
+            items.append(rec)
+        next_cursor = items[-1]["id"] if len(rows) > limit and items else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def count(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM activity").fetchone()[0]
+        finally:
+            conn.close()
+
+    def import_records(self, records: List[Dict[str, Any]]) -> int:
+        """Import legacy records given newest-first (as stored in autopilot_summaries)."""
+        imported = 0
+        for rec in reversed(records or []):
+            try:
+                self.append(rec)
+                imported += 1
+            except Exception as e:
+                logger.warning(f"[activity] Failed to import record: {e}")
+        return imported
+
+
+_activity_log: Optional[ActivityLog] = None
+
+
+def get_activity_log() -> ActivityLog:
+    """Process-wide activity log."""
+    global _activity_log
+    if _activity_log is None:
+        _activity_log = ActivityLog()
+    return _activity_log
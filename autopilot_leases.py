@@ -0,0 +1,297 @@
+"""
+autopilot_leases.py
+Lease-based work distribution for running several autopilot workers.
+
+Conversations are hashed into AUTOPILOT_SHARDS shards. Each worker process
+registers in a shared SQLite database, heartbeats every few seconds and claims
+an even share of shards through short leases. A crashed worker's leases expire
+after AUTOPILOT_LEASE_TTL seconds and its shards are picked up by the others.
+
+Workers on different nodes can cooperate by pointing AUTOPILOT_LEASE_DB at
+shared storage.
+
+Only autopilot_service joins the pool (join_lease_pool). Manual sweeps from the
+UIs take one-shot leases on shards no live worker holds and release them when
+the sweep ends (acquire_sweep_lease / release_sweep_lease).
+"""
+
+import os
+import math
+import time
+import uuid
+import socket
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+LEASE_DB = os.getenv("AUTOPILOT_LEASE_DB", "autopilot_leases.db")
+NUM_SHARDS = int(os.getenv("AUTOPILOT_SHARDS", "8"))
+LEASE_TTL = float(os.getenv("AUTOPILOT_LEASE_TTL", "15"))
+HEARTBEAT_INTERVAL = max(1.0, LEASE_TTL / 3)
+
+
+def shard_of(mail: Dict[str, Any], num_shards: int = NUM_SHARDS) -> int:
+    """Stable shard of a mail, keyed by conversation (falls back to item id)."""
+    key = mail.get("conversation_id") or mail.get("id") or ""
+    digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % num_shards
+
+
+class LeaseManager:
+    """Registers this process as a worker and keeps leases on its shards."""
+
+    def __init__(self, db_path: str = LEASE_DB, num_shards: int = NUM_SHARDS,
+                 ttl: float = LEASE_TTL, worker_id: Optional[str] = None):
+        self.db_path = db_path
+        self.num_shards = num_shards
+        self.ttl = ttl
+        self.worker_id = worker_id or os.getenv("AUTOPILOT_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._owned: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._init_db()
+
+    # ----- storage -----
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                "worker_id TEXT PRIMARY KEY, hostname TEXT, pid INTEGER, heartbeat_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shard_leases ("
+                "shard INTEGER PRIMARY KEY, worker_id TEXT, expires_at REAL)"
+            )
+        finally:
+            conn.close()
+
+    # ----- lease cycle -----
+    def heartbeat(self) -> Set[int]:
+        """
+        Refresh this worker's registration, renew its leases and rebalance shards.
+        Returns the set of shards currently owned.
+        """
+        now = time.time()
+        expires = now + self.ttl
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO workers (worker_id, hostname, pid, heartbeat_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at=excluded.heartbeat_at",
+                (self.worker_id, socket.gethostname(), os.getpid(), now),
+            )
+            conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - self.ttl,))
+            live = conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0] or 1
+            target = math.ceil(self.num_shards / live)
+
+            conn.execute("UPDATE shard_leases SET expires_at=? WHERE worker_id=?", (expires, self.worker_id))
+            owned = [r[0] for r in conn.execute(
+                "SELECT shard FROM shard_leases WHERE worker_id=? ORDER BY shard", (self.worker_id,))]
+
+            # Release surplus shards so newly joined workers get a share
+            while len(owned) > target:
+                shard = owned.pop()
+                conn.execute("DELETE FROM shard_leases WHERE shard=? AND worker_id=?", (shard, self.worker_id))
+
+            # Claim unowned or expired shards up to the target share
+            if len(owned) < target:
+                taken = {r[0]: (r[1], r[2]) for r in conn.execute(
+                    "SELECT shard, worker_id, expires_at FROM shard_leases")}
+                for shard in range(self.num_shards):
+                    if len(owned) >= target:
+                        break
+                    holder = taken.get(shard)
+                    if holder is None or holder[1] < now:
+                        conn.execute(
+                            "INSERT INTO shard_leases (shard, worker_id, expires_at) VALUES (?, ?, ?) "
+                            "ON CONFLICT(shard) DO UPDATE SET worker_id=excluded.worker_id, expires_at=excluded.expires_at",
+                            (shard, self.worker_id, expires),
+                        )
+                        owned.append(shard)
+            conn.execute("COMMIT")
+        except Exception as e:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            logger.warning(f"[leases] Heartbeat failed for {self.worker_id}: {e}")
+            with self._lock:
+                self._owned = set()
+            return set()
+        finally:
+            conn.close()
+
+        with self._lock:
+            if set(owned) != self._owned:
+                logger.info(f"[leases] {self.worker_id} owns shards {sorted(owned)} (live workers: {live})")
+            self._owned = set(owned)
+            return set(self._owned)
+
+    def owned_shards(self) -> Set[int]:
+        with self._lock:
+            return set(self._owned)
+
+    def owns(self, mail: Dict[str, Any]) -> bool:
+        """True if this worker currently holds the lease for the mail's shard."""
+        return shard_of(mail, self.num_shards) in self.owned_shards()
+
+    def release(self):
+        """Give up all leases and deregister (on clean shutdown)."""
+        self.stop_heartbeat()
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM shard_leases WHERE worker_id=?", (self.worker_id,))
+            conn.execute("DELETE FROM workers WHERE worker_id=?", (self.worker_id,))
+        except Exception as e:
+            logger.warning(f"[leases] Release failed for {self.worker_id}: {e}")
+        finally:
+            conn.close()
+        with self._lock:
+            self._owned = set()
+
+    # ----- background heartbeat -----
+    def start_heartbeat(self):
+        """Heartbeat in a daemon thread so leases survive long agent runs and idle sleeps."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.is_set():
+                self.heartbeat()
+                self._stop.wait(HEARTBEAT_INTERVAL)
+
+        self._thread = threading.Thread(target=_loop, name="autopilot-lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=HEARTBEAT_INTERVAL + 1)
+            self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        """Snapshot of workers and shard owners for dashboards."""
+        conn = self._connect()
+        try:
+            workers = [
+                {"worker_id": r[0], "hostname": r[1], "pid": r[2], "heartbeat_at": r[3]}
+                for r in conn.execute("SELECT worker_id, hostname, pid, heartbeat_at FROM workers")
+            ]
+            leases = {
+                r[0]: {"worker_id": r[1], "expires_at": r[2]}
+                for r in conn.execute("SELECT shard, worker_id, expires_at FROM shard_leases")
+            }
+        finally:
+            conn.close()
+        return {"num_shards": self.num_shards, "ttl": self.ttl, "workers": workers, "leases": leases}
+
+
+class OneShotLease(LeaseManager):
+    """
+    Leases held for the duration of a sweep by a process outside the worker pool
+    (the Streamlit "Run now" button, the Flask manual run). It does not register as
+    a worker, so the pool's share computation ignores it; it only takes shards no
+    live worker holds and hands them back when the sweep ends.
+    """
+
+    def heartbeat(self) -> Set[int]:
+        now = time.time()
+        expires = now + self.ttl
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE shard_leases SET expires_at=? WHERE worker_id=?", (expires, self.worker_id))
+            taken = {r[0]: (r[1], r[2]) for r in conn.execute(
+                "SELECT shard, worker_id, expires_at FROM shard_leases")}
+            owned = []
+            for shard in range(self.num_shards):
+                holder = taken.get(shard)
+                if holder is not None and holder[0] == self.worker_id:
+                    owned.append(shard)
+                elif holder is None or holder[1] < now:
+                    conn.execute(
+                        "INSERT INTO shard_leases (shard, worker_id, expires_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(shard) DO UPDATE SET worker_id=excluded.worker_id, expires_at=excluded.expires_at",
+                        (shard, self.worker_id, expires),
+                    )
+                    owned.append(shard)
+            conn.execute("COMMIT")
+        except Exception as e:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            logger.warning(f"[leases] One-shot claim failed for {self.worker_id}: {e}")
+            owned = []
+        finally:
+            conn.close()
+        with self._lock:
+            self._owned = set(owned)
+            return set(self._owned)
+
+
+_lease_manager: Optional[LeaseManager] = None
+_one_shot: Optional[OneShotLease] = None
+_one_shot_users = 0
+_manager_lock = threading.Lock()
+
+
+def join_lease_pool() -> LeaseManager:
+    """Register this process as a pool worker with a running heartbeat (autopilot_service only)."""
+    global _lease_manager
+    with _manager_lock:
+        if _lease_manager is None:
+            _lease_manager = LeaseManager()
+            _lease_manager.heartbeat()
+            _lease_manager.start_heartbeat()
+        return _lease_manager
+
+
+def get_lease_manager() -> Optional[LeaseManager]:
+    """This process's pool worker, or None if it never joined the pool."""
+    with _manager_lock:
+        return _lease_manager
+
+
+def acquire_sweep_lease() -> LeaseManager:
+    """
+    Leases for one sweep: the pool worker when this process joined the pool,
+    otherwise a one-shot claim shared by the process's concurrent sweeps.
+    Pair every call with release_sweep_lease().
+    """
+    global _one_shot, _one_shot_users
+    with _manager_lock:
+        if _lease_manager is not None:
+            return _lease_manager
+        if _one_shot is None:
+            _one_shot = OneShotLease()
+            _one_shot.heartbeat()
+            _one_shot.start_heartbeat()
+        _one_shot_users += 1
+        return _one_shot
+
+
+def release_sweep_lease(manager: LeaseManager) -> None:
+    """End a sweep's use of its leases; one-shot claims are released with the last sweep."""
+    global _one_shot, _one_shot_users
+    with _manager_lock:
+        if manager is not _one_shot:
+            return
+        _one_shot_users -= 1
+        if _one_shot_users > 0:
+            return
+        _one_shot = None
+    manager.release()
@@ -0,0 +1,199 @@
+"""
+autopilot_perf.py
+Per-sweep performance records for the autopilot.
+
+Each autopilot_once run fills a SweepPerf with phase timings (lease wait,
+fetch per strategy, triage, queue, prefetch, agent runs, mark-read), agent
+counters (LLM calls, tokens, tool calls) and the number of EWS requests issued.
+Finished records are appended as one compact JSON line to a time-series file
+that keeps the most recent AUTOPILOT_PERF_MAX_RECORDS sweeps.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+PERF_FILE = os.getenv("AUTOPILOT_PERF_FILE", "autopilot_perf.jsonl")
+PERF_MAX_RECORDS = int(os.getenv("AUTOPILOT_PERF_MAX_RECORDS", "2000"))
+
+_file_lock = threading.Lock()
+
+
+def _begin_ews_scope():
+    try:
+        from ews_tools2 import begin_ews_request_scope
+        return begin_ews_request_scope()
+    except Exception:
+        return [0], None
+
+
+def _end_ews_scope(token):
+    if token is None:
+        return
+    try:
+        from ews_tools2 import end_ews_request_scope
+        end_ews_request_scope(token)
+    except Exception:
+        pass
+
+
+class SweepPerf:
+    """Collects timings and counters for one autopilot sweep."""
+
+    def __init__(self, mailbox: Optional[str] = None):
+        self.mailbox = mailbox
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        # EWS requests are counted per sweep context, not process-wide: mailbox
+        # sweeps run concurrently and would otherwise count each other's requests
+        self._ews_counter, self._ews_token = _begin_ews_scope()
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.emails: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block; repeated phases with the same name accumulate."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - started)
+
+    def ews_requests(self) -> int:
+        """EWS requests issued by this sweep so far (diff two readings for a block)."""
+        return self._ews_counter[0]
+
+    def incr(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_email(self, subject: str, agent_seconds: float, run_stats: Optional[Dict[str, Any]] = None,
+                  ews_requests: int = 0, status: str = "ok"):
+        """Record one agent-processed email with the agent's run stats."""
+        stats = run_stats or {}
+        self.emails.append({
+            "subject": (subject or "")[:80],
+            "status": status,
+            "agent_s": round(agent_seconds, 3),
+            "llm_calls": stats.get("llm_calls", 0),
+            "llm_s": round(stats.get("llm_seconds", 0.0), 3),
+            "prompt_tokens": stats.get("prompt_tokens", 0),
+            "completion_tokens": stats.get("completion_tokens", 0),
+            "tool_calls": stats.get("tool_calls", 0),
+            "tool_s": round(stats.get("tool_seconds", 0.0), 3),
+            "tools": {k: {"calls": v.get("calls", 0), "s": round(v.get("seconds", 0.0), 3)}
+                      for k, v in (stats.get("tools") or {}).items()},
+            "ews_requests": ews_requests,
+        })
+        for key in ("llm_calls", "prompt_tokens", "completion_tokens", "tool_calls"):
+            self.incr(key, int(stats.get(key, 0) or 0))
+
+    def to_record(self, status: str = "ok") -> Dict[str, Any]:
+        return {
+            "ts": round(self.started_at, 3),
+            "status": status,
+            "mailbox": self.mailbox,
+            "total_s": round(time.perf_counter() - self._t0, 3),
+            "phases": {k: round(v, 3) for k, v in self.phases.items()},
+            "counters": dict(self.counters, ews_requests=self._ews_counter[0]),
+            "emails": self.emails,
+        }
+
+    def finish(self, status: str = "ok") -> Dict[str, Any]:
+        """Build the record and append it to the time-series file."""
+        record = self.to_record(status)
+        self.close()
+        append_perf_record(record)
+        return record
+
+    def close(self):
+        """Stop counting EWS requests for this sweep (finish() does this too)."""
+        token, self._ews_token = self._ews_token, None
+        _end_ews_scope(token)
+
+
+# ============= STORAGE =============
+def append_perf_record(record: Dict[str, Any], filepath: str = PERF_FILE):
+    """Append one record; rewrite the file keeping the newest records once it grows past 2x the cap."""
+    line = json.dumps(record, separators=(",", ":"), default=str)
+    with _file_lock:
+        try:
+            with open(filepath, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            if _needs_trim(filepath):
+                lines = _read_lines(filepath)[-PERF_MAX_RECORDS:]
+                tmp = filepath + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.writelines(lines)
+                os.replace(tmp, filepath)
+        except Exception as e:
+            logger.warning(f"[perf] Failed to persist sweep record: {e}")
+
+
+def _read_lines(filepath: str) -> List[str]:
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            return f.readlines()
+    except FileNotFoundError:
+        return []
+
+
+_line_counts: Dict[str, int] = {}
+
+
+def _needs_trim(filepath: str) -> bool:
+    """Track appended lines per file; only count the file once per process."""
+    if filepath not in _line_counts:
+        _line_counts[filepath] = len(_read_lines(filepath))
+    else:
+        _line_counts[filepath] += 1
+    if _line_counts[filepath] > PERF_MAX_RECORDS * 2:
+        _line_counts[filepath] = PERF_MAX_RECORDS
+        return True
+    return False
+
+
+def get_perf_records(limit: int = 100, since: Optional[float] = None,
+                     filepath: str = PERF_FILE) -> List[Dict[str, Any]]:
+    """Most recent sweep records, oldest first (for charts)."""
+    records = []
+    for line in _read_lines(filepath)[-max(1, int(limit)):]:
+        try:
+            rec = json.loads(line)
+        except Exception:
+            continue
+        if since and rec.get("ts", 0) < since:
+            continue
+        records.append(rec)
+    return records
+
+
+def summarize_perf(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregates over sweep records: averages, p95 sweep time and per-phase means."""
+    if not records:
+        return {"sweeps": 0}
+    totals = sorted(r.get("total_s", 0.0) for r in records)
+    phase_sums: Dict[str, float] = {}
+    for r in records:
+        for k, v in (r.get("phases") or {}).items():
+            phase_sums[k] = phase_sums.get(k, 0.0) + v
+    emails = [e for r in records for e in (r.get("emails") or [])]
+    counters = [r.get("counters") or {} for r in records]
+    return {
+        "sweeps": len(records),
+        "avg_sweep_s": round(sum(totals) / len(totals), 3),
+        "p95_sweep_s": round(totals[min(len(totals) - 1, int(len(totals) * 0.95))], 3),
+        "avg_phase_s": {k: round(v / len(records), 3) for k, v in sorted(phase_sums.items())},
+        "emails": len(emails),
+        "avg_agent_s": round(sum(e.get("agent_s", 0.0) for e in emails) / len(emails), 3) if emails else 0.0,
+        "llm_calls": sum(c.get("llm_calls", 0) for c in counters),
+        "tokens": sum(c.get("prompt_tokens", 0) + c.get("completion_tokens", 0) for c in counters),
+        "tool_calls": sum(c.get("tool_calls", 0) for c in counters),
+        "ews_requests": sum(c.get("ews_requests", 0) for c in counters),
+    }
@@ -0,0 +1,286 @@
+"""
+autopilot_queue.py
+Scored, persistent work queue for autopilot agent runs.
+
+Mails that survive triage are enqueued and ranked by:
+    - priority of the best matching autopilot rule (1 = highest; rules without one
+      count as DEFAULT_RULE_PRIORITY)
+    - sender / domain importance (configured weights)
+    - message age (older mail gains score so nothing starves)
+    - SLA deadline (received + SLA hours; overdue mail jumps the queue)
+
+Unprocessed items are carried across sweeps until handled, read or deleted
+elsewhere (drop_stale), dropped after too many failed attempts, or expired.
+"""
+
+import os
+import json
+import logging
+from typing import List, Dict, Any, Optional, Callable
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Workers sharing a directory need distinct AUTOPILOT_WORKER_ID values to keep separate queues
+_WORKER_ID = os.getenv("AUTOPILOT_WORKER_ID", "")
+QUEUE_FILE = os.getenv(
+    "AUTOPILOT_QUEUE_FILE",
+    f"autopilot_queue_{_WORKER_ID}.json" if _WORKER_ID else "autopilot_queue.json",
+)
+QUEUE_MAX_ATTEMPTS = int(os.getenv("AUTOPILOT_QUEUE_MAX_ATTEMPTS", "3"))
+QUEUE_MAX_AGE_DAYS = int(os.getenv("AUTOPILOT_QUEUE_MAX_AGE_DAYS", "14"))
+# Neutral (medium) priority for rules that do not set one, e.g. the built-in defaults
+DEFAULT_RULE_PRIORITY = 2
+
+# Default scoring configuration (stored under "queue_config" in the autopilot state)
+_DEFAULT_QUEUE_CONFIG = {
+    # Score added per priority level above 4 (priority 1 -> 3 * weight)
+    "rule_weight": 10.0,
+    # {"ceo@bigcorp.com": 20, "@bigcorp.com": 10}
+    "sender_importance": {},
+    # Score per hour waiting (capped at age_cap_hours)
+    "age_weight_per_hour": 0.5,
+    "age_cap_hours": 72,
+    # SLA in hours; per-sender/domain overrides use the same keys as sender_importance
+    "default_sla_hours": 24,
+    "sla_hours": {},
+    "sla_weight": 20.0,
+}
+
+
+def default_queue_config() -> Dict[str, Any]:
+    """Return a fresh copy of the default queue scoring configuration."""
+    import copy
+    return copy.deepcopy(_DEFAULT_QUEUE_CONFIG)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _lookup_sender(table: Dict[str, Any], sender_email: str) -> Optional[Any]:
+    """Look up a sender in a table keyed by full address or '@domain' (address wins)."""
+    s = (sender_email or "").lower()
+    if not s or not table:
+        return None
+    lowered = {k.lower(): v for k, v in table.items()}
+    if s in lowered:
+        return lowered[s]
+    if "@" in s:
+        domain = "@" + s.rsplit("@", 1)[-1]
+        if domain in lowered:
+            return lowered[domain]
+    return None
+
+
+def _rule_matches(rule: Dict[str, Any], mail: Dict[str, Any]) -> bool:
+    """Cheap keyword check: rule 'keywords' (or significant name words) in subject/snippet."""
+    text = f"{mail.get('subject') or ''} {mail.get('snippet') or ''}".lower()
+    keywords = rule.get("keywords") or [w for w in (rule.get("name") or "").lower().split() if len(w) > 4]
+    return any(k.lower() in text for k in keywords if k)
+
+
+def _queued_unread(mail: Dict[str, Any]) -> bool:
+    """
+    True if the mail was unread when queued: unread-listing entries carry no is_read,
+    filtered ones carry it; unresponded-thread entries may legitimately be read.
+    """
+    if "is_read" in mail:
+        return mail.get("is_read") is False
+    return not mail.get("from_unresponded")
+
+
+def score_mail(
+    mail: Dict[str, Any],
+    rules: List[Dict[str, Any]],
+    config: Optional[Dict[str, Any]] = None,
+    now: Optional[datetime] = None,
+    rule_matcher: Optional[Callable[[Dict[str, Any], Dict[str, Any]], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Score a mail for the work queue.
+
+    Returns:
+        Dict with total score, its components, matched rule priority and SLA deadline
+    """
+    cfg = config or _DEFAULT_QUEUE_CONFIG
+    now = now or datetime.now(timezone.utc)
+    matcher = rule_matcher or _rule_matches
+    sender = mail.get("sender_email") or ""
+
+    matched = [int(r.get("priority") or DEFAULT_RULE_PRIORITY) for r in rules if matcher(r, mail)]
+    best_priority = min(matched) if matched else None
+    rule_score = max(0, 4 - best_priority) * float(cfg.get("rule_weight", 10.0)) if best_priority else 0.0
+
+    sender_score = float(_lookup_sender(cfg.get("sender_importance") or {}, sender) or 0.0)
+
+    received = _parse_time(mail.get("received")) or _parse_time(mail.get("enqueued_at")) or now
+    age_hours = max(0.0, (now - received).total_seconds() / 3600.0)
+    age_score = min(age_hours, float(cfg.get("age_cap_hours", 72))) * float(cfg.get("age_weight_per_hour", 0.5))
+
+    sla_hours = _lookup_sender(cfg.get("sla_hours") or {}, sender)
+    sla_hours = float(sla_hours if sla_hours is not None else cfg.get("default_sla_hours", 24))
+    hours_left = sla_hours - age_hours
+    sla_weight = float(cfg.get("sla_weight", 20.0))
+    if hours_left <= 0:
+        sla_score = sla_weight * 2
+    else:
+        sla_score = sla_weight / max(hours_left, 1.0)
+
+    total = rule_score + sender_score + age_score + sla_score
+    return {
+        "score": round(total, 3),
+        "rule_priority": best_priority,
+        "components": {
+            "rule": round(rule_score, 3),
+            "sender": round(sender_score, 3),
+            "age": round(age_score, 3),
+            "sla": round(sla_score, 3),
+        },
+        "sla_deadline_hours_left": round(hours_left, 2),
+    }
+
+
+class AutopilotWorkQueue:
+    """File-backed priority queue of mails awaiting an agent run."""
+
+    def __init__(self, filepath: str = QUEUE_FILE):
+        self.filepath = Path(filepath)
+        self._items: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            if self.filepath.exists():
+                data = json.loads(self.filepath.read_text(encoding="utf-8"))
+                if isinstance(data, dict):
+                    return data.get("items", {}) or {}
+        except Exception as e:
+            logger.warning(f"[queue] Failed to load work queue: {e}")
+        return {}
+
+    def save(self):
+        """Persist the queue with an atomic write."""
+        try:
+            tmp = self.filepath.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"items": self._items}, indent=2, default=str), encoding="utf-8")
+            tmp.replace(self.filepath)
+        except Exception as e:
+            logger.warning(f"[queue] Failed to persist work queue: {e}")
+
+    def push(self, mails: List[Dict[str, Any]]) -> int:
+        """Enqueue mails that are not already queued. Returns number added."""
+        added = 0
+        now_iso = datetime.now(timezone.utc).isoformat()
+        for mail in mails or []:
+            mid = mail.get("id")
+            if not mid:
+                continue
+            if mid in self._items:
+                # Refresh metadata (e.g. a newer changekey) but keep queue history
+                self._items[mid]["mail"] = mail
+                continue
+            self._items[mid] = {"mail": mail, "enqueued_at": now_iso, "attempts": 0}
+            added += 1
+        return added
+
+    def prune(self, processed_ids: set) -> int:
+        """Drop processed, over-attempted and expired items. Returns number removed."""
+        now = datetime.now(timezone.utc)
+        removed = 0
+        for mid in list(self._items.keys()):
+            entry = self._items[mid]
+            enq = _parse_time(entry.get("enqueued_at")) or now
+            expired = (now - enq).total_seconds() > QUEUE_MAX_AGE_DAYS * 86400
+            if mid in processed_ids or entry.get("attempts", 0) >= QUEUE_MAX_ATTEMPTS or expired:
+                del self._items[mid]
+                removed += 1
+        return removed
+
+    def ids(self) -> List[str]:
+        return list(self._items.keys())
+
+    def drop_stale(self, states: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Drop items removed, or read since they were queued, elsewhere.
+        states: get_item_states() result (id -> changekey/is_read; missing = gone).
+        Items changed otherwise (category, flag, move) stay queued under their new changekey.
+        """
+        removed = 0
+        for mid in list(self._items.keys()):
+            state = states.get(mid)
+            mail = self._items[mid]["mail"]
+            if state is None or (state.get("is_read") and _queued_unread(mail)):
+                del self._items[mid]
+                removed += 1
+            elif state.get("changekey"):
+                mail["changekey"] = state["changekey"]
+        return removed
+
+    def ranked(self, rules: List[Dict[str, Any]], config: Optional[Dict[str, Any]] = None,
+               rule_matcher: Optional[Callable] = None) -> List[Dict[str, Any]]:
+        """Return queued mails ordered by descending score (score details under '_queue')."""
+        now = datetime.now(timezone.utc)
+        scored = []
+        for mid, entry in self._items.items():
+            mail = dict(entry["mail"])
+            mail.setdefault("enqueued_at", entry.get("enqueued_at"))
+            details = score_mail(mail, rules, config, now=now, rule_matcher=rule_matcher)
+            mail["_queue"] = dict(details, attempts=entry.get("attempts", 0))
+            scored.append(mail)
+        scored.sort(key=lambda m: m["_queue"]["score"], reverse=True)
+        return scored
+
+    def mark_attempt(self, mail_id: str):
+        if mail_id in self._items:
+            self._items[mail_id]["attempts"] = self._items[mail_id].get("attempts", 0) + 1
+
+    def remove(self, mail_id: str):
+        self._items.pop(mail_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and age of the oldest item (seconds)."""
+        now = datetime.now(timezone.utc)
+        oldest = 0.0
+        for entry in self._items.values():
+            received = _parse_time(entry["mail"].get("received")) or _parse_time(entry.get("enqueued_at"))
+            if received:
+                oldest = max(oldest, (now - received).total_seconds())
+        return {"depth": len(self._items), "oldest_item_age_seconds": int(oldest)}
+
+
+def queue_file_for(mailbox_id: Optional[str] = None) -> str:
+    """Queue file of a mailbox (the default mailbox uses QUEUE_FILE)."""
+    if not mailbox_id:
+        return QUEUE_FILE
+    root, ext = os.path.splitext(QUEUE_FILE)
+    return f"{root}_{mailbox_id}{ext}"
+
+
+def get_queue_stats(mailbox_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Depth and oldest-item age of a mailbox's persisted work queue. Without mailbox_id,
+    totals over the default queue and every registry mailbox (per-queue figures under "mailboxes").
+    """
+    if mailbox_id:
+        return AutopilotWorkQueue(queue_file_for(mailbox_id)).stats()
+    per_mailbox = {"default": AutopilotWorkQueue().stats()}
+    try:
+        from mailbox_registry import list_mailboxes
+        for mb in list_mailboxes():
+            per_mailbox[mb["id"]] = AutopilotWorkQueue(queue_file_for(mb["id"])).stats()
+    except Exception as e:
+        logger.warning(f"[queue] Could not read mailbox registry: {e}")
+    return {
+        "depth": sum(s["depth"] for s in per_mailbox.values()),
+        "oldest_item_age_seconds": max(s["oldest_item_age_seconds"] for s in per_mailbox.values()),
+        "mailboxes": per_mailbox,
+    }
@@ -0,0 +1,235 @@
+"""
+autopilot_rules.py
+Compiled autopilot rule set.
+
+Rules are compiled once per change (keyed by a hash of the enabled rules) into a
+CompiledRuleSet holding:
+    - the extra fetch strategies the rules ask for (unresponded / filtered)
+    - the full rules context used in agent prompts
+    - a per-rule applicability predicate (keywords, or always-on)
+    - optional rule embeddings for a semantic relevance check
+
+Each email's prompt then carries only the rules plausibly relevant to it.
+Rules without keywords are always included, and if nothing matches the full
+rule set is used, so prefiltering never leaves the agent without guidance.
+"""
+
+import os
+import re
+import math
+import json
+import hashlib
+import logging
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+RULE_EMBEDDINGS_ENABLED = os.getenv("AUTOPILOT_RULE_EMBEDDINGS", "false").lower() == "true"
+RULE_EMBEDDING_THRESHOLD = float(os.getenv("AUTOPILOT_RULE_EMBEDDING_THRESHOLD", "0.45"))
+
+# Prompt keywords that require fetching beyond the unread inbox
+_STRATEGY_KEYWORDS = {
+    "follow": "unresponded",
+    "unresponded": "unresponded",
+    "follow-up": "unresponded",
+    "filter": "filtered",
+    "search": "filtered",
+}
+
+# Applicability keywords for the builtin rules (custom rules may set "keywords").
+# Matched as whole words (an optional plural "s" is allowed); sign-off words such as
+# "regards" or "thanks" are left out because nearly every signature contains them.
+_BUILTIN_RULE_KEYWORDS = {
+    "internal_greet": ["thank you", "greeting", "wishes", "congratulations", "congrats", "happy", "welcome",
+                       "festival"],
+    "external_interest": ["demo", "pricing", "price", "quote", "meeting", "call", "collaboration", "collaborate",
+                          "partner", "partnership", "interested", "proposal", "inquiry", "enquiry"],
+    "pricing_queries": ["pricing", "price", "cost", "quote", "plan", "product", "specification", "spec",
+                        "feature", "server", "cloud", "gpu", "storage", "hosting", "license"],
+    "spam_filter": ["newsletter", "unsubscribe", "webinar", "promotion", "offer", "no-reply", "noreply",
+                    "notification", "digest"],
+}
+
+# Builtin rules that apply to every mail fetched via the unresponded strategy
+_UNRESPONDED_RULES = {"followups"}
+
+
+def _rules_key(rules: List[Dict[str, Any]]) -> str:
+    payload = json.dumps(
+        [{k: r.get(k) for k in ("id", "prompt", "priority", "keywords", "enabled")} for r in rules],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _keyword_pattern(keywords: List[str]) -> Optional["re.Pattern"]:
+    """Whole-word matcher for keywords (optional trailing 's'); None when there are none."""
+    kws = [k.lower() for k in keywords if k]
+    if not kws:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(k) for k in kws) + r")s?\b")
+
+
+def _mail_text(mail: Dict[str, Any], extra: str = "") -> str:
+    parts = [
+        mail.get("subject") or "",
+        mail.get("snippet") or "",
+        mail.get("sender_email") or "",
+        extra or "",
+    ]
+    return " ".join(parts).lower()
+
+
+class CompiledRuleSet:
+    """Enabled rules sorted by priority, with strategies and relevance predicates precomputed."""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        enabled = [r for r in rules or [] if r.get("enabled", True)]
+        self.rules: List[Dict[str, Any]] = sorted(enabled, key=lambda r: r.get("priority", 999))
+        self.key = _rules_key(self.rules)
+
+        strategies = set()
+        for r in self.rules:
+            prompt = (r.get("prompt") or "").lower()
+            for kw, strat in _STRATEGY_KEYWORDS.items():
+                if kw in prompt:
+                    strategies.add(strat)
+        strategies.discard("unread")
+        self.strategies = strategies
+
+        self.rules_context = self.format_context(self.rules)
+
+        # rule id -> lowercase keywords; empty list means "always applicable"
+        self._keywords: Dict[str, List[str]] = {}
+        for r in self.rules:
+            kws = r.get("keywords")
+            if kws is None:
+                kws = _BUILTIN_RULE_KEYWORDS.get(r.get("id"), [])
+            self._keywords[self._rule_id(r)] = [k.lower() for k in kws if k]
+        self._patterns: Dict[str, Optional["re.Pattern"]] = {
+            rid: _keyword_pattern(kws) for rid, kws in self._keywords.items()
+        }
+
+        self._embeddings: Optional[Dict[str, List[float]]] = None
+
+    # ----- helpers -----
+    @staticmethod
+    def _rule_id(rule: Dict[str, Any]) -> str:
+        return rule.get("id") or rule.get("name") or rule.get("prompt", "")[:40]
+
+    @staticmethod
+    def format_context(rules: List[Dict[str, Any]]) -> str:
+        return "\n".join([f"- {r['prompt']}" for r in rules if r.get("prompt")])
+
+    # ----- predicates -----
+    def matches(self, rule: Dict[str, Any], mail: Dict[str, Any], text: Optional[str] = None) -> bool:
+        """
+        Keyword applicability of one rule to a mail.
+        Follow-up rules match mails found by the unresponded strategy; rules without
+        keywords fall back to significant words of their name (used for queue scoring,
+        they are always-on in relevant_rules).
+        """
+        rid = self._rule_id(rule)
+        if rid in _UNRESPONDED_RULES:
+            return bool(mail.get("from_unresponded"))
+        pattern = self._patterns.get(rid)
+        if pattern is None:
+            keywords = [k for k in (rule.get("keywords") or []) if k]
+            if not keywords:
+                keywords = [w for w in (rule.get("name") or "").lower().split() if len(w) > 4]
+            pattern = _keyword_pattern(keywords)
+            if pattern is None:
+                return False
+            self._patterns[rid] = pattern
+        text = text if text is not None else _mail_text(mail)
+        return pattern.search(text) is not None
+
+    def _is_always_on(self, rule: Dict[str, Any]) -> bool:
+        rid = self._rule_id(rule)
+        return rid not in _UNRESPONDED_RULES and not self._keywords.get(rid)
+
+    # ----- embeddings (optional) -----
+    def _ensure_embeddings(self, embed) -> Dict[str, List[float]]:
+        if self._embeddings is None:
+            texts = [f"{r.get('name', '')}: {r.get('prompt', '')}" for r in self.rules]
+            vecs = embed(texts) if texts else []
+            self._embeddings = {self._rule_id(r): _normalize(v) for r, v in zip(self.rules, vecs)}
+            logger.info(f"[rules] Embedded {len(self._embeddings)} rules for relevance filtering")
+        return self._embeddings
+
+    def _semantic_matches(self, text: str) -> set:
+        embed = _get_embedder()
+        if embed is None or not text.strip():
+            return set()
+        rule_vecs = self._ensure_embeddings(embed)
+        vec = _normalize(embed([text[:1000]])[0])
+        return {
+            rid for rid, rv in rule_vecs.items()
+            if sum(a * b for a, b in zip(vec, rv)) >= RULE_EMBEDDING_THRESHOLD
+        }
+
+    # ----- selection -----
+    def relevant_rules(self, mail: Dict[str, Any], body_text: str = "") -> List[Dict[str, Any]]:
+        """
+        Rules plausibly relevant to a mail, in priority order.
+
+        Always-on rules are kept; keyword rules are kept when they match the subject,
+        snippet, sender or body; with AUTOPILOT_RULE_EMBEDDINGS=true a rule also
+        matches when its embedding is close enough to the mail. Falls back to all rules.
+        """
+        text = _mail_text(mail, (body_text or "")[:4000])
+        semantic = set()
+        if RULE_EMBEDDINGS_ENABLED:
+            try:
+                semantic = self._semantic_matches(text)
+            except Exception as e:
+                logger.warning(f"[rules] Embedding relevance check failed, using keywords only: {e}")
+
+        selected = [
+            r for r in self.rules
+            if self._is_always_on(r) or self.matches(r, mail, text) or self._rule_id(r) in semantic
+        ]
+        if not any(not self._is_always_on(r) for r in selected):
+            # No specific rule matched: let the agent evaluate the full set
+            return list(self.rules)
+        return selected
+
+
+def _normalize(vec: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+def _get_embedder():
+    """Return an embed(texts) callable backed by the RAG embeddings client, or None."""
+    try:
+        import rag_backend as rb
+        client = getattr(rb, "oai_client", None)
+    except Exception:
+        return None
+    if client is None:
+        return None
+    model = os.getenv("EMBEDDING_MODEL", "bge-m3")
+
+    def _embed(texts: List[str]) -> List[List[float]]:
+        resp = client.embeddings.create(model=model, input=texts)
+        return [d.embedding for d in resp.data]
+
+    return _embed
+
+
+_compiled: Optional[CompiledRuleSet] = None
+
+
+def get_compiled_rules(rules: List[Dict[str, Any]]) -> CompiledRuleSet:
+    """Return the compiled rule set, recompiling only when the enabled rules changed."""
+    global _compiled
+    enabled = sorted([r for r in rules or [] if r.get("enabled", True)], key=lambda r: r.get("priority", 999))
+    key = _rules_key(enabled)
+    if _compiled is None or _compiled.key != key:
+        _compiled = CompiledRuleSet(enabled)
+        logger.info(
+            f"[rules] Compiled {len(_compiled.rules)} rules "
+            f"(strategies: {sorted(_compiled.strategies) or 'none'})"
+        )
+    return _compiled
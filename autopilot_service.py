@@ -12,6 +12,11 @@ Configuration via environment variables:
     AUTOPILOT_SERVICE_INTERVAL: Check interval in seconds (default: 300)
     AUTOPILOT_SERVICE_HANDS_FREE: Enable hands-free mode (default: false)
     AUTOPILOT_SERVICE_LOG_LEVEL: Logging level (default: INFO)
+    AUTOPILOT_MAILBOXES: Mailboxes to sweep from ews_accounts.json: active, all or ids (default: EWS_EMAIL only)
+    AUTOPILOT_MAILBOX_CONCURRENCY: Mailboxes swept in parallel (default: 4)
+    AUTOPILOT_WORKER_ID: Stable worker name when running several workers (optional)
+    AUTOPILOT_SHARDS / AUTOPILOT_LEASE_TTL / AUTOPILOT_LEASE_DB: Shard lease settings
+    AUTOPILOT_PROCESSED_DB: Processed mail IDs shared by all workers (default: processed_mails.db)
 """
 
 import os
@@ -97,10 +102,9 @@ def is_service_enabled() -> bool:
 def update_last_run_timestamp():
     """Update the last run timestamp in state file"""
     try:
-        from autopilot import _load_state, _save_state
-        state = _load_state()
-        state["service_last_run"] = datetime.now(ZoneInfo("Asia/Kolkata")).isoformat()
-        _save_state(state)
+        from autopilot import _edit_state
+        with _edit_state() as state:
+            state["service_last_run"] = datetime.now(ZoneInfo("Asia/Kolkata")).isoformat()
     except Exception as e:
         logging.getLogger(__name__).warning(f"Failed to update last run timestamp: {e}")
 
@@ -124,6 +128,21 @@ def run_service():
     except Exception as e:
         logger.warning(f"Could not clear stop flag: {e}")
     
+    # Resume delivery of sends queued before the last shutdown
+    try:
+        from outbox import OUTBOX_ENABLED, get_outbox
+        if OUTBOX_ENABLED:
+            logger.info(f"Outbox sender started: {get_outbox().stats()['counts']}")
+    except Exception as e:
+        logger.warning(f"Could not start outbox sender: {e}")
+    
+    # Join the shard lease pool (manual UI sweeps only take one-shot leases)
+    try:
+        from autopilot_leases import join_lease_pool
+        logger.info(f"Joined shard lease pool as {join_lease_pool().worker_id}")
+    except Exception as e:
+        logger.warning(f"Could not join shard lease pool: {e}")
+    
     # Register signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
@@ -166,27 +185,21 @@ def run_service():
                 else:
                     logger.warning(f"[Iteration {iteration}] EWS credentials not found in .env")
                 
-                # Update ews_tools2 runtime globals with fresh credentials
+                # Update ews_tools2 runtime globals; the pooled account is only rebuilt if they changed
                 try:
                     import ews_tools2
-                    ews_tools2.EMAIL = os.getenv("EWS_EMAIL", "")
-                    ews_tools2.PASSWORD = os.getenv("EWS_PASSWORD", "")
-                    ews_tools2.EXCHANGE_HOST = os.getenv("EWS_HOST", "")
-                    
-                    # Clear cached account to force reconnection with new credentials
-                    ews_tools2._account = None
-                    ews_tools2._account_config = None
-                    
-                    logger.debug(f"[Iteration {iteration}] EWS credentials reloaded from .env")
+                    if ews_tools2.refresh_credentials_from_env():
+                        logger.info(f"[Iteration {iteration}] EWS credentials changed in .env")
                 except Exception as cred_err:
                     logger.warning(f"[Iteration {iteration}] Failed to update EWS runtime globals: {cred_err}")
                 
                 # Import here to avoid issues if modules aren't ready at startup
-                from autopilot import autopilot_once, AUTOPILOT_MAX_ACTIONS
+                from autopilot import autopilot_sweep_mailboxes, AUTOPILOT_MAX_ACTIONS
                 
-                # Execute autopilot sweep (ignore stop flag - service has its own control)
+                # Execute autopilot sweep over the configured mailboxes (AUTOPILOT_MAILBOXES)
+                # (ignore stop flag - service has its own control)
                 max_actions = AUTOPILOT_MAX_ACTIONS
-                logs = autopilot_once(max_actions=max_actions, hands_free=HANDS_FREE, ignore_stop_flag=True)
+                logs = autopilot_sweep_mailboxes(max_actions=max_actions, hands_free=HANDS_FREE, ignore_stop_flag=True)
                 
                 if logs:
                     logger.info(f"[Iteration {iteration}] Autopilot processed {len(logs)} item(s)")
@@ -219,6 +232,16 @@ def run_service():
         return 1
     
     finally:
+        # Hand shard leases to the remaining workers right away
+        try:
+            from autopilot_leases import get_lease_manager
+            lease_mgr = get_lease_manager()
+            if lease_mgr is not None:
+                lease_mgr.release()
+                logger.info("Released autopilot shard leases")
+        except Exception as lease_err:
+            logger.warning(f"Failed to release shard leases: {lease_err}")
+
         logger.info("=" * 60)
         logger.info("Autopilot Service Stopped")
         if last_execution_time:
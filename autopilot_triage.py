@@ -0,0 +1,274 @@
+"""
+autopilot_triage.py
+Cheap pre-classification of incoming mail before the autopilot ReAct agent runs.
+
+Every candidate email is routed to one of:
+    skip       - leave the mail untouched (own mail, deny-listed senders, internal CCs)
+    mark_read  - mark read without any LLM call (auto-replies, bounces, newsletters)
+    template   - send a canned reply from the configured templates, then mark read
+    agent      - full ReAct agent run (default)
+
+Routing uses header heuristics first, then sender allow/deny lists, and finally an
+optional embedding classifier over the subject and the first lines of the body.
+"""
+
+import os
+import math
+import hashlib
+import logging
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+ROUTE_SKIP = "skip"
+ROUTE_MARK_READ = "mark_read"
+ROUTE_TEMPLATE = "template"
+ROUTE_AGENT = "agent"
+ROUTES = (ROUTE_SKIP, ROUTE_MARK_READ, ROUTE_TEMPLATE, ROUTE_AGENT)
+# Routes whose mails are marked read after triage; skipped mails are left untouched
+MARK_READ_ROUTES = (ROUTE_MARK_READ, ROUTE_TEMPLATE)
+
+_BOUNCE_SENDERS = ("mailer-daemon", "postmaster", "microsoftexchange")
+_BOUNCE_SUBJECTS = ("undeliverable:", "delivery status notification", "mail delivery failed", "returned mail:")
+_AUTO_REPLY_SUBJECTS = ("automatic reply:", "auto reply:", "autoreply:", "out of office", "ooo:")
+
+# Default triage configuration (stored under "triage_config" in the autopilot state)
+_DEFAULT_TRIAGE_CONFIG = {
+    "enabled": True,
+    # Emails ("a@b.com") or domains ("@b.com") always sent to the agent
+    "allow_senders": [],
+    # Emails or domains never handled by the autopilot
+    "deny_senders": [],
+    # Our own domains; mails from these where we are only CC'd are skipped
+    "internal_domains": [],
+    # Canned replies: {"id", "subject_contains": [...], "reply_html"}
+    "templates": [],
+    # Optional embedding classifier: {"enabled", "threshold", "examples": {route: [texts]}}
+    "classifier": {
+        "enabled": False,
+        "threshold": 0.80,
+        "examples": {},
+    },
+}
+
+
+def default_triage_config() -> Dict[str, Any]:
+    """Return a fresh copy of the default triage configuration."""
+    import copy
+    return copy.deepcopy(_DEFAULT_TRIAGE_CONFIG)
+
+
+# ============= HELPERS =============
+def _sender_matches(sender_email: str, entries: List[str]) -> bool:
+    """Match a sender against a list of full addresses or '@domain' entries."""
+    s = (sender_email or "").lower().strip()
+    if not s:
+        return False
+    for entry in entries or []:
+        e = (entry or "").lower().strip()
+        if not e:
+            continue
+        if e.startswith("@"):
+            if s.endswith(e):
+                return True
+        elif "@" not in e:
+            if s.endswith("@" + e):
+                return True
+        elif s == e:
+            return True
+    return False
+
+
+def _domain_of(email: str) -> str:
+    return (email or "").lower().rsplit("@", 1)[-1] if "@" in (email or "") else ""
+
+
+def _header_reason(headers: Dict[str, str], sender_email: str, subject: str) -> Optional[str]:
+    """Return a reason string if the headers identify automated mail, else None."""
+    h = {k.lower(): (v or "").lower() for k, v in (headers or {}).items()}
+    sender_l = (sender_email or "").lower()
+    subject_l = (subject or "").lower().strip()
+
+    auto_submitted = h.get("auto-submitted", "").strip()
+    if auto_submitted and auto_submitted != "no":
+        return f"auto-submitted: {auto_submitted}"
+    if h.get("x-autoreply") or h.get("x-autorespond"):
+        return "auto-reply header"
+    if any(subject_l.startswith(p) for p in _AUTO_REPLY_SUBJECTS):
+        return "auto-reply subject"
+
+    local_part = sender_l.split("@", 1)[0]
+    if any(local_part.startswith(b) for b in _BOUNCE_SENDERS):
+        return "bounce sender"
+    if "multipart/report" in h.get("content-type", ""):
+        return "delivery report"
+    if any(subject_l.startswith(p) for p in _BOUNCE_SUBJECTS):
+        return "bounce subject"
+
+    if h.get("precedence", "").strip() in ("bulk", "list", "junk"):
+        return f"precedence: {h.get('precedence').strip()}"
+    if h.get("list-unsubscribe") or h.get("list-id"):
+        return "mailing list"
+    return None
+
+
+def _match_template(templates: List[Dict[str, Any]], subject: str, snippet: str) -> Optional[Dict[str, Any]]:
+    """Return the first template whose keywords appear in the subject or snippet."""
+    text = f"{subject or ''}\n{snippet or ''}".lower()
+    for tpl in templates or []:
+        keywords = tpl.get("subject_contains") or []
+        if tpl.get("reply_html") and keywords and any((k or "").lower() in text for k in keywords if k):
+            return tpl
+    return None
+
+
+# ============= EMBEDDING CLASSIFIER =============
+class EmbeddingTriageClassifier:
+    """
+    Nearest-centroid classifier over embeddings of subject + first lines.
+    Centroids are built once from the configured examples and cached by their hash.
+    """
+
+    def __init__(self, client=None, model: Optional[str] = None):
+        self._client = client
+        self._model = model or os.getenv("EMBEDDING_MODEL", "bge-m3")
+        self._centroids: Dict[str, List[float]] = {}
+        self._examples_hash: Optional[str] = None
+
+    def _get_client(self):
+        if self._client is None:
+            import rag_backend as rb
+            self._client = getattr(rb, "oai_client", None)
+        return self._client
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        client = self._get_client()
+        if client is None:
+            raise RuntimeError("No embeddings client available")
+        resp = client.embeddings.create(model=self._model, input=texts)
+        return [d.embedding for d in resp.data]
+
+    @staticmethod
+    def _normalize(vec: List[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+        return [x / norm for x in vec]
+
+    def _ensure_centroids(self, examples: Dict[str, List[str]]):
+        digest = hashlib.sha1(repr(sorted((k, tuple(v)) for k, v in examples.items())).encode("utf-8")).hexdigest()
+        if digest == self._examples_hash:
+            return
+        centroids = {}
+        for route, texts in examples.items():
+            texts = [t for t in (texts or []) if t]
+            if route not in ROUTES or not texts:
+                continue
+            vecs = [self._normalize(v) for v in self._embed(texts)]
+            dim = len(vecs[0])
+            mean = [sum(v[i] for v in vecs) / len(vecs) for i in range(dim)]
+            centroids[route] = self._normalize(mean)
+        self._centroids = centroids
+        self._examples_hash = digest
+        logger.info(f"[triage] Built classifier centroids for routes: {list(centroids.keys())}")
+
+    def classify(self, text: str, examples: Dict[str, List[str]]) -> tuple:
+        """Return (route, score) of the closest centroid, or (None, 0.0)."""
+        self._ensure_centroids(examples or {})
+        if not self._centroids or not text:
+            return None, 0.0
+        vec = self._normalize(self._embed([text[:1000]])[0])
+        best_route, best_score = None, 0.0
+        for route, centroid in self._centroids.items():
+            score = sum(a * b for a, b in zip(vec, centroid))
+            if score > best_score:
+                best_route, best_score = route, score
+        return best_route, best_score
+
+
+_classifier: Optional[EmbeddingTriageClassifier] = None
+
+
+def _get_classifier() -> EmbeddingTriageClassifier:
+    global _classifier
+    if _classifier is None:
+        _classifier = EmbeddingTriageClassifier()
+    return _classifier
+
+
+# ============= TRIAGE =============
+def triage_mail(mail: Dict[str, Any], config: Optional[Dict[str, Any]] = None, our_email: str = "") -> Dict[str, Any]:
+    """
+    Decide how the autopilot should handle a mail without invoking the LLM.
+
+    Args:
+        mail: Mail metadata dict (as returned by get_unread_batch)
+        config: Triage configuration (see _DEFAULT_TRIAGE_CONFIG)
+        our_email: The mailbox address the autopilot acts for
+
+    Returns:
+        Dict with keys: route, reason and optional template
+    """
+    cfg = config or _DEFAULT_TRIAGE_CONFIG
+    if not cfg.get("enabled", True) or mail.get("from_unresponded"):
+        return {"route": ROUTE_AGENT, "reason": "triage bypassed"}
+
+    sender_email = (mail.get("sender_email") or "").lower()
+    subject = mail.get("subject") or ""
+    snippet = mail.get("snippet") or ""
+    our_email_l = (our_email or "").lower()
+
+    if our_email_l and sender_email == our_email_l:
+        return {"route": ROUTE_SKIP, "reason": "own message"}
+    if _sender_matches(sender_email, cfg.get("allow_senders")):
+        return {"route": ROUTE_AGENT, "reason": "allow-listed sender"}
+    if _sender_matches(sender_email, cfg.get("deny_senders")):
+        return {"route": ROUTE_SKIP, "reason": "deny-listed sender"}
+
+    reason = _header_reason(mail.get("headers") or {}, sender_email, subject)
+    if reason:
+        return {"route": ROUTE_MARK_READ, "reason": reason}
+
+    internal = [d.lower().lstrip("@") for d in (cfg.get("internal_domains") or []) if d]
+    if internal and our_email_l and _domain_of(sender_email) in internal:
+        to_list = [(r or "").lower() for r in (mail.get("to") or [])]
+        cc_list = [(r or "").lower() for r in (mail.get("cc") or [])]
+        if our_email_l not in to_list and our_email_l in cc_list:
+            return {"route": ROUTE_SKIP, "reason": "internal CC"}
+
+    tpl = _match_template(cfg.get("templates"), subject, snippet)
+    if tpl:
+        return {"route": ROUTE_TEMPLATE, "reason": f"template '{tpl.get('id', '')}'", "template": tpl}
+
+    clf_cfg = cfg.get("classifier") or {}
+    if clf_cfg.get("enabled") and clf_cfg.get("examples"):
+        try:
+            text = f"{subject}\n{snippet}"
+            route, score = _get_classifier().classify(text, clf_cfg.get("examples"))
+            if route and route != ROUTE_TEMPLATE and score >= float(clf_cfg.get("threshold", 0.80)):
+                return {"route": route, "reason": f"classifier ({score:.2f})"}
+        except Exception as e:
+            logger.warning(f"[triage] Classifier failed, falling back to agent: {e}")
+
+    return {"route": ROUTE_AGENT, "reason": "default"}
+
+
+# ============= SELF-CHECK =============
+def _self_check():
+    cfg = default_triage_config()
+    cfg.update(deny_senders=["@spam.example"], internal_domains=["@example.com"])
+    me = "me@example.com"
+    skipped = [
+        {"sender_email": me, "subject": "Sent by me"},
+        {"sender_email": "promo@spam.example", "subject": "Offer"},
+        {"sender_email": "boss@example.com", "subject": "FYI", "to": ["team@example.com"], "cc": [me]},
+    ]
+    for mail in skipped:
+        route = triage_mail(mail, cfg, our_email=me)["route"]
+        assert route == ROUTE_SKIP and route not in MARK_READ_ROUTES, (mail["subject"], route)
+
+    bounce = {"sender_email": "mailer-daemon@relay.example", "subject": "Undeliverable: Quote"}
+    assert triage_mail(bounce, cfg, our_email=me)["route"] in MARK_READ_ROUTES
+    print("autopilot_triage self-check passed")
+
+
+if __name__ == "__main__":
+    _self_check()
@@ -28,13 +28,23 @@ EXCLUDE_PATTERNS = [
     '*.log',
     '*.log.*',
     'test_report.json',
-    'autopilot.lock',
+    'autopilot_leases.db',
+    'autopilot_activity.db',
+    'autopilot_perf.jsonl',
+    'mail_mirror.db*',
+    'mail_mirror_*',
+    'outbox.db*',
+    'ews_rate.db*',
     'action_plans_execution.lock',
     'autopilot_stop.flag',
     # Don't include state files with potentially sensitive data
     'autopilot_state.json',
     'action_plans_state.json',
     'processed_mails.json',
+    'processed_mails.*',
+    'autopilot_queue.json',
+    'autopilot_queue_*',
+    'unresponded_index.*',
     'rag_state.json',
     'ews_accounts.json',
     # Don't include .env (user must configure their own)
@@ -63,6 +73,19 @@ REQUIRED_FILES = [
     'rag_manager.py',
     'ews_config.py',
     'frequency_formatter.py',
+    'autopilot_triage.py',
+    'autopilot_queue.py',
+    'autopilot_leases.py',
+    'autopilot_rules.py',
+    'autopilot_activity.py',
+    'autopilot_perf.py',
+    'mail_normalizer.py',
+    'mailbox_registry.py',
+    'fuzzy_match.py',
+    'free_busy.py',
+    'outbox.py',
+    'ews_throttle.py',
+    'mail_mirror.py',
     'requirements.txt',
     'README.md',
     # Service files
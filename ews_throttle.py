@@ -0,0 +1,273 @@
+"""
+ews_throttle.py
+Token-bucket rate limiting and shared back-off for every EWS request.
+
+All EWS SOAP requests pass through exchangelib's post_ratelimited, which
+ews_tools2 wraps; the wrapper calls acquire() here before each request.
+
+    - One token bucket (EWS_RATE_PER_SECOND, burst EWS_RATE_BURST) per Exchange host.
+      With EWS_RATE_DB set (default ews_rate.db) the bucket lives in SQLite, so the
+      autopilot service, the action-plan service and the UIs share one budget.
+      EWS_RATE_DB="" keeps it in-process.
+    - Background work (autopilot sweeps, plan execution, the outbox sender) runs under
+      ews_priority("background") and leaves EWS_RATE_INTERACTIVE_RESERVE tokens for
+      interactive requests, which are the default.
+    - ErrorServerBusy back-off hints pause the shared bucket: SharedBackoffPolicy is an
+      exchangelib FaultTolerance policy whose back_off_until lives in the bucket, so
+      every process waits out the server's hint instead of retrying into it. Other
+      errors (401, 503, connection failures) are not retried and fail at once.
+
+get_throttle_stats() exposes the counters (requests, waits, throttle events).
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+RATE_PER_SECOND = float(os.getenv("EWS_RATE_PER_SECOND", "5"))
+RATE_BURST = float(os.getenv("EWS_RATE_BURST", "10"))
+RATE_DB = os.getenv("EWS_RATE_DB", "ews_rate.db")
+INTERACTIVE_RESERVE = float(os.getenv("EWS_RATE_INTERACTIVE_RESERVE", "2"))
+DEFAULT_BACKOFF = float(os.getenv("EWS_THROTTLE_DEFAULT_BACKOFF", "30"))
+MAX_BACKOFF_WAIT = float(os.getenv("EWS_THROTTLE_MAX_WAIT", "300"))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+_priority: ContextVar[str] = ContextVar("ews_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def ews_priority(level: str):
+    """Run EWS calls in this context at the given priority ("interactive" or "background")."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+# ============= COUNTERS =============
+_stats_lock = threading.Lock()
+_stats: Dict[str, float] = {
+    "requests": 0, "background_requests": 0, "waits": 0, "wait_seconds": 0.0,
+    "throttled": 0, "backoff_seconds": 0.0,
+}
+
+
+def _bump(**deltas):
+    with _stats_lock:
+        for k, v in deltas.items():
+            _stats[k] = _stats.get(k, 0) + v
+
+
+def get_throttle_stats() -> Dict[str, Any]:
+    """Process-wide limiter counters plus the current shared pause, if any."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+    stats["backoff_seconds"] = round(stats["backoff_seconds"], 3)
+    paused = get_limiter().paused_until()
+    stats["paused_for_seconds"] = round(max(0.0, paused - time.time()), 1) if paused else 0.0
+    stats["rate_per_second"] = RATE_PER_SECOND
+    stats["burst"] = RATE_BURST
+    stats["shared"] = bool(RATE_DB)
+    return stats
+
+
+# ============= BUCKETS =============
+def _refill(tokens: float, updated_at: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+def _wait_for(tokens: float, priority: str, rate: float, burst: float) -> float:
+    """Seconds until a request of this priority may take a token (0 = now)."""
+    need = 1.0 + (min(INTERACTIVE_RESERVE, max(0.0, burst - 1)) if priority == BACKGROUND else 0.0)
+    return 0.0 if tokens >= need else (need - tokens) / rate
+
+
+class LocalTokenBucket:
+    """In-process token buckets keyed by host."""
+
+    def __init__(self, rate: float = RATE_PER_SECOND, burst: float = RATE_BURST):
+        self.rate = max(0.01, rate)
+        self.burst = max(1.0, burst)
+        self._state: Dict[str, list] = {}
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_take(self, key: str, priority: str) -> float:
+        now = time.time()
+        with self._lock:
+            if now < self._paused_until:
+                return self._paused_until - now
+            tokens, updated_at = self._state.get(key, (self.burst, now))
+            tokens = _refill(tokens, updated_at, now, self.rate, self.burst)
+            wait = _wait_for(tokens, priority, self.rate, self.burst)
+            if wait == 0.0:
+                tokens -= 1.0
+            self._state[key] = [tokens, now]
+            return wait
+
+    def pause_until(self, ts: float) -> None:
+        with self._lock:
+            self._paused_until = ts
+
+    def paused_until(self) -> float:
+        with self._lock:
+            return self._paused_until
+
+
+class SharedTokenBucket:
+    """Token buckets in SQLite, shared by every process pointing at the same file."""
+
+    def __init__(self, db_path: str = RATE_DB, rate: float = RATE_PER_SECOND, burst: float = RATE_BURST):
+        self.db_path = db_path
+        self.rate = max(0.01, rate)
+        self.burst = max(1.0, burst)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS backoff (id INTEGER PRIMARY KEY CHECK (id = 1), until REAL)")
+            conn.execute("INSERT OR IGNORE INTO backoff (id, until) VALUES (1, 0)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    def try_take(self, key: str, priority: str) -> float:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            until = conn.execute("SELECT until FROM backoff WHERE id=1").fetchone()[0] or 0.0
+            if now < until:
+                conn.execute("COMMIT")
+                return until - now
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key=?", (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, self.rate, self.burst) if row else self.burst
+            wait = _wait_for(tokens, priority, self.rate, self.burst)
+            if wait == 0.0:
+                tokens -= 1.0
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def pause_until(self, ts: float) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE backoff SET until=? WHERE id=1", (ts,))
+        finally:
+            conn.close()
+
+    def paused_until(self) -> float:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT until FROM backoff WHERE id=1").fetchone()[0] or 0.0
+        finally:
+            conn.close()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Process-wide limiter (SQLite-shared unless EWS_RATE_DB is empty or unusable)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            if RATE_DB:
+                try:
+                    _limiter = SharedTokenBucket(RATE_DB)
+                except Exception as e:
+                    logger.warning(f"[throttle] Shared rate limiter unavailable ({e}); using in-process limits")
+            if _limiter is None:
+                _limiter = LocalTokenBucket()
+    return _limiter
+
+
+def acquire(key: str = "ews") -> float:
+    """Block until a request may be sent under the current priority; returns seconds waited."""
+    priority = current_priority()
+    limiter = get_limiter()
+    waited = 0.0
+    while True:
+        try:
+            wait = limiter.try_take(key, priority)
+        except Exception as e:
+            logger.debug(f"[throttle] Limiter error, not limiting this request: {e}")
+            wait = 0.0
+        if wait <= 0.0:
+            break
+        wait = min(wait, MAX_BACKOFF_WAIT)
+        time.sleep(wait)
+        waited += wait
+    _bump(requests=1, background_requests=int(priority == BACKGROUND),
+          waits=int(waited > 0), wait_seconds=waited)
+    return waited
+
+
+def record_backoff(seconds: Optional[float]) -> float:
+    """Pause all EWS traffic (every process sharing the bucket) for the server's back-off hint."""
+    seconds = DEFAULT_BACKOFF if seconds is None else min(float(seconds), MAX_BACKOFF_WAIT)
+    until = time.time() + seconds
+    limiter = get_limiter()
+    try:
+        if until > limiter.paused_until():
+            limiter.pause_until(until)
+    except Exception as e:
+        logger.debug(f"[throttle] Could not record back-off: {e}")
+    _bump(throttled=1, backoff_seconds=seconds)
+    logger.warning(f"[throttle] Exchange asked to back off for {seconds:.0f}s")
+    return seconds
+
+
+# ============= EXCHANGELIB RETRY POLICY =============
+def make_retry_policy():
+    """FaultTolerance policy whose back-off state is the shared limiter pause."""
+    from exchangelib.protocol import FaultTolerance
+
+    class SharedBackoffPolicy(FaultTolerance):
+        @property
+        def back_off_until(self):
+            until = get_limiter().paused_until()
+            return datetime.fromtimestamp(until) if until and until > time.time() else None
+
+        @back_off_until.setter
+        def back_off_until(self, value):
+            get_limiter().pause_until(value.timestamp() if value else 0.0)
+
+        def back_off(self, seconds):
+            record_backoff(seconds)
+
+        def may_retry_on_error(self, response, wait):
+            # Only server-busy answers are retried. 401s (bad credentials), 503s and
+            # connection errors fail at once, as with exchangelib's default FailFast.
+            if wait > self.max_wait or getattr(response, "status_code", None) != 500:
+                return False
+            return b"ErrorServerBusy" in (getattr(response, "content", None) or b"")
+
+    return SharedBackoffPolicy(max_wait=MAX_BACKOFF_WAIT)
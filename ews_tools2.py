@@ -15,17 +15,32 @@ Features:
 from __future__ import annotations
 
 import os
+import base64
+import hashlib
+import html as _html
 from typing import List, Dict, Any, Optional, Union
 from datetime import datetime, timedelta, timezone
 import difflib
+import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 from exchangelib import (
     Account, Configuration, Credentials, DELEGATE,
     Message, HTMLBody, Mailbox, FileAttachment, CalendarItem,
-    Attendee, EWSTimeZone, Q
+    Attendee, EWSTimeZone, EWSDateTime, Q
 )
 
+from free_busy import BusyIndex, WorkingHours, find_slots
+from fuzzy_match import FuzzyMatcher, fuzzy_ratio
+from mail_normalizer import body_to_text
+from outbox import outbox_active, enqueue_send
+from ews_throttle import acquire as _acquire_ews_slot, make_retry_policy
+
 # ───── CONFIG (env vars only; can be overwritten at runtime via set_credentials) ─────
 EMAIL = os.getenv("EWS_EMAIL", "sales-ai-agent@cyfuture.com")
 PASSWORD = os.getenv("EWS_PASSWORD", "JSDhut#$%36")
@@ -59,6 +74,8 @@ def fetch_multiple_emails_with_threads(
 ) -> List[Dict[str, Any]]:
     """
     Fetch multiple emails with their full content and thread information in batch.
+    Items are fetched with one GetItem per EWS_PREFETCH_CHUNK_SIZE ids and threads with one
+    query per chunk of distinct conversations; results keep the order of item_ids.
     
     Args:
         item_ids: List of email item IDs to fetch
@@ -81,34 +98,91 @@ def fetch_multiple_emails_with_threads(
         changekeys = None
     
     account = _get_account()
-    results = []
-    
-    for idx, item_id in enumerate(item_ids):
+    wanted = [(item_id, (changekeys[idx] if changekeys else "") or None) for idx, item_id in enumerate(item_ids)]
+    fetched: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+
+    # Prefetched messages first, then one GetItem per PREFETCH_CHUNK_SIZE items for the rest
+    to_fetch = []
+    seen = set()
+    for item_id, changekey in wanted:
+        if item_id in seen:
+            continue
+        seen.add(item_id)
+        cached = _get_prefetched(item_id, changekey or "", include_threads)
+        if cached is not None:
+            fetched[item_id] = cached
+        else:
+            to_fetch.append((item_id, changekey))
+
+    retry = []
+    for i in range(0, len(to_fetch), PREFETCH_CHUNK_SIZE):
+        chunk = to_fetch[i:i + PREFETCH_CHUNK_SIZE]
         try:
-            changekey = changekeys[idx] if changekeys else ""
-            
-            # Fetch the email
-            email_data = read_email(
-                item_id=item_id,
-                changekey=changekey,
-                include_thread=include_threads
-            )
-            
-            if "error" not in email_data:
-                results.append(email_data)
-            else:
-                logging.warning(f"[fetch_multiple_emails_with_threads] Failed to fetch {item_id}: {email_data.get('error')}")
-                results.append({
-                    "id": item_id,
-                    "error": email_data.get("error"),
-                    "skipped": True
-                })
-                
+            # fetch() yields one result per id, in order (exceptions for failed ids)
+            for (item_id, changekey), msg in zip(chunk, account.fetch(ids=chunk, only_fields=list(MESSAGE_FIELDS))):
+                if isinstance(msg, Message):
+                    fetched[item_id] = msg
+                elif changekey:
+                    retry.append((item_id, None))  # changekey may be stale
+                else:
+                    errors[item_id] = f"Fetch failed: {msg}" if isinstance(msg, Exception) else "Not a message"
+        except Exception as e:
+            logging.warning(f"[fetch_multiple_emails_with_threads] Bulk fetch failed for {len(chunk)} items: {e}")
+            for item_id, _ in chunk:
+                errors[item_id] = f"Fetch failed: {e}"
+    if retry:
+        try:
+            for (item_id, _), msg in zip(retry, account.fetch(ids=retry, only_fields=list(MESSAGE_FIELDS))):
+                if isinstance(msg, Message):
+                    fetched[item_id] = msg
+                else:
+                    errors[item_id] = f"Fetch failed: {msg}" if isinstance(msg, Exception) else "Not a message"
         except Exception as e:
-            logging.exception(f"[fetch_multiple_emails_with_threads] Error fetching {item_id}")
+            for item_id, _ in retry:
+                errors[item_id] = f"Fetch failed: {e}"
+
+    emails: Dict[str, Dict[str, Any]] = {}
+    need_threads: Dict[str, Any] = {}
+    cache_requests: Dict[str, tuple] = {}
+    for item_id, msg in fetched.items():
+        if isinstance(msg, dict):
+            emails[item_id] = msg
+            continue
+        emails[item_id] = _message_to_dict(msg)
+        if include_threads:
+            convo = getattr(msg, "conversation_id", None)
+            if not convo:
+                emails[item_id]["thread"] = [dict(emails[item_id])]
+                continue
+            cache_requests.setdefault(_conv_to_str(convo), (convo, msg.id, msg.changekey))
+
+    # Cached threads are checked for new mail in one probe; the rest share one batched thread query
+    cached_threads = _current_cached_threads(cache_requests) if cache_requests else {}
+    for convo_key, (convo, _, _) in cache_requests.items():
+        if convo_key not in cached_threads:
+            need_threads[convo_key] = convo
+    for email in emails.values():
+        if "thread" not in email and email.get("conversation_id") in cached_threads:
+            email["thread"] = [dict(t) for t in cached_threads[email["conversation_id"]]]
+
+    # One batched thread query for all conversations not in the cache (shared threads fetched once)
+    if need_threads:
+        threads = fetch_conversation_threads(list(need_threads.values()))
+        for email in emails.values():
+            if "thread" not in email and email.get("conversation_id") in need_threads:
+                email["thread"] = [dict(t) for t in threads.get(email["conversation_id"], [])]
+
+    results = []
+    for item_id, _ in wanted:
+        if item_id in emails:
+            results.append(dict(emails[item_id]))
+        else:
+            error = errors.get(item_id, "Fetch failed")
+            logging.warning(f"[fetch_multiple_emails_with_threads] Failed to fetch {item_id}: {error}")
             results.append({
                 "id": item_id,
-                "error": str(e),
+                "error": error,
                 "skipped": True
             })
     
@@ -228,6 +302,13 @@ def fetch_emails_by_criteria_with_content(
             "emails": []
         }
         
+def _queue_send(func: str, **kwargs) -> Optional[str]:
+    """Outbox confirmation if this send is queued (OUTBOX_ENABLED), else None to send inline."""
+    if not outbox_active():
+        return None
+    return enqueue_send(func, kwargs, current_mailbox())
+
+
 def send_mail(
     to_email: str,
     subject: str,
@@ -260,8 +341,17 @@ def send_mail(
     if not to_email or not subject or not body_html:
         return "[Error] to_email, subject, and body_html are required"
     
-    if to_email.lower() == EMAIL.lower():
+    if to_email.lower() == current_email().lower():
         return "[Error] Cannot send email to self"
+
+    if not save_as_draft:
+        queued = _queue_send(
+            "send_mail", to_email=to_email, subject=subject, body_html=body_html,
+            cc_recipients=cc_recipients, bcc_recipients=bcc_recipients,
+            attachments=attachments, importance=importance,
+        )
+        if queued:
+            return queued
     
     try:
         account = _get_account()
@@ -315,42 +405,253 @@ def send_mail(
             return f"Draft saved successfully for {to_email}"
         else:
             msg.send()
+            invalidate_mailbox_conversations()
             logger.info(f"[send_mail] ✓ Message sent to {to_email}")
             return f"Email sent successfully to {to_email}"
         
     except Exception as e:
         logger.exception(f"[send_mail] Failed to send to {to_email}")
         return f"[Error sending email] {type(e).__name__}: {str(e)}"
-def _get_account() -> Account:
-    """Return cached Account or initialize from EMAIL/PASSWORD/env (raises ValueError if missing creds)."""
-    global _account, _account_config, EMAIL, PASSWORD, EXCHANGE_HOST
-    if _account is None:
-        if not EMAIL or not PASSWORD:
-            raise ValueError("Set EWS_EMAIL and EWS_PASSWORD env vars or call set_credentials().")
-        creds = Credentials(username=EMAIL, password=PASSWORD)
-        config = Configuration(server=EXCHANGE_HOST, credentials=creds)
-        _account_config = config
-        _account = Account(
-            primary_smtp_address=EMAIL,
+# ====================== EWS REQUEST ACCOUNTING ======================
+# Every EWS SOAP request goes through exchangelib's post_ratelimited; wrapping it
+# gives a process-wide request counter and per-scope counters (one per autopilot
+# sweep, so concurrent sweeps do not count each other's requests), and is where
+# the shared rate limiter (ews_throttle.py) admits each request.
+_ews_request_count = 0
+_ews_request_lock = threading.Lock()
+_ews_request_scope: ContextVar[Optional[List[int]]] = ContextVar("ews_request_scope", default=None)
+
+
+def _install_ews_request_hook() -> None:
+    """Wrap exchangelib's request function to rate-limit and count EWS requests (safe across module reloads)."""
+    try:
+        from exchangelib.services import common as _svc_common
+    except Exception as e:
+        logging.debug(f"[ews] Request counting unavailable: {e}")
+        return
+    current = _svc_common.post_ratelimited
+    if getattr(current, "_ews_tools2_counter", None) is _count_ews_request:
+        return
+    original = getattr(current, "__wrapped__", current)
+
+    def _counted_post_ratelimited(*args, **kwargs):
+        protocol = args[0] if args else kwargs.get("protocol")
+        _acquire_ews_slot(getattr(protocol, "server", None) or "ews")
+        _count_ews_request()
+        return original(*args, **kwargs)
+
+    _counted_post_ratelimited.__wrapped__ = original
+    _counted_post_ratelimited._ews_tools2_counter = _count_ews_request
+    _svc_common.post_ratelimited = _counted_post_ratelimited
+
+
+def _count_ews_request() -> None:
+    global _ews_request_count
+    scope = _ews_request_scope.get()
+    with _ews_request_lock:
+        _ews_request_count += 1
+        if scope is not None:
+            scope[0] += 1
+
+
+def get_ews_request_count() -> int:
+    """Total EWS requests issued by this process (monotonic; diff two readings)."""
+    with _ews_request_lock:
+        return _ews_request_count
+
+
+def begin_ews_request_scope():
+    """
+    Start counting the EWS requests of this context (and contexts copied from it).
+    Returns (counter, token): counter[0] is the running count; pass token to end_ews_request_scope.
+    """
+    counter = [0]
+    return counter, _ews_request_scope.set(counter)
+
+
+def end_ews_request_scope(token) -> None:
+    _ews_request_scope.reset(token)
+
+
+# ====================== MAILBOX CONTEXT ======================
+# One process can serve several mailboxes (see mailbox_registry.py). The mailbox of
+# the current thread/task lives in a ContextVar; without one, the module-level
+# EMAIL/PASSWORD/EXCHANGE_HOST account is used as before.
+_current_mailbox: ContextVar[Optional[Dict[str, Any]]] = ContextVar("ews_current_mailbox", default=None)
+
+
+@contextmanager
+def use_mailbox(mailbox: Optional[Dict[str, Any]]):
+    """Route all ews_tools2 calls in this context to the given mailbox (None = default account)."""
+    token = _current_mailbox.set(mailbox)
+    try:
+        yield
+    finally:
+        _current_mailbox.reset(token)
+
+
+def current_mailbox() -> Optional[Dict[str, Any]]:
+    return _current_mailbox.get()
+
+
+def current_email() -> str:
+    """SMTP address of the mailbox in use."""
+    mailbox = _current_mailbox.get()
+    return (mailbox or {}).get("email") or EMAIL
+
+
+def _get_mailbox_account(mailbox: Dict[str, Any]) -> Account:
+    """Pooled Account for a registry mailbox (rebuilt only if its credentials changed)."""
+    return get_pooled_account(
+        mailbox["email"],
+        mailbox.get("password") or "",
+        mailbox.get("host") or EXCHANGE_HOST,
+        username=mailbox.get("username"),
+    )
+
+
+# ====================== ACCOUNT POOL ======================
+# Accounts are long-lived and shared across threads: one per credential
+# fingerprint, each with its own HTTP session pool (EWS_SESSION_POOL_SIZE).
+# When a mailbox's credentials change (set_credentials, .env or registry edits) the
+# account built for the old ones is evicted and its sessions closed.
+# The server version is pinned per host - from EWS_SERVER_VERSION, or from the
+# first account that probed it - so rebuilt accounts skip version guessing.
+EWS_SESSION_POOL_SIZE = int(os.getenv("EWS_SESSION_POOL_SIZE", "4"))
+EWS_SERVER_VERSION = os.getenv("EWS_SERVER_VERSION", "").strip()
+
+_accounts_by_fingerprint: Dict[str, Account] = {}
+_fingerprint_by_identity: Dict[tuple, str] = {}
+_server_versions: Dict[str, Any] = {}
+_accounts_lock = threading.Lock()
+
+
+def _credential_fingerprint(email: str, password: str, host: str, username: Optional[str] = None) -> str:
+    raw = "\x00".join([(email or "").lower(), username or email or "", password or "", (host or "").lower()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _configured_version():
+    """Version from EWS_SERVER_VERSION ("15.1" or a full build like "15.1.2507.6"), else None."""
+    if not EWS_SERVER_VERSION:
+        return None
+    try:
+        from exchangelib.version import Version, Build
+        parts = [int(p) for p in EWS_SERVER_VERSION.split(".")[:4]]
+        return Version(build=Build(*parts))
+    except Exception as e:
+        logging.warning(f"[ews] Ignoring invalid EWS_SERVER_VERSION={EWS_SERVER_VERSION!r}: {e}")
+        return None
+
+
+def _pinned_version(host: str):
+    """Known server version for a host (caller holds _accounts_lock)."""
+    key = (host or "").lower()
+    version = _server_versions.get(key) or _configured_version()
+    if version is None:
+        # Pick up a version an existing account on this host has already probed
+        for account in _accounts_by_fingerprint.values():
+            config_version = getattr(account.protocol.config, "version", None)
+            if config_version is not None and (account.protocol.config.server or "").lower() == key:
+                version = config_version
+                break
+    if version is not None:
+        _server_versions[key] = version
+    return version
+
+
+def get_pooled_account(email: str, password: str, host: str, username: Optional[str] = None) -> Account:
+    """
+    Shared Account for a set of credentials.
+
+    Built once per credential fingerprint and reused by every thread; a new
+    Account is only created when the email/username/password/host change, and
+    the one built for the mailbox's previous credentials is then dropped.
+    """
+    if not email or not password:
+        raise ValueError("Set EWS_EMAIL and EWS_PASSWORD env vars or call set_credentials().")
+    fingerprint = _credential_fingerprint(email, password, host, username)
+    account = _accounts_by_fingerprint.get(fingerprint)
+    if account is not None:
+        return account
+    with _accounts_lock:
+        account = _accounts_by_fingerprint.get(fingerprint)
+        if account is not None:
+            return account
+        _install_ews_request_hook()
+        creds = Credentials(username=username or email, password=password)
+        config = Configuration(
+            server=host,
+            credentials=creds,
+            version=_pinned_version(host),
+            max_connections=EWS_SESSION_POOL_SIZE,
+            retry_policy=make_retry_policy(),
+        )
+        account = Account(
+            primary_smtp_address=email,
             config=config,
             autodiscover=False,
             access_type=DELEGATE,
         )
-    return _account
+        _accounts_by_fingerprint[fingerprint] = account
+        identity = ((email or "").lower(), (username or email or "").lower(), (host or "").lower())
+        stale = _fingerprint_by_identity.get(identity)
+        _fingerprint_by_identity[identity] = fingerprint
+        if stale and stale != fingerprint:
+            _evict_account(stale)
+        logging.info(f"[ews] Account created for {email} on {host} (pool={EWS_SESSION_POOL_SIZE})")
+        return account
+
+
+def _evict_account(fingerprint: str) -> None:
+    """Drop a pooled account whose credentials were replaced (caller holds _accounts_lock)."""
+    account = _accounts_by_fingerprint.pop(fingerprint, None)
+    if account is None:
+        return
+    try:
+        account.protocol.close()
+    except Exception as e:
+        logging.debug(f"[ews] Closing replaced account sessions failed: {e}")
+    logging.info(f"[ews] Dropped pooled account for {account.primary_smtp_address} (credentials changed)")
+
+
+def _get_account() -> Account:
+    """Pooled Account for the current mailbox context or EMAIL/PASSWORD/EXCHANGE_HOST (raises ValueError if missing creds)."""
+    global _account, _account_config
+    mailbox = _current_mailbox.get()
+    if mailbox:
+        return _get_mailbox_account(mailbox)
+    account = get_pooled_account(EMAIL, PASSWORD, EXCHANGE_HOST)
+    if account is not _account:
+        _account = account
+        _account_config = account.protocol.config
+    return account
+
+
+def refresh_credentials_from_env() -> bool:
+    """
+    Re-read EWS_EMAIL/EWS_PASSWORD/EWS_HOST into the module globals.
+
+    The pooled Account is kept; the next _get_account() call only builds a new
+    one if the credentials differ. Returns True if they changed.
+    """
+    global EMAIL, PASSWORD, EXCHANGE_HOST
+    new = (os.getenv("EWS_EMAIL", ""), os.getenv("EWS_PASSWORD", ""), os.getenv("EWS_HOST", ""))
+    changed = new != (EMAIL, PASSWORD, EXCHANGE_HOST)
+    EMAIL, PASSWORD, EXCHANGE_HOST = new
+    return changed
 
 
 def set_credentials(email: str, password: str, host: Optional[str] = None) -> str:
     """
-    Set runtime EWS credentials and clear cached account.
+    Set runtime EWS credentials; the pooled account for them is (re)used.
     Returns status string.
     """
-    global EMAIL, PASSWORD, EXCHANGE_HOST, _account, _account_config
+    global EMAIL, PASSWORD, EXCHANGE_HOST
     EMAIL = email or EMAIL
     PASSWORD = password or PASSWORD
     if host:
         EXCHANGE_HOST = host
-    _account = None
-    _account_config = None
     try:
         _get_account()
         return "Credentials set and account initialized."
@@ -358,13 +659,68 @@ def set_credentials(email: str, password: str, host: Optional[str] = None) -> st
         return f"Failed to initialize account: {e}"
 
 
-# ====================== BATCH INBOX ======================
-def get_unread_batch(batch_size: int = 5) -> List[Dict[str, Any]]:
+# ====================== FIELD PROJECTIONS ======================
+# Listing queries project to these field sets with .only(); without it exchangelib
+# follows FindItem with a GetItem for *all* fields (bodies, MIME, attachments).
+# id/changekey are always returned. Bodies are loaded in bulk by _load_fields()
+# only for the items whose content is actually needed.
+LIST_FIELDS = ("subject", "sender", "datetime_received", "conversation_id", "is_read", "has_attachments")
+RECIPIENT_FIELDS = ("to_recipients", "cc_recipients", "bcc_recipients")
+UNREAD_LIST_FIELDS = LIST_FIELDS + ("to_recipients", "cc_recipients")
+SENT_LIST_FIELDS = ("subject", "conversation_id", "datetime_sent")
+THREAD_PROBE_FIELDS = ("sender", "datetime_received")
+BODY_FIELDS = ("text_body",)
+# Full message reads: the HTML body only (converted once per changekey by
+# mail_normalizer.body_to_text), never text_body + body + MIME
+MESSAGE_FIELDS = ("subject", "body", "sender", "to_recipients", "cc_recipients", "bcc_recipients",
+                  "has_attachments", "attachments", "datetime_received", "conversation_id")
+
+
+def _load_fields(account: Account, items: List[Any], fields: tuple) -> Dict[str, Any]:
     """
-    Return latest unread messages metadata (JSON-safe).
+    Bulk GetItem of only `fields` for already-listed items.
+
+    Returns:
+        Dict mapping item id -> partially loaded Message
     """
-    account = _get_account()
-    items = account.inbox.filter(is_read=False).order_by('-datetime_received')[:batch_size]
+    ids = [(m.id, m.changekey) for m in items if getattr(m, "id", None)]
+    if not ids:
+        return {}
+    loaded: Dict[str, Any] = {}
+    try:
+        for msg in account.fetch(ids=ids, only_fields=list(fields)):
+            if isinstance(msg, Exception) or not getattr(msg, "id", None):
+                continue
+            loaded[msg.id] = msg
+    except Exception as e:
+        logging.warning(f"[ews] Bulk load of {fields} failed for {len(ids)} items: {e}")
+    return loaded
+
+
+# ====================== BATCH INBOX ======================
+# Internet headers surfaced in listings (used by autopilot triage)
+_TRIAGE_HEADER_NAMES = {
+    "auto-submitted", "precedence", "list-unsubscribe", "list-id",
+    "x-autoreply", "x-autorespond", "x-auto-response-suppress", "content-type",
+}
+
+
+def _triage_headers(m) -> Dict[str, str]:
+    """Return the small subset of internet headers needed for triage (lower-cased names)."""
+    res: Dict[str, str] = {}
+    try:
+        for h in (getattr(m, "headers", None) or []):
+            name = (getattr(h, "name", "") or "").lower()
+            if name in _TRIAGE_HEADER_NAMES and name not in res:
+                res[name] = str(getattr(h, "value", "") or "")
+    except Exception:
+        pass
+    return res
+
+
+def _unread_to_dicts(account: Account, items: List[Any]) -> List[Dict[str, Any]]:
+    """Listing dicts for unread messages; snippet and triage headers come from one GetItem."""
+    extra = _load_fields(account, items, ("text_body", "headers"))
     return [
         {
             "id": m.id,
@@ -374,45 +730,106 @@ def get_unread_batch(batch_size: int = 5) -> List[Dict[str, Any]]:
             "sender_name": (m.sender and (m.sender.name or m.sender.email_address)) or "",
             "received": m.datetime_received.isoformat() if m.datetime_received else "",
             "conversation_id": _conv_to_str(getattr(m, "conversation_id", None)),
+            "to": [r.email_address for r in (m.to_recipients or [])],
+            "cc": [r.email_address for r in (m.cc_recipients or [])],
+            "snippet": (getattr(extra.get(m.id), "text_body", None) or "")[:300],
+            "headers": _triage_headers(extra.get(m.id)),
         }
         for m in items
     ]
 
 
-# ====================== READ EMAIL (with optional thread) ======================
-def read_email(item_id: str, changekey: str, include_thread: bool = False) -> Dict[str, Any]:
+def get_unread_batch(batch_size: int = 5) -> List[Dict[str, Any]]:
     """
-    Fetch a message by id (and changekey) and return JSON-serializable fields.
-    If include_thread=True, also include 'thread' key with the conversation messages.
+    Return latest unread messages metadata (JSON-safe).
+    Includes recipients, a short text snippet and triage headers.
     """
-    if not item_id:
-        return {"error": "item_id required"}
+    account = _get_account()
+    items = list(
+        account.inbox.filter(is_read=False)
+        .only(*UNREAD_LIST_FIELDS)
+        .order_by('-datetime_received')[:batch_size]
+    )
+    return _unread_to_dicts(account, items)
+
+
+# Unread paging is keyset-based: the cursor holds the received time of the last
+# message returned and the ids already returned at exactly that time. The next
+# page asks for unread mail received at or before it, so messages marked read
+# meanwhile (which shift offset-based pages) cannot cause skips, and new arrivals
+# land before the cursor instead of pushing duplicates onto later pages.
+def _encode_unread_cursor(before: float, seen: List[str]) -> str:
+    raw = json.dumps({"before": before, "seen": seen}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_unread_cursor(cursor: str) -> Dict[str, Any]:
     try:
-        if changekey:
-            msg = _get_account().inbox.get(id=item_id, changekey=changekey)
-        else:
-            msg = _get_account().inbox.get(id=item_id)
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return {"before": float(data["before"]), "seen": list(data.get("seen") or [])}
     except Exception as e:
-        return {"error": f"Fetch failed: {str(e)}"}
+        raise ValueError(f"Invalid unread cursor: {e}")
 
-    if not isinstance(msg, Message):
-        return {"error": "Not a message"}
 
+def get_unread_page(page_size: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One page of unread inbox messages, newest first, with a continuation token.
+
+    Args:
+        page_size: Messages per page
+        cursor: next_cursor from the previous page (None = start at the newest unread)
+
+    Returns:
+        {"emails": [...same dicts as get_unread_batch...], "next_cursor": str or None when exhausted}
+    """
+    page_size = max(1, int(page_size))
+    account = _get_account()
+    query = account.inbox.filter(is_read=False)
+    seen: set = set()
+    if cursor:
+        state = _decode_unread_cursor(cursor)
+        seen = set(state["seen"])
+        query = query.filter(datetime_received__lte=_ews_datetime(state["before"]))
+    # Over-fetch by the ids already returned at the boundary timestamp, then drop them
+    fetched = list(
+        query.only(*UNREAD_LIST_FIELDS)
+        .order_by('-datetime_received')[:page_size + len(seen)]
+    )
+    items = [m for m in fetched if m.id not in seen][:page_size]
+    exhausted = len(fetched) < page_size + len(seen)
+    next_cursor = None
+    if items and not exhausted:
+        last = _ts(items[-1].datetime_received)
+        same = [m.id for m in items if _ts(m.datetime_received) == last]
+        if cursor and last == state["before"]:
+            same = list(seen) + same
+        next_cursor = _encode_unread_cursor(last, same)
+    return {"emails": _unread_to_dicts(account, items), "next_cursor": next_cursor}
+
+
+# ====================== READ EMAIL (with optional thread) ======================
+def _body_text(msg) -> str:
+    """Compact text of a fetched message body (converted once per id/changekey)."""
+    body = getattr(msg, "body", None)
+    if body is None:
+        return getattr(msg, "text_body", None) or ""
+    return body_to_text(str(body), is_html=isinstance(body, HTMLBody), cache_key=(msg.id, msg.changekey))
+
+
+def _message_to_dict(msg, include_html: bool = False) -> Dict[str, Any]:
+    """
+    Convert a fetched Message into the JSON-safe dict returned by read_email.
+    Carries the compact body_text; body_html only when include_html is set.
+    """
     to_list = [r.email_address for r in (msg.to_recipients or [])]
     cc_list = [r.email_address for r in (msg.cc_recipients or [])]
     bcc_list = [r.email_address for r in (msg.bcc_recipients or [])]
 
-    body_html = str(msg.body) if msg.body is not None else ""
-    body_text = msg.text_body or ""
-    body = body_text or body_html or ""
-
     res = {
         "id": msg.id,
         "changekey": msg.changekey,
         "subject": msg.subject or "(no subject)",
-        "body_html": body_html,
-        "body_text": body_text,
-        "body": body,
+        "body_text": _body_text(msg),
         "sender": {"name": msg.sender.name if msg.sender else "", "email": msg.sender.email_address if msg.sender else ""},
         "to": to_list,
         "cc": cc_list,
@@ -430,63 +847,535 @@ def read_email(item_id: str, changekey: str, include_thread: bool = False) -> Di
         "datetime_received": msg.datetime_received.isoformat() if msg.datetime_received else None,
         "conversation_id": _conv_to_str(getattr(msg, "conversation_id", None)),
     }
+    if include_html:
+        res["body_html"] = str(msg.body) if msg.body is not None else ""
+    return res
+
+
+def _thread_entry_to_dict(m) -> Dict[str, Any]:
+    """Convert a conversation member Message into a thread entry dict."""
+    return {
+        "id": m.id,
+        "changekey": m.changekey,
+        "subject": m.subject,
+        "body_text": _body_text(m),
+        "sender_email": (m.sender and getattr(m.sender, "email_address", None)) or "",
+        "sender_name": (m.sender and getattr(m.sender, "name", None)) or "",
+        "received": m.datetime_received.isoformat() if m.datetime_received else None,
+        "is_read": bool(m.is_read),
+        "conversation_id": _conv_to_str(getattr(m, "conversation_id", None)),
+    }
+
+
+def _fetch_item(account: Account, item_id: str, changekey: Optional[str], fields=None):
+    """
+    One GetItem (restricted to fields when given); retried without the changekey if it
+    is stale. Account.fetch yields its results, so the single item is taken with next().
+    """
+    kwargs = {"only_fields": list(fields)} if fields else {}
+    msg = None
+    for ck in ([changekey, None] if changekey else [None]):
+        msg = next(iter(account.fetch(ids=[(item_id, ck)], **kwargs)), None)
+        if msg is not None and not isinstance(msg, Exception):
+            return msg
+    raise msg if isinstance(msg, Exception) else LookupError(f"item {item_id} not returned")
+
+
+def _fetch_message(item_id: str, changekey: Optional[str], fields: tuple):
+    """One GetItem restricted to fields; retried without the changekey if it is stale."""
+    return _fetch_item(_get_account(), item_id, changekey, fields)
+
+
+def get_email_html(item_id: str, changekey: str = "") -> str:
+    """The raw HTML body of a message, loaded on demand (fetch paths carry text only)."""
+    msg = _fetch_message(item_id, changekey, ("body",))
+    return str(msg.body) if msg.body is not None else ""
+
+
+def read_email(item_id: str, changekey: str, include_thread: bool = False,
+               include_html: bool = False) -> Dict[str, Any]:
+    """
+    Fetch a message by id (and changekey) and return JSON-serializable fields.
+    If include_thread=True, also include 'thread' key with the conversation messages.
+    The body is returned as compact text (body_text); include_html=True adds body_html.
+    Served from the sweep prefetch cache when the message was prefetched.
+    """
+    if not item_id:
+        return {"error": "item_id required"}
+
+    cached = _get_prefetched(item_id, changekey, include_thread)
+    if cached is not None:
+        if include_html:
+            try:
+                cached["body_html"] = get_email_html(item_id, cached.get("changekey") or changekey)
+            except Exception as e:
+                return {"error": f"Fetch failed: {str(e)}"}
+        return cached
+
+    try:
+        msg = _fetch_message(item_id, changekey, MESSAGE_FIELDS)
+    except Exception as e:
+        return {"error": f"Fetch failed: {str(e)}"}
+
+    if not isinstance(msg, Message):
+        return {"error": "Not a message"}
+
+    res = _message_to_dict(msg, include_html=include_html)
 
     if include_thread:
         convo = getattr(msg, "conversation_id", None)
         if convo:
-            try:
-                items = _get_account().inbox.filter(conversation_id=convo).order_by('datetime_received')
-                thread = []
-                for m in items:
-                    thread.append({
-                        "id": m.id,
-                        "changekey": m.changekey,
-                        "subject": m.subject,
-                        "body_text": getattr(m, "text_body", None) or "",
-                        "body_html": str(getattr(m, "body", "")) or "",
-                        "sender_email": (m.sender and getattr(m.sender, "email_address", None)) or "",
-                        "sender_name": (m.sender and getattr(m.sender, "name", None)) or "",
-                        "received": m.datetime_received.isoformat() if m.datetime_received else None,
-                        "is_read": bool(m.is_read),
-                        "conversation_id": _conv_to_str(getattr(m, "conversation_id", None)),
-                    })
-                res["thread"] = thread
-            except Exception:
-                res["thread"] = []
+            res["thread"] = get_thread_for(convo, item_id=msg.id, changekey=msg.changekey)
         else:
-            res["thread"] = [res]  # single message as thread
+            res["thread"] = [{k: v for k, v in res.items() if k != "body_html"}]  # single message as thread
     return res
 
 
-# ====================== MARK READ / IGNORE ======================
-def mark_as_read(item_id: str, changekey: str, move_to: Optional[str] = None) -> str:
+# ====================== SWEEP PREFETCH ======================
+# Messages (with threads) bulk-fetched at the start of an autopilot sweep.
+# read_email() serves these without further Exchange round trips.
+PREFETCH_CHUNK_SIZE = int(os.getenv("EWS_PREFETCH_CHUNK_SIZE", "50"))
+_prefetch_cache: Dict[str, Dict[str, Any]] = {}
+
+
+def _get_prefetched(item_id: str, changekey: str, include_thread: bool) -> Optional[Dict[str, Any]]:
+    """Return a copy of a prefetched message if it is cached and still current."""
+    entry = _prefetch_cache.get(item_id)
+    if entry is None:
+        return None
+    if changekey and entry.get("changekey") and changekey != entry.get("changekey"):
+        return None
+    res = dict(entry)
+    if include_thread:
+        res["thread"] = [dict(t) for t in entry.get("thread", [])]
+    else:
+        res.pop("thread", None)
+    return res
+
+
+def clear_prefetch_cache(item_ids: Optional[List[str]] = None) -> None:
+    """Drop prefetched messages (call at the end of a sweep); only item_ids when given."""
+    if item_ids is None:
+        _prefetch_cache.clear()
+        return
+    for mid in item_ids:
+        _prefetch_cache.pop(mid, None)
+
+
+def prefetch_messages_with_threads(items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Bulk-fetch full messages and their conversation threads for a set of candidates.
+
+    Issues one GetItem (account.fetch) for all messages and one conversation_id__in
+    query over inbox + Sent Items per PREFETCH_CHUNK_SIZE conversations instead of
+    2 round trips per email.
+
+    Args:
+        items: Mail metadata dicts with at least "id" (and optionally "changekey")
+
+    Returns:
+        Dict mapping item id -> read_email-shaped dict (with "thread")
+    """
+    ids = []
+    seen = set()
+    for it in items or []:
+        mid = it.get("id")
+        if mid and mid not in seen:
+            seen.add(mid)
+            ids.append((mid, it.get("changekey") or None))
+    if not ids:
+        return {}
+
     account = _get_account()
+    fetched: Dict[str, Dict[str, Any]] = {}
+    convo_objs: Dict[str, Any] = {}
     try:
-        msg = account.inbox.get(id=item_id, changekey=changekey)
-    except:
-        msg = account.inbox.get(id=item_id)  # fallback to latest changekey
-    msg.is_read = True
-    if move_to:
-        well_known = {
-            "Junk Email": account.junk,
-            "Deleted Items": account.trash,
-            "Sent Items": account.sent,
-        }
-        target = well_known.get(move_to)
-        if not target:
-            try:
-                target = account.root / move_to
-            except:
-                target = None
-        if target:
+        for msg in account.fetch(ids=ids, only_fields=list(MESSAGE_FIELDS)):
+            if isinstance(msg, Exception) or not isinstance(msg, Message):
+                continue
+            fetched[msg.id] = _message_to_dict(msg)
+            convo = getattr(msg, "conversation_id", None)
+            if convo:
+                convo_objs.setdefault(_conv_to_str(convo), convo)
+    except Exception as e:
+        logging.warning(f"[prefetch] Bulk message fetch failed: {e}")
+        return {}
+
+    threads = fetch_conversation_threads(list(convo_objs.values()))
+
+    for mid, res in fetched.items():
+        key = res.get("conversation_id")
+        if key and key in threads:
+            res["thread"] = threads[key]
+        elif not key:
+            res["thread"] = [dict(res)]
+        else:
+            continue  # thread unknown: let read_email fetch it on demand
+        _prefetch_cache[mid] = res
+
+    logging.info(f"[prefetch] Prefetched {len(fetched)} messages across {len(convo_objs)} conversations")
+    return {mid: _prefetch_cache[mid] for mid in fetched if mid in _prefetch_cache}
+
+
+# ====================== CONVERSATION CACHE ======================
+# Threads span the inbox and Sent Items and are fetched with one FindItem over both
+# folders. They are cached per (mailbox, conversation id) and reused while the item
+# being read is still in the cached thread with the same changekey and a cheap probe
+# (conversation_id/datetime_received only) shows no new or removed members; sends,
+# replies, forwards and mark-read drop the entry, and entries expire after
+# EWS_CONVERSATION_CACHE_TTL.
+CONVERSATION_CACHE_TTL = int(os.getenv("EWS_CONVERSATION_CACHE_TTL", "300"))
+CONVERSATION_CACHE_SIZE = int(os.getenv("EWS_CONVERSATION_CACHE_SIZE", "500"))
+THREAD_FIELDS = ("subject", "body", "sender", "datetime_received", "is_read", "conversation_id")
+
+_conversation_cache: OrderedDict = OrderedDict()
+_conversation_lock = threading.Lock()
+
+
+def _conversation_key(convo_key: str) -> tuple:
+    return ((current_email() or "").lower(), convo_key)
+
+
+def _thread_folders(account: Account):
+    """Inbox + Sent Items as one FindItem target."""
+    from exchangelib.folders import FolderCollection
+    return FolderCollection(account=account, folders=[account.inbox, account.sent])
+
+
+def _cache_thread(convo_key: str, thread: List[Dict[str, Any]]) -> None:
+    key = _conversation_key(convo_key)
+    with _conversation_lock:
+        _conversation_cache[key] = {"thread": thread, "at": time.time()}
+        _conversation_cache.move_to_end(key)
+        while len(_conversation_cache) > CONVERSATION_CACHE_SIZE:
+            _conversation_cache.popitem(last=False)
+
+
+def _cached_thread(convo_key: str, item_id: Optional[str] = None,
+                   changekey: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """Cached thread if fresh and (when given) still containing item_id at changekey."""
+    key = _conversation_key(convo_key)
+    with _conversation_lock:
+        entry = _conversation_cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["at"] > CONVERSATION_CACHE_TTL:
+            _conversation_cache.pop(key, None)
+            return None
+        thread = entry["thread"]
+        if item_id:
+            member = next((t for t in thread if t.get("id") == item_id), None)
+            if member is None or (changekey and member.get("changekey") != changekey):
+                _conversation_cache.pop(key, None)  # new mail in the conversation
+                return None
+        _conversation_cache.move_to_end(key)
+        return [dict(t) for t in thread]
+
+
+def invalidate_conversation(conversation_id: Any) -> None:
+    """Drop one cached conversation of the current mailbox (no-op for None)."""
+    convo_key = _conv_to_str(conversation_id)
+    if not convo_key:
+        return
+    with _conversation_lock:
+        _conversation_cache.pop(_conversation_key(convo_key), None)
+
+
+def invalidate_mailbox_conversations() -> None:
+    """
+    Drop every cached conversation of the current mailbox. Used after standalone sends
+    (send_mail, send_follow_up), whose conversation id is not known when they go out.
+    """
+    mailbox = (current_email() or "").lower()
+    with _conversation_lock:
+        for key in [k for k in _conversation_cache if k[0] == mailbox]:
+            _conversation_cache.pop(key, None)
+
+
+def clear_conversation_cache() -> None:
+    with _conversation_lock:
+        _conversation_cache.clear()
+
+
+def _thread_signature(thread: List[Dict[str, Any]]) -> tuple:
+    """(member count, latest received) of a thread; compared against _conversation_signatures."""
+    return len(thread), max((t.get("received") or "" for t in thread), default="")
+
+
+def _conversation_signatures(account: Account, conversations: List[Any]) -> Dict[str, tuple]:
+    """
+    Current (member count, latest received) per conversation from one FindItem over
+    the thread folders, projected to conversation_id and datetime_received only.
+    """
+    def _probe(folders):
+        return list(folders.filter(conversation_id__in=conversations).only("conversation_id", "datetime_received"))
+
+    try:
+        items = _probe(_thread_folders(account))
+    except Exception:
+        items = _probe(account.inbox)
+    counts: Dict[str, int] = {}
+    latest: Dict[str, str] = {}
+    for m in items:
+        key = _conv_to_str(getattr(m, "conversation_id", None))
+        received = m.datetime_received.isoformat() if getattr(m, "datetime_received", None) else ""
+        counts[key] = counts.get(key, 0) + 1
+        latest[key] = max(latest.get(key, ""), received)
+    return {key: (counts[key], latest[key]) for key in counts}
+
+
+def _current_cached_threads(requests: Dict[str, tuple]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Cached threads that are still current.
+
+    Args:
+        requests: conversation key -> (conversation id object, item_id, changekey)
+
+    A cached thread must contain item_id at changekey and match the conversation's
+    current member count and latest datetime_received (one batched probe for all of
+    them), so mail that arrived after caching invalidates it even when an older
+    member is read. Stale entries are dropped; callers fetch those threads afresh.
+    """
+    hits: Dict[str, List[Dict[str, Any]]] = {}
+    for key, (_, item_id, changekey) in requests.items():
+        thread = _cached_thread(key, item_id, changekey)
+        if thread is not None:
+            hits[key] = thread
+    if not hits:
+        return hits
+    try:
+        current = _conversation_signatures(_get_account(), [requests[k][0] for k in hits])
+    except Exception as e:
+        logging.info(f"[threads] Freshness probe failed ({e}); refetching {len(hits)} cached threads")
+        current = {}
+    for key in list(hits):
+        if current.get(key) != _thread_signature(hits[key]):
+            invalidate_conversation(key)
+            del hits[key]
+    return hits
+
+
+def fetch_conversation_threads(conversations: List[Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Threads (inbox + sent, oldest first) for many conversations in batched queries.
+
+    Args:
+        conversations: ConversationId objects (or their string ids)
+
+    Returns:
+        Dict conversation id -> thread entries; conversations whose query failed are absent
+    """
+    account = _get_account()
+    convo_objs = {}
+    for c in conversations or []:
+        if c:
+            convo_objs.setdefault(_conv_to_str(c), c)
+    threads: Dict[str, List[Dict[str, Any]]] = {}
+    convo_list = list(convo_objs.values())
+    for i in range(0, len(convo_list), PREFETCH_CHUNK_SIZE):
+        chunk = convo_list[i:i + PREFETCH_CHUNK_SIZE]
+        chunk_threads: Dict[str, List[Dict[str, Any]]] = {_conv_to_str(c): [] for c in chunk}
+        try:
             try:
-                msg.move(to_folder=target)
-            except:
-                msg.save()
+                qs = _thread_folders(account).filter(conversation_id__in=chunk)
+                items = list(qs.only(*THREAD_FIELDS).order_by('datetime_received'))
+            except Exception as e:
+                logging.info(f"[threads] Inbox+Sent query failed ({e}); using inbox only")
+                qs = account.inbox.filter(conversation_id__in=chunk)
+                items = list(qs.only(*THREAD_FIELDS).order_by('datetime_received'))
+            for m in items:
+                key = _conv_to_str(getattr(m, "conversation_id", None))
+                if key in chunk_threads:
+                    chunk_threads[key].append(_thread_entry_to_dict(m))
+        except Exception as e:
+            logging.warning(f"[threads] Thread query failed for {len(chunk)} conversations: {e}")
+            continue
+        for key, thread in chunk_threads.items():
+            _cache_thread(key, thread)
+            threads[key] = [dict(t) for t in thread]
+    return threads
+
+
+def get_thread_for(conversation_id: Any, item_id: Optional[str] = None,
+                   changekey: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Thread of one conversation, from the cache when it is still current."""
+    convo_key = _conv_to_str(conversation_id)
+    if not convo_key:
+        return []
+    cached = _current_cached_threads({convo_key: (conversation_id, item_id, changekey)}).get(convo_key)
+    if cached is not None:
+        return cached
+    return fetch_conversation_threads([conversation_id]).get(convo_key, [])
+
+
+# ====================== MARK READ / IGNORE ======================
+def _resolve_folder(account: Account, name: str):
+    """Well-known folder by display name, else a folder path under the mailbox root (None if missing)."""
+    well_known = {
+        "Inbox": account.inbox,
+        "Junk Email": account.junk,
+        "Deleted Items": account.trash,
+        "Sent Items": account.sent,
+    }
+    target = well_known.get(name)
+    if target is None:
+        try:
+            target = account.root / name
+        except Exception:
+            target = None
+    return target
+
+
+def _item_refs(items: List[Union[str, Dict[str, Any]]]) -> List[tuple]:
+    """(id, changekey) pairs from ids or mail dicts, deduplicated, order kept."""
+    refs, seen = [], set()
+    for it in items or []:
+        item_id, changekey = (it, None) if isinstance(it, str) else (it.get("id") or it.get("item_id"), it.get("changekey"))
+        if item_id and item_id not in seen:
+            seen.add(item_id)
+            refs.append((item_id, changekey or None))
+    return refs
+
+
+def _current_items(account: Account, refs: List[tuple], results: Dict[str, Dict[str, Any]]) -> List[Any]:
+    """
+    One GetItem (is_read/conversation_id only) for current changekeys; ids that cannot
+    be fetched get an error result.
+    """
+    items = []
+    for i in range(0, len(refs), PREFETCH_CHUNK_SIZE):
+        chunk = [(item_id, None) for item_id, _ in refs[i:i + PREFETCH_CHUNK_SIZE]]
+        try:
+            for (item_id, _), item in zip(chunk, account.fetch(ids=chunk, only_fields=["is_read", "conversation_id"])):
+                if isinstance(item, Exception) or not getattr(item, "id", None):
+                    results[item_id] = {"id": item_id, "ok": False, "error": str(item)}
+                else:
+                    items.append(item)
+        except Exception as e:
+            for item_id, _ in chunk:
+                results[item_id] = {"id": item_id, "ok": False, "error": str(e)}
+    return items
+
+
+def _apply_bulk(op, targets: List[Any], results: Dict[str, Dict[str, Any]], **kwargs) -> List[Any]:
+    """Run an exchangelib bulk_* call, record per-item outcomes; returns the items that succeeded."""
+    if not targets:
+        return []
+    try:
+        outcomes = list(op(**kwargs))
+    except Exception as e:
+        for item in targets:
+            results[item.id] = {"id": item.id, "ok": False, "error": str(e)}
+        return []
+    done = []
+    for item, outcome in zip(targets, outcomes):
+        if isinstance(outcome, Exception):
+            results[item.id] = {"id": item.id, "ok": False, "error": str(outcome)}
         else:
-            msg.save()
-    else:
-        msg.save()
+            results[item.id] = {"id": item.id, "ok": True}
+            if isinstance(outcome, tuple) and outcome and outcome[0] and outcome[0] != item.id:
+                results[item.id]["new_id"] = outcome[0]
+            done.append(item)
+    return done
+
+
+def _ordered_results(refs: List[tuple], results: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [results.get(item_id, {"id": item_id, "ok": False, "error": "not processed"}) for item_id, _ in refs]
+
+
+def get_item_states(item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Current changekey and read state of items (one GetItem per chunk, is_read only).
+    Items that no longer exist (deleted, moved) are absent from the result; a failed
+    request raises, so callers can tell "gone" from "unknown".
+    """
+    account = _get_account()
+    states: Dict[str, Dict[str, Any]] = {}
+    ids = [i for i in dict.fromkeys(item_ids or []) if i]
+    for i in range(0, len(ids), PREFETCH_CHUNK_SIZE):
+        chunk = [(item_id, None) for item_id in ids[i:i + PREFETCH_CHUNK_SIZE]]
+        for item in account.fetch(ids=chunk, only_fields=["is_read"]):
+            if isinstance(item, Exception) or not getattr(item, "id", None):
+                continue
+            states[item.id] = {"changekey": item.changekey, "is_read": bool(item.is_read)}
+    return states
+
+
+def bulk_mark_as_read(items: List[Union[str, Dict[str, Any]]], move_to: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Mark many messages read (and optionally move them) in a few EWS calls:
+    one GetItem for current changekeys, one UpdateItem, one MoveItem.
+
+    Args:
+        items: Item ids or mail dicts with "id" (changekeys are refreshed, so stale ones are fine)
+        move_to: Optional folder ("Junk Email", "Deleted Items", or a path under the root)
+
+    Returns:
+        One {"id", "ok", "error"?, "new_id"?} per distinct item, in input order
+    """
+    account = _get_account()
+    refs = _item_refs(items)
+    results: Dict[str, Dict[str, Any]] = {}
+    current = _current_items(account, refs, results)
+    unread = [m for m in current if not m.is_read]
+    already = [m for m in current if m.is_read]
+    for m in already:
+        results[m.id] = {"id": m.id, "ok": True}
+    for m in unread:
+        m.is_read = True
+    updated = _apply_bulk(
+        account.bulk_update, unread, results,
+        items=[(m, ["is_read"]) for m in unread],
+    ) + already
+    if move_to and updated:
+        target = _resolve_folder(account, move_to)
+        if target is None:
+            for m in updated:
+                results[m.id]["error"] = f"folder '{move_to}' not found; left in place"
+        else:
+            # bulk_update changed the changekeys; move by id only
+            _apply_bulk(account.bulk_move, updated, results, ids=[(m.id, None) for m in updated], to_folder=target)
+    for m in current:
+        invalidate_conversation(getattr(m, "conversation_id", None))
+    return _ordered_results(refs, results)
+
+
+def bulk_move(items: List[Union[str, Dict[str, Any]]], folder: str) -> List[Dict[str, Any]]:
+    """Move many messages to a folder in one MoveItem call (per-item results, input order)."""
+    account = _get_account()
+    refs = _item_refs(items)
+    results: Dict[str, Dict[str, Any]] = {}
+    target = _resolve_folder(account, folder)
+    if target is None:
+        return [{"id": item_id, "ok": False, "error": f"folder '{folder}' not found"} for item_id, _ in refs]
+    current = _current_items(account, refs, results)
+    _apply_bulk(account.bulk_move, current, results, ids=[(m.id, m.changekey) for m in current], to_folder=target)
+    for m in current:
+        invalidate_conversation(getattr(m, "conversation_id", None))
+    return _ordered_results(refs, results)
+
+
+def bulk_delete(items: List[Union[str, Dict[str, Any]]], hard: bool = False) -> List[Dict[str, Any]]:
+    """Delete many messages in one DeleteItem call (to Deleted Items unless hard=True)."""
+    from exchangelib.items import HARD_DELETE, MOVE_TO_DELETED_ITEMS
+    account = _get_account()
+    refs = _item_refs(items)
+    results: Dict[str, Dict[str, Any]] = {}
+    current = _current_items(account, refs, results)
+    _apply_bulk(
+        account.bulk_delete, current, results,
+        ids=[(m.id, m.changekey) for m in current],
+        delete_type=HARD_DELETE if hard else MOVE_TO_DELETED_ITEMS,
+    )
+    for m in current:
+        invalidate_conversation(getattr(m, "conversation_id", None))
+    return _ordered_results(refs, results)
+
+
+def mark_as_read(item_id: str, changekey: str, move_to: Optional[str] = None) -> str:
+    result = bulk_mark_as_read([{"id": item_id, "changekey": changekey}], move_to=move_to)[0]
+    if not result.get("ok"):
+        raise RuntimeError(result.get("error") or "mark read failed")
     return f"Marked read{(' to ' + move_to) if move_to else ''}"
 
 
@@ -527,6 +1416,16 @@ def _build_quoted_original(original_message) -> str:
 """
 
 
+def _reply_original(account: Account, item_id: str, changekey: Optional[str]):
+    """Sender only: enough to check that a reply target exists and is not our own message."""
+    return _fetch_item(account, item_id, changekey, ["sender"])
+
+
+def _is_own_message(msg) -> bool:
+    sender = getattr(getattr(msg, "sender", None), "email_address", None) or ""
+    return bool(sender) and sender.lower() == (current_email() or "").lower()
+
+
 def reply_to_email(
     item_id: str,
     changekey: str,
@@ -548,12 +1447,26 @@ def reply_to_email(
         attachments: Optional file paths to attach
         save_as_draft: If True, save reply as draft instead of sending
     """
-    
     account = _get_account()
+    if not save_as_draft and outbox_active():
+        # Validate before queueing so a bad id fails now, not after the outbox's retries
+        try:
+            probe = _reply_original(account, item_id, changekey)
+        except Exception as e:
+            return f"[Error] Cannot reply: original message not found ({type(e).__name__}: {e})"
+        if _is_own_message(probe):
+            return "[Error] Cannot reply to own message"
+        return _queue_send(
+            "reply_to_email", item_id=item_id, changekey=changekey, body_html=body_html,
+            cc_recipients=cc_recipients, bcc_recipients=bcc_recipients, attachments=attachments,
+        )
+    
     try:
         original = account.inbox.get(id=item_id, changekey=changekey) if changekey else account.inbox.get(id=item_id)
     except:
         original = account.inbox.get(id=item_id)
+    if not save_as_draft and _is_own_message(original):
+        return "[Error] Cannot reply to own message"
 
     # For drafts, create a regular Message (ReplyToItem doesn't support folder)
     if save_as_draft:
@@ -644,6 +1557,7 @@ def reply_to_email(
                         reply.attach(FileAttachment(name=os.path.basename(path), content=f.read()))
         
         reply.send()
+        invalidate_conversation(getattr(original, "conversation_id", None))
         
         # Mark original as read
         try:
@@ -664,7 +1578,10 @@ def follow_up_thread(item_id: str, changekey: str, body_html: str) -> str:
     thread = get_conversation_thread(item_id=item_id, changekey=changekey)
     if not thread:
         return "No thread found."
-    latest = thread[-1]
+    # Threads include our own sent replies; reply to the latest message someone else sent
+    own = (current_email() or "").lower()
+    inbound = [t for t in thread if (t.get("sender_email") or "").lower() != own]
+    latest = (inbound or thread)[-1]
     try:
         return reply_to_email(item_id=latest["id"], changekey=latest.get("changekey", ""), body_html=body_html, attachments=None)
     except Exception as e:
@@ -684,8 +1601,12 @@ def send_follow_up(
     Args:
         save_as_draft: If True, save as draft instead of sending
     """
-    if to_email == EMAIL:
+    if to_email == current_email():
         return f"Can't send mail to self!"
+    if not save_as_draft:
+        queued = _queue_send("send_follow_up", to_email=to_email, subject=subject, body_html=body_html)
+        if queued:
+            return queued
     m = Message(
         account=_get_account(),
         subject=subject,
@@ -699,6 +1620,7 @@ def send_follow_up(
         return f"Follow-up draft saved for {to_email}"
     else:
         m.send()
+        invalidate_mailbox_conversations()
         return f"Follow-up sent to {to_email}"
 
 
@@ -718,6 +1640,7 @@ def escalate_to_human(item_id: str, changekey: str, reason: str) -> str:
     )
 
     fwd.send()
+    invalidate_conversation(getattr(msg, "conversation_id", None))
 
     try:
         msg.is_read = True
@@ -729,38 +1652,179 @@ def escalate_to_human(item_id: str, changekey: str, reason: str) -> str:
 
 
 # ====================== CALENDAR & SCHEDULING ======================
+# Calendar reads go through a cache of UTC day buckets. A miss fetches every missing
+# day of the requested window with one CalendarView (recurring meetings expanded), so
+# a run of availability probes costs one calendar request per day range. Buckets
+# expire after CALENDAR_CACHE_TTL; meetings and ICS invites we create are written
+# through into the cached buckets.
+CALENDAR_CACHE_TTL = float(os.getenv("EWS_CALENDAR_CACHE_TTL", "120"))
+FREEBUSY_HORIZON_DAYS = int(os.getenv("EWS_FREEBUSY_HORIZON_DAYS", "14"))
+FREEBUSY_TZ = os.getenv("EWS_FREEBUSY_TZ", "")
+CALENDAR_FIELDS = ("subject", "start", "end", "organizer", "required_attendees", "legacy_free_busy_status")
+
+_calendar_cache: Dict[tuple, tuple] = {}   # (mailbox, date) -> (fetched_at, {key: entry})
+_calendar_lock = threading.Lock()
+
+
+def _calendar_entry(it, key: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "subject": it.subject,
+        "start": it.start.isoformat() if it.start else None,
+        "end": it.end.isoformat() if it.end else None,
+        "organizer": str(getattr(it, "organizer", None)),
+        "required_attendees": [str(getattr(a.mailbox, "email_address", None)) for a in (it.required_attendees or [])],
+        "_key": key or getattr(it, "id", None) or f"{it.start}|{it.subject}",
+        "_start": it.start,
+        "_end": it.end,
+        "_busy": getattr(it, "legacy_free_busy_status", None) != "Free",
+    }
+
+
+def _utc_days(start: datetime, end: datetime) -> List[Any]:
+    first = start.astimezone(timezone.utc).date()
+    last = max(start, end - timedelta(microseconds=1)).astimezone(timezone.utc).date()
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def _day_start(day) -> datetime:
+    return EWSDateTime(day.year, day.month, day.day, tzinfo=EWSTimeZone("UTC"))
+
+
+def _calendar_window(start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Cached calendar entries overlapping [start, end), ordered by start."""
+    mailbox = current_email().lower()
+    days = _utc_days(start, end)
+    now = time.monotonic()
+    with _calendar_lock:
+        missing = [d for d in days
+                   if now - _calendar_cache.get((mailbox, d), (float("-inf"), None))[0] >= CALENDAR_CACHE_TTL]
+
+    runs: List[List[Any]] = []
+    for d in missing:
+        if runs and (d - runs[-1][-1]).days == 1:
+            runs[-1].append(d)
+        else:
+            runs.append([d])
+    account = _get_account() if runs else None
+    for run in runs:
+        buckets: Dict[Any, Dict[str, Dict[str, Any]]] = {d: {} for d in run}
+        lo, hi = _day_start(run[0]), _day_start(run[-1] + timedelta(days=1))
+        for it in account.calendar.view(start=lo, end=hi).only(*CALENDAR_FIELDS):
+            if not (it.start and it.end):
+                continue
+            entry = _calendar_entry(it)
+            for d in _utc_days(max(it.start, lo), min(it.end, hi)):
+                if d in buckets:
+                    buckets[d][entry["_key"]] = entry
+        with _calendar_lock:
+            for d, entries in buckets.items():
+                _calendar_cache[(mailbox, d)] = (now, entries)
+            if len(_calendar_cache) > 5000:
+                for k in [k for k, v in _calendar_cache.items() if now - v[0] >= CALENDAR_CACHE_TTL]:
+                    _calendar_cache.pop(k, None)
+
+    seen: Dict[str, Dict[str, Any]] = {}
+    with _calendar_lock:
+        for d in days:
+            for key, entry in (_calendar_cache.get((mailbox, d)) or (0, {}))[1].items():
+                if entry["_start"] < end and entry["_end"] > start:
+                    seen[key] = entry
+    return sorted(seen.values(), key=lambda e: e["_start"])
+
+
+def _calendar_write_through(entry: Dict[str, Any]) -> None:
+    """Add an item we just created to the cached buckets it overlaps (uncached days are left alone)."""
+    mailbox = current_email().lower()
+    with _calendar_lock:
+        for d in _utc_days(entry["_start"], entry["_end"]):
+            bucket = _calendar_cache.get((mailbox, d))
+            if bucket:
+                bucket[1][entry["_key"]] = entry
+
+
+def invalidate_calendar() -> None:
+    """Drop this mailbox's cached calendar days (e.g. after changes made elsewhere)."""
+    mailbox = current_email().lower()
+    with _calendar_lock:
+        for k in [k for k in _calendar_cache if k[0] == mailbox]:
+            _calendar_cache.pop(k, None)
+
+
 def get_calendar_items(range_start: datetime, range_end: datetime) -> List[Dict[str, Any]]:
     """
     Return calendar items between range_start and range_end (inclusive).
     """
-    account = _get_account()
-    items = account.calendar.filter(start__range=(range_start, range_end)).order_by('start')
-    res = []
-    for it in items:
-        res.append({
-            "subject": it.subject,
-            "start": it.start.isoformat() if it.start else None,
-            "end": it.end.isoformat() if it.end else None,
-            "organizer": str(getattr(it, "organizer", None)),
-            "required_attendees": [str(getattr(a.mailbox, "email_address", None)) for a in (it.required_attendees or [])],
-        })
-    return res
+    return [
+        {k: v for k, v in e.items() if not k.startswith("_")}
+        for e in _calendar_window(range_start, range_end + timedelta(microseconds=1))
+        if range_start <= e["_start"] <= range_end
+    ]
 
 
-def is_slot_available(start_iso: str, duration_minutes: int = 30) -> bool:
-    """
-    Check if the account's calendar has any event overlapping the proposed slot.
-    """
-    tz = EWSTimeZone.localzone()
+def _scheduling_tz(tz_name: Optional[str] = None):
+    name = tz_name or FREEBUSY_TZ
+    if name:
+        try:
+            from zoneinfo import ZoneInfo as _ZoneInfo
+            return _ZoneInfo(name)
+        except Exception:
+            logging.warning(f"Unknown timezone '{name}', using local time")
+    return EWSTimeZone.localzone()
+
+
+def _parse_slot_start(start_iso: str, tz) -> datetime:
     try:
         start = datetime.fromisoformat(start_iso)
     except Exception:
         start = datetime.now(tz)
     if start.tzinfo is None:
         start = start.replace(tzinfo=tz)
+    return start
+
+
+def _own_busy_index(start: datetime, end: datetime) -> BusyIndex:
+    """
+    Busy index for [start, end) from the day-bucket cache. Misses prefetch
+    FREEBUSY_HORIZON_DAYS so follow-up probes at nearby times stay cached.
+    """
+    _calendar_window(start, max(end, start + timedelta(days=FREEBUSY_HORIZON_DAYS)))
+    return BusyIndex((e["_start"], e["_end"]) for e in _calendar_window(start, end) if e["_busy"])
+
+
+def _attendee_busy_index(attendees: List[str], start: datetime, end: datetime) -> BusyIndex:
+    """Merged busy time of the attendees via GetUserAvailability (one request for all)."""
+    emails = [a.strip() for a in attendees if a and a.strip() and a.strip().lower() != current_email().lower()]
+    if not emails:
+        return BusyIndex()
+    account = _get_account()
+    tz = account.default_timezone
+    views = account.protocol.get_free_busy_info(
+        accounts=[(email, "Required", False) for email in emails],
+        start=EWSDateTime.from_datetime(start.astimezone(tz)),
+        end=EWSDateTime.from_datetime(end.astimezone(tz)),
+        requested_view="FreeBusy",
+    )
+    busy = []
+    for email, view in zip(emails, views):
+        if isinstance(view, Exception):
+            logging.warning(f"Availability for {email} unavailable: {view}")
+            continue
+        for ev in (getattr(view, "calendar_events", None) or []):
+            if getattr(ev, "busy_type", "Busy") not in ("Free", "NoData"):
+                busy.append((ev.start, ev.end))
+    return BusyIndex(busy)
+
+
+def is_slot_available(start_iso: str, duration_minutes: int = 30,
+                      attendees: Optional[List[str]] = None) -> bool:
+    """
+    Check if the account's calendar (and, optionally, the attendees') is free for the proposed slot.
+    """
+    start = _parse_slot_start(start_iso, _scheduling_tz())
     end = start + timedelta(minutes=duration_minutes)
-    items = get_calendar_items(start - timedelta(minutes=1), end + timedelta(minutes=1))
-    return len(items) == 0
+    if not _own_busy_index(start, end).is_free(start, end):
+        return False
+    return not attendees or _attendee_busy_index(attendees, start, end).is_free(start, end)
 
 
 def find_free_slots(
@@ -769,48 +1833,28 @@ def find_free_slots(
     window_start_hour: int = 9,
     window_end_hour: int = 18,
     slot_minutes: int = 30,
-    max_slots: int = 5
+    max_slots: int = 5,
+    attendees: Optional[List[str]] = None,
+    weekdays: Optional[List[int]] = None,
+    tz_name: Optional[str] = None,
 ) -> List[str]:
     """
     Propose free slots between start_iso and start_iso + days.
     Returns list of ISO datetimes (start times) for proposed slots.
-    """
-    tz = EWSTimeZone.localzone()
-    try:
-        start_dt = datetime.fromisoformat(start_iso)
-    except Exception:
-        start_dt = datetime.now(tz)
-    if start_dt.tzinfo is None:
-        start_dt = start_dt.replace(tzinfo=tz)
 
+    Working hours are window_start_hour..window_end_hour in tz_name (default
+    EWS_FREEBUSY_TZ or local time) on the given weekdays (0=Mon, default all).
+    With attendees, a slot must also be free for every attendee.
+    """
+    tz = _scheduling_tz(tz_name)
+    start_dt = _parse_slot_start(start_iso, tz)
     end_dt = start_dt + timedelta(days=days)
-    busy = get_calendar_items(start_dt, end_dt)
-    busy_ranges = []
-    for b in busy:
-        try:
-            s = datetime.fromisoformat(b["start"])
-            e = datetime.fromisoformat(b["end"])
-            busy_ranges.append((s, e))
-        except Exception:
-            continue
-
-    proposals = []
-    cur = start_dt
-    while cur < end_dt and len(proposals) < max_slots:
-        if window_start_hour <= cur.hour < window_end_hour:
-            slot_end = cur + timedelta(minutes=slot_minutes)
-            overlap = False
-            for s, e in busy_ranges:
-                if not (slot_end <= s or cur >= e):
-                    overlap = True
-                    break
-            if not overlap:
-                proposals.append(cur.isoformat())
-        cur = cur + timedelta(minutes=slot_minutes)
-        if cur.hour >= window_end_hour:
-            cur = (cur.replace(hour=window_start_hour, minute=0, second=0, microsecond=0)
-                   + timedelta(days=1))
-    return proposals
+    index = _own_busy_index(start_dt, end_dt)
+    if attendees:
+        index = index.union(_attendee_busy_index(attendees, start_dt, end_dt))
+    hours = WorkingHours(window_start_hour, window_end_hour, weekdays=weekdays, tz=tz)
+    slots = find_slots(index, start_dt, end_dt, slot_minutes=slot_minutes, hours=hours, max_slots=max_slots)
+    return [s.isoformat() for s in slots]
 
 
 try:
@@ -859,6 +1903,7 @@ def create_demo_meeting(
 
     # valid values: 'SendOnlyToAll', 'SendToAllAndSaveCopy', 'SendToNone'
     meeting.save(send_meeting_invitations='SendToAllAndSaveCopy')
+    _calendar_write_through(_calendar_entry(meeting))
     return f"Demo scheduled: {start.isoformat()} with {customer_email}"
 
 
@@ -903,7 +1948,7 @@ def send_ical_invite(
     Send a calendar invite as an .ics attachment (METHOD:REQUEST).
     Robust fallback when EWS invites don't reach recipients.
     """
-    if customer_email == EMAIL:
+    if customer_email == current_email():
         return f"Can't send mail to self!"
     import uuid
     try:
@@ -926,7 +1971,7 @@ def send_ical_invite(
         dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
         dtstart_s = dtstart_utc.strftime("%Y%m%dT%H%M%SZ")
         dtend_s = dtend_utc.strftime("%Y%m%dT%H%M%SZ")
-        organizer = organizer_email or EMAIL or _get_account().primary_smtp_address
+        organizer = organizer_email or current_email() or _get_account().primary_smtp_address
 
         ics = (
             "BEGIN:VCALENDAR\r\n"
@@ -960,6 +2005,12 @@ def send_ical_invite(
         attachment = FileAttachment(name="invite.ics", content=ics.encode("utf-8"))
         msg.attach(attachment)
         msg.send()
+        # The invite is not on our calendar, but the slot is promised: hold it until the buckets refresh
+        _calendar_write_through({
+            "subject": subject, "start": dtstart.isoformat(), "end": dtend.isoformat(),
+            "organizer": organizer, "required_attendees": [customer_email],
+            "_key": f"ics:{uid}", "_start": dtstart, "_end": dtend, "_busy": True,
+        })
         return f"Sent ICS invite to {customer_email} (UID={uid})"
     except Exception as e:
         return f"[Error] send_ical_invite failed: {e}"
@@ -1178,11 +2229,51 @@ def _fuzzy_ratio(a: str, b: str) -> float:
 #     return results
 def _fuzzy_ratio(a: str, b: str) -> float:
     try:
-        if not a or not b:
-            return 0.0
-        return difflib.SequenceMatcher(None, a.lower(), b.lower()).ratio()
+        return fuzzy_ratio(a, b)
+    except Exception:
+        return 0.0
+
+
+# Upper bound on items scanned by the server-narrowed pass of get_messages_filtered
+FILTER_MAX_SCAN = int(os.getenv("EWS_FILTER_MAX_SCAN", "2000"))
+
+
+def _parse_filter_datetime(value: Optional[str]) -> Optional[datetime]:
+    """ISO string -> timezone-aware datetime (naive values are taken as local time)."""
+    if not value:
+        return None
+    try:
+        d = datetime.fromisoformat(value)
     except Exception:
-        return 0.0
+        return None
+    return d if d.tzinfo else d.astimezone()
+
+
+def _aqs_term(value: str) -> str:
+    """Quoted AQS phrase (quotes inside the value are dropped)."""
+    return '"' + " ".join(value.replace('"', " ").split()) + '"'
+
+
+def _messages_aqs(sender_terms: List[str], sender_domain: str, recipient_terms: List[str],
+                  subject: str, body: str) -> str:
+    """
+    AQS query string for the criteria EWS restrictions cannot express
+    (sender/recipient substrings, body). Empty when none of those are set.
+    """
+    if not (sender_terms or sender_domain or recipient_terms or body):
+        return ""
+    clauses = []
+    if sender_terms:
+        clauses.append("(" + " OR ".join(f"from:{_aqs_term(t)}" for t in sender_terms) + ")")
+    if sender_domain:
+        clauses.append(f"from:{_aqs_term(sender_domain.lstrip('@'))}")
+    if recipient_terms:
+        clauses.append("(" + " OR ".join(f"{f}:{_aqs_term(t)}" for t in recipient_terms for f in ("to", "cc")) + ")")
+    if subject:
+        clauses.append(f"subject:{_aqs_term(subject)}")
+    if body:
+        clauses.append(f"body:{_aqs_term(body)}")
+    return " AND ".join(clauses)
 
 
 def get_messages_filtered(
@@ -1211,40 +2302,36 @@ def get_messages_filtered(
     """
     Flexible message fetcher with substring + fuzzy matching using match-string params.
     - *_match_string fields accept partial strings (LLM can send 'anuj' or 'jay').
-    - Matching order: server-side quick filters (date/read) -> substring checks -> fuzzy fallback.
+    - Matching order: server-side restrictions -> substring checks -> fuzzy fallback.
     - recipient_* fields match To/CC/BCC recipients.
-    """
-    account = _get_account()
-    qs = account.inbox.all()
-    q_filters = []
-    if read is not None:
-        q_filters.append(Q(is_read=bool(read)))
-    if date_from_iso:
-        try:
-            d = datetime.fromisoformat(date_from_iso)
-            q_filters.append(Q(datetime_received__gte=d))
-        except Exception:
-            pass
-    if date_to_iso:
-        try:
-            d2 = datetime.fromisoformat(date_to_iso)
-            q_filters.append(Q(datetime_received__lte=d2))
-        except Exception:
-            pass
 
-    # Apply server-side filters when available
-    if q_filters:
-        comb = q_filters[0]
-        for q in q_filters[1:]:
-            comb = comb & q
-        qs = account.inbox.filter(comb)
+    Server side, read/date/attachment filters are restrictions and the subject is a
+    subject__icontains restriction; sender, recipient and body criteria become an AQS
+    query string (from:/to:/cc:/subject:/body:). Matches are paged until `limit` is
+    reached (at most EWS_FILTER_MAX_SCAN items). Only if that leaves fewer than
+    `limit` results does the fuzzy pass scan the latest date/read-filtered window.
+    Listing is metadata-only; bodies are bulk-loaded just for candidates that need a
+    client-side body check.
+    With MAIL_MIRROR_ENABLED the search is answered from the local mirror (mail_mirror.py).
+    """
+    from mail_mirror import search_mirror
+    mirrored = search_mirror(
+        sender_terms=[(sender_name_match_string or "").strip(), (sender_mail_match_string or "").strip()],
+        sender_domain=(sender_domain_match_string or "").strip(),
+        recipient_terms=[(recipient_name_match_string or "").strip(), (recipient_mail_match_string or "").strip()],
+        subject=(subject_match_string or "").strip(),
+        body=(body_match_string or "").strip(),
+        read=read,
+        has_attachments=has_attachments,
+        date_from=_parse_filter_datetime(date_from_iso),
+        date_to=_parse_filter_datetime(date_to_iso),
+        fuzzy_threshold=float(fuzzy_threshold or 0.90),
+        limit=int(limit),
+    )
+    if mirrored is not None:
+        return mirrored
 
-    results = []
-    prefetch = max(limit * 4, limit + 50)
-    try:
-        iterable = qs.order_by('-datetime_received')[:prefetch]
-    except Exception:
-        iterable = qs.order_by('-datetime_received')
+    account = _get_account()
 
     # normalize queries
     s_name_q = (sender_name_match_string or "").strip()
@@ -1255,245 +2342,518 @@ def get_messages_filtered(
     subj_q = (subject_match_string or "").strip()
     body_q = (body_match_string or "").strip()
     thr = float(fuzzy_threshold or 0.90)
-
-    for m in iterable:
-        try:
-            sender_email = (m.sender and getattr(m.sender, "email_address", None)) or ""
-            sender_nm = (m.sender and getattr(m.sender, "name", None)) or ""
-            subject = m.subject or ""
-            received_iso = m.datetime_received.isoformat() if m.datetime_received else None
-
-            # quick attribute filters
-            if has_attachments is not None and bool(m.has_attachments) != bool(has_attachments):
-                continue
-
-            # Sender domain quick check
-            if s_domain_q:
-                if ("@" + s_domain_q.lower()) not in sender_email.lower():
-                    continue
-
-            # Sender name/email match (substring then fuzzy)
-            if s_name_q or s_mail_q:
-                ok = False
-                if s_name_q and s_name_q.lower() in (sender_nm or "").lower():
-                    ok = True
-                if s_mail_q and s_mail_q.lower() in (sender_email or "").lower():
-                    ok = True
-                if not ok:
-                    # fuzzy fallback: check similarity against both name and email
-                    name_ratio = _fuzzy_ratio(sender_nm, s_name_q) if s_name_q else 0.0
-                    mail_ratio = _fuzzy_ratio(sender_email, s_mail_q) if s_mail_q else 0.0
-                    if max(name_ratio, mail_ratio) < thr:
-                        continue
-
-            # Recipient matching (To/CC/BCC) - substring then fuzzy
-            if r_name_q or r_mail_q:
+    limit = int(limit)
+    # Queries are prepared once; candidates are quick-rejected before scoring
+    s_name_m = FuzzyMatcher(s_name_q, thr)
+    s_mail_m = FuzzyMatcher(s_mail_q, thr)
+    r_name_m = FuzzyMatcher(r_name_q, thr)
+    subj_m = FuzzyMatcher(subj_q, thr)
+    body_m = FuzzyMatcher(body_q, thr)
+
+    date_from = _parse_filter_datetime(date_from_iso)
+    date_to = _parse_filter_datetime(date_to_iso)
+    q_filters = []
+    if read is not None:
+        q_filters.append(Q(is_read=bool(read)))
+    if date_from:
+        q_filters.append(Q(datetime_received__gte=date_from))
+    if date_to:
+        q_filters.append(Q(datetime_received__lte=date_to))
+    if has_attachments is not None:
+        q_filters.append(Q(has_attachments=bool(has_attachments)))
+
+    def _base_qs(*extra):
+        parts = q_filters + list(extra)
+        if not parts:
+            return account.inbox.all()
+        comb = parts[0]
+        for q in parts[1:]:
+            comb = comb & q
+        return account.inbox.filter(comb)
+
+    # Metadata-only listing; recipients only when they are matched on, bodies never
+    fields = LIST_FIELDS + (RECIPIENT_FIELDS if (r_name_q or r_mail_q) else ())
+
+    def _listing(qs):
+        qs = qs.only(*fields).order_by('-datetime_received')
+        qs.page_size = min(max(limit, 50), 1000)
+        return qs
+
+    def _matches_base(m) -> bool:
+        # Restrictions that an AQS query string cannot carry, re-checked client side
+        if read is not None and bool(m.is_read) != bool(read):
+            return False
+        if has_attachments is not None and bool(m.has_attachments) != bool(has_attachments):
+            return False
+        received = m.datetime_received
+        if date_to and received and received > date_to:
+            return False
+        return True
+
+    def _matches_metadata(m, fuzzy: bool) -> bool:
+        sender_email = (m.sender and getattr(m.sender, "email_address", None)) or ""
+        sender_nm = (m.sender and getattr(m.sender, "name", None)) or ""
+        subject = m.subject or ""
+
+        # Sender domain quick check
+        if s_domain_q:
+            if ("@" + s_domain_q.lower()) not in sender_email.lower():
+                return False
+
+        # Sender name/email match (substring then fuzzy)
+        if s_name_q or s_mail_q:
+            ok = False
+            if s_name_q and s_name_q.lower() in (sender_nm or "").lower():
+                ok = True
+            if s_mail_q and s_mail_q.lower() in (sender_email or "").lower():
+                ok = True
+            if not ok:
+                if not fuzzy:
+                    return False
+                # fuzzy fallback: check similarity against both name and email
+                if not (s_name_m.matches(sender_nm) or s_mail_m.matches(sender_email)):
+                    return False
+
+        # Recipient matching (To/CC/BCC) - substring then fuzzy
+        if r_name_q or r_mail_q:
+            recipients = []
+            try:
+                recipients.extend([r.email_address for r in (m.to_recipients or []) if getattr(r, "email_address", None)])
+                recipients.extend([r.email_address for r in (m.cc_recipients or []) if getattr(r, "email_address", None)])
+                recipients.extend([r.email_address for r in (m.bcc_recipients or []) if getattr(r, "email_address", None)])
+            except Exception:
                 recipients = []
-                try:
-                    recipients.extend([r.email_address for r in (m.to_recipients or []) if getattr(r, "email_address", None)])
-                    recipients.extend([r.email_address for r in (m.cc_recipients or []) if getattr(r, "email_address", None)])
-                    recipients.extend([r.email_address for r in (m.bcc_recipients or []) if getattr(r, "email_address", None)])
-                except Exception:
-                    recipients = []
-                rec_matched = False
-                # substring email/name checks (email only for recipients here)
-                for rec in recipients:
-                    if r_mail_q and r_mail_q.lower() in (rec or "").lower():
-                        rec_matched = True
-                        break
-                if not rec_matched and r_name_q:
-                    # we don't always have recipient display names via simple attribute, so fuzzy against email string
-                    for rec in recipients:
-                        if _fuzzy_ratio(rec or "", r_name_q) >= thr:
-                            rec_matched = True
-                            break
-                if not rec_matched:
-                    continue
-
-            # Subject match (substring then fuzzy)
-            if subj_q:
-                if subj_q.lower() not in (subject or "").lower():
-                    if _fuzzy_ratio(subject or "", subj_q) < thr:
-                        continue
+            rec_matched = False
+            # substring email/name checks (email only for recipients here)
+            for rec in recipients:
+                if r_mail_q and r_mail_q.lower() in (rec or "").lower():
+                    rec_matched = True
+                    break
+                if r_name_q and r_name_q.lower() in (rec or "").lower():
+                    rec_matched = True
+                    break
+            if not rec_matched and r_name_q and fuzzy:
+                # we don't always have recipient display names via simple attribute, so fuzzy against email string
+                rec_matched = r_name_m.match_any(recipients)
+            if not rec_matched:
+                return False
+
+        # Subject match (substring then fuzzy)
+        if subj_q:
+            if subj_q.lower() not in (subject or "").lower():
+                if not fuzzy or not subj_m.matches(subject):
+                    return False
+        return True
+
+    def _matches_body(body_text: str, fuzzy: bool) -> bool:
+        if body_q.lower() in body_text.lower():
+            return True
+        return fuzzy and body_m.matches(body_text[:2000])
+
+    def _to_result(m) -> Dict[str, Any]:
+        return {
+            "id": m.id,
+            "changekey": m.changekey,
+            "subject": m.subject or "",
+            "sender_email": (m.sender and getattr(m.sender, "email_address", None)) or "",
+            "sender_name": (m.sender and getattr(m.sender, "name", None)) or "",
+            "received": m.datetime_received.isoformat() if m.datetime_received else None,
+            "is_read": bool(m.is_read),
+            "has_attachments": bool(m.has_attachments),
+            "conversation_id": _conv_to_str(getattr(m, "conversation_id", None)),
+        }
 
-            # Body match (heavy): try text_body then fallback to body string
-            if body_q:
-                body_text = (getattr(m, "text_body", None) or "")
-                if not body_text:
+    results: List[Dict[str, Any]] = []
+    seen = set()
+
+    def _collect(iterable, max_scan: int, fuzzy: bool, check_body: bool) -> None:
+        """Append matches from a listing; body checks run in bulk per chunk of candidates."""
+        pending = []
+
+        def _flush_pending():
+            # Body match (heavy): bodies are loaded in one GetItem for the whole chunk
+            bodies = _load_fields(account, pending, BODY_FIELDS)
+            # Servers without TextBody (pre-2013): fall back to the raw body for those items
+            missing = [m for m in pending if not getattr(bodies.get(m.id), "text_body", None)]
+            raw_bodies = _load_fields(account, missing, ("body",)) if missing else {}
+            for m in pending:
+                body_text = (getattr(bodies.get(m.id), "text_body", None) or "")
+                if not body_text and raw_bodies.get(m.id) is not None:
                     try:
-                        body_text = str(getattr(m, "body", "") or "")
+                        body_text = _body_text(raw_bodies[m.id])
                     except Exception:
                         body_text = ""
-                if body_q.lower() not in body_text.lower():
-                    if _fuzzy_ratio(body_text[:2000], body_q) < thr:
-                        continue
-
-            # passed all checks -> append
-            results.append({
-                "id": m.id,
-                "changekey": m.changekey,
-                "subject": subject,
-                "sender_email": sender_email,
-                "sender_name": sender_nm,
-                "received": received_iso,
-                "is_read": bool(m.is_read),
-                "has_attachments": bool(m.has_attachments),
-                "conversation_id": _conv_to_str(getattr(m, "conversation_id", None)),
-            })
-            if len(results) >= int(limit):
+                if _matches_body(body_text, fuzzy) and len(results) < limit:
+                    seen.add(m.id)
+                    results.append(_to_result(m))
+            pending.clear()
+
+        scanned = 0
+        for m in iterable:
+            scanned += 1
+            if scanned > max_scan or len(results) >= limit:
                 break
-        except Exception:
-            continue
+            try:
+                if date_from and m.datetime_received and m.datetime_received < date_from:
+                    break  # newest first: everything after this is older
+                if m.id in seen:
+                    continue
+                if not _matches_base(m) or not _matches_metadata(m, fuzzy):
+                    continue
+                if check_body:
+                    pending.append(m)
+                    if len(pending) >= PREFETCH_CHUNK_SIZE:
+                        _flush_pending()
+                else:
+                    seen.add(m.id)
+                    results.append(_to_result(m))
+            except Exception:
+                continue
+        if pending and len(results) < limit:
+            _flush_pending()
+
+    # 1) server-narrowed pass (substring semantics), paged until limit
+    aqs = _messages_aqs(
+        sender_terms=[t for t in (s_name_q, s_mail_q) if t],
+        sender_domain=s_domain_q,
+        recipient_terms=[t for t in (r_name_q, r_mail_q) if t],
+        subject=subj_q,
+        body=body_q,
+    )
+    narrowed = False
+    if aqs:
+        try:
+            # A query string cannot be combined with restrictions; those are checked client side
+            _collect(_listing(account.inbox.filter(aqs)), FILTER_MAX_SCAN, fuzzy=False, check_body=False)
+            narrowed = True
+        except Exception as e:
+            logging.info(f"[get_messages_filtered] AQS search unavailable ({e}); using restrictions only")
+            results.clear()
+            seen.clear()
+    if not narrowed:
+        # Restrictions only (no AQS or AQS failed); sender/recipient/body are matched client side
+        extra = [Q(subject__icontains=subj_q)] if subj_q else []
+        try:
+            _collect(_listing(_base_qs(*extra)), FILTER_MAX_SCAN, fuzzy=False, check_body=bool(body_q))
+        except Exception as e:
+            logging.warning(f"[get_messages_filtered] Server-side filter failed: {e}")
 
-    return results
+    # 2) fuzzy fallback over the latest window (catches near-miss spellings)
+    has_text = any((s_name_q, s_mail_q, s_domain_q, r_name_q, r_mail_q, subj_q, body_q))
+    if has_text and len(results) < limit and thr < 1.0:
+        try:
+            _collect(_listing(_base_qs()), max(limit * 4, limit + 50), fuzzy=True, check_body=bool(body_q))
+        except Exception as e:
+            logging.warning(f"[get_messages_filtered] Fuzzy fallback failed: {e}")
+
+    return results[:limit]
 
 
 # ====================== THREAD / CONVERSATION (NEW) ======================
 def get_conversation_thread(item_id: str, changekey: str) -> List[Dict[str, Any]]:
     """
-    Return messages that share the same conversation_id as the given message (ordered by receive time).
+    Return the messages of the given message's conversation across inbox and
+    Sent Items (ordered by receive time), served from the conversation cache when current.
     """
+    account = _get_account()
     try:
-        original = _get_account().inbox.get(id=item_id, changekey=changekey) if changekey else _get_account().inbox.get(id=item_id)
-    except Exception:
-        try:
-            original = _get_account().inbox.get(id=item_id)
-        except Exception:
+        ids = [(item_id, changekey or None)]
+        original = next(iter(account.fetch(ids=ids, only_fields=["conversation_id"])), None)
+        if isinstance(original, Exception) and changekey:
+            original = next(iter(account.fetch(ids=[(item_id, None)], only_fields=["conversation_id"])), None)
+        if original is None or isinstance(original, Exception):
             return []
+    except Exception:
+        return []
     convo = getattr(original, "conversation_id", None)
     if not convo:
         one = read_email(item_id, changekey)
         return [one] if isinstance(one, dict) else []
+    return get_thread_for(convo, item_id=original.id, changekey=original.changekey)
+
+
+# ====================== UNRESPONDED THREADS ======================
+# Conversations are inspected in batches: per PREFETCH_CHUNK_SIZE conversations one
+# inbox and one Sent Items conversation_id__in query (projected), instead of up to
+# three queries per conversation. The incremental variant keeps a per-mailbox index
+# of last inbound / last outbound times per conversation and only lists mail newer
+# than its watermarks; it is rebuilt from scratch every EWS_UNRESPONDED_REBUILD_HOURS.
+UNRESPONDED_INDEX_FILE = os.getenv("EWS_UNRESPONDED_INDEX_FILE", "unresponded_index.json")
+UNRESPONDED_INCREMENTAL = os.getenv("EWS_UNRESPONDED_INCREMENTAL", "true").lower() == "true"
+UNRESPONDED_INDEX_MAX = int(os.getenv("EWS_UNRESPONDED_INDEX_MAX", "5000"))
+UNRESPONDED_REBUILD_HOURS = float(os.getenv("EWS_UNRESPONDED_REBUILD_HOURS", "24"))
+_unresponded_lock = threading.Lock()
+
+
+def _unresponded_index_file() -> str:
+    mailbox = current_mailbox()
+    if not mailbox or not mailbox.get("id"):
+        return UNRESPONDED_INDEX_FILE
+    root, ext = os.path.splitext(UNRESPONDED_INDEX_FILE)
+    return f"{root}.{mailbox['id']}{ext}"
+
+
+def _load_unresponded_index(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get("conversations"), dict):
+            return data
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"[unresponded] Ignoring unreadable index {path}: {e}")
+    return {}
+
+
+def _save_unresponded_index(index: Dict[str, Any], path: str) -> None:
+    try:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.warning(f"[unresponded] Failed to save index {path}: {e}")
+
+
+def _ts(dt) -> Optional[float]:
+    try:
+        return dt.timestamp() if dt else None
+    except Exception:
+        return None
+
+
+def _ews_datetime(ts: float):
     try:
-        items = _get_account().inbox.filter(conversation_id=convo).order_by('datetime_received')
+        return EWSDateTime.fromtimestamp(ts, tz=EWSTimeZone("UTC"))
     except Exception:
-        items = []
+        return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def _scan_conversations(account: Account, convos: Dict[str, Any], our_email_lower: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Inbound/outbound stats for conversations, two batched queries per chunk.
+
+    Returns:
+        Dict conversation id -> {"in_count", "out_count", "last_in_ext", "last_in_any", "inbound": [(ts, sender)]}
+    """
+    stats = {k: {"in_count": 0, "out_count": 0, "last_in_ext": None, "last_in_any": None, "inbound": []}
+             for k in convos}
+    convo_list = list(convos.values())
+    for i in range(0, len(convo_list), PREFETCH_CHUNK_SIZE):
+        chunk = convo_list[i:i + PREFETCH_CHUNK_SIZE]
         try:
-            for m in _get_account().inbox.all().order_by('datetime_received')[:2000]:
-                if _conv_to_str(getattr(m, "conversation_id", None)) == _conv_to_str(convo):
-                    items.append(m)
-        except Exception:
-            items = []
-    res = []
-    for m in items:
-        res.append({
-            "id": m.id,
-            "changekey": m.changekey,
-            "subject": m.subject,
-            "body_text": getattr(m, "text_body", None) or "",
-            "body_html": str(getattr(m, "body", "")) or "",
-            "sender_email": (m.sender and getattr(m.sender, "email_address", None)) or "",
-            "sender_name": (m.sender and getattr(m.sender, "name", None)) or "",
-            "received": m.datetime_received.isoformat() if m.datetime_received else None,
-            "is_read": bool(m.is_read),
-            "conversation_id": _conv_to_str(getattr(m, "conversation_id", None)),
-        })
-    return res
+            for m in account.inbox.filter(conversation_id__in=chunk).only("conversation_id", *THREAD_PROBE_FIELDS):
+                st = stats.get(_conv_to_str(getattr(m, "conversation_id", None)))
+                if st is not None:
+                    sender_email = (m.sender and getattr(m.sender, "email_address", "")) or ""
+                    _note_inbound(st, _ts(getattr(m, "datetime_received", None)), sender_email, our_email_lower)
+            for m in account.sent.filter(conversation_id__in=chunk).only("conversation_id"):
+                st = stats.get(_conv_to_str(getattr(m, "conversation_id", None)))
+                if st is not None:
+                    st["out_count"] += 1
+        except Exception as e:
+            logging.warning(f"[unresponded] Conversation scan failed for {len(chunk)} conversations: {e}")
+            for c in chunk:
+                stats.pop(_conv_to_str(c), None)
+    return stats
+
+
+def _note_inbound(st: Dict[str, Any], ts: Optional[float], sender_email: str, our_email_lower: str) -> None:
+    st["in_count"] += 1
+    if not ts or not sender_email:
+        return
+    st.setdefault("inbound", []).append((ts, sender_email))
+    st["last_in_any"] = max(st.get("last_in_any") or 0, ts)
+    if our_email_lower not in sender_email.lower():
+        st["last_in_ext"] = max(st.get("last_in_ext") or 0, ts)
+
+
+def _unresponded_entry(convo_key: str, conv: Dict[str, Any], only_external: bool,
+                       cutoff_ts: float) -> Optional[Dict[str, Any]]:
+    """Thread summary if we sent the last message before cutoff and nobody replied since."""
+    last_out = conv.get("last_out")
+    if not last_out or last_out > cutoff_ts:
+        return None
+    reply_ts = conv.get("last_in_ext") if only_external else conv.get("last_in_any")
+    if reply_ts and reply_ts > last_out:
+        return None
+    return {
+        "subject": (conv.get("subject") or "").strip(),
+        "conversation_id": convo_key,
+        "last_message_time": conv.get("last_out_iso") or "",
+        "last_message_id": conv.get("last_out_id"),
+        "last_changekey": conv.get("last_out_ck"),
+        "customer_email": "",
+        "thread_length": int(conv.get("in_count", 0) + conv.get("out_count", 0)) or 1,
+    }
+
+
+def _sent_conversations(sent_msgs) -> "OrderedDict[str, Dict[str, Any]]":
+    """Latest sent message per conversation (sent_msgs newest first)."""
+    latest: OrderedDict = OrderedDict()
+    for s in sent_msgs:
+        convo = getattr(s, "conversation_id", None)
+        convo_key = _conv_to_str(convo)
+        sent_at = getattr(s, "datetime_sent", None)
+        if not convo_key or convo_key in latest or not sent_at:
+            continue
+        latest[convo_key] = {
+            "convo": convo,
+            "subject": s.subject or "",
+            "last_out": _ts(sent_at),
+            "last_out_iso": sent_at.isoformat(),
+            "last_out_id": getattr(s, "id", None),
+            "last_out_ck": getattr(s, "changekey", None),
+        }
+    return latest
 
 
 def find_unresponded_threads(
     days: int = 0,
     limit: int = 100,
-    only_external: bool = True
+    only_external: bool = True,
+    incremental: Optional[bool] = None,
 ) -> List[Dict[str, Any]]:
     """
     Find conversation threads where our account sent the last message and no external reply
     has been received within `days` days. Returns list of thread summaries.
+    incremental (default EWS_UNRESPONDED_INCREMENTAL) answers from the persisted index.
     """
-    account = _get_account()
-    try:
-        tz = EWSTimeZone.localzone()
-    except Exception:
-        tz = None
-
-    now_t = datetime.now(tz) if tz else datetime.utcnow()
-    cutoff = now_t - timedelta(days=int(days))
+    if incremental is None:
+        incremental = UNRESPONDED_INCREMENTAL
+    if incremental:
+        try:
+            return _find_unresponded_incremental(days, limit, only_external)
+        except Exception as e:
+            logging.warning(f"[unresponded] Incremental index failed ({e}); scanning instead")
 
+    account = _get_account()
+    cutoff_ts = time.time() - int(days) * 86400
     pool_size = max(500, limit * 5)
     try:
-        sent_msgs = list(account.sent.all().order_by('-datetime_sent')[:pool_size])
+        sent_msgs = list(account.sent.all().only(*SENT_LIST_FIELDS).order_by('-datetime_sent')[:pool_size])
     except Exception:
         try:
-            sent_msgs = list(account.sent.all())
+            sent_msgs = list(account.sent.all().only(*SENT_LIST_FIELDS))
         except Exception:
             sent_msgs = []
 
-    our_email_lower = (EMAIL or "").lower()
+    our_email_lower = (current_email() or "").lower()
+    candidates = [(k, c) for k, c in _sent_conversations(sent_msgs).items() if c["last_out"] <= cutoff_ts]
     results: List[Dict[str, Any]] = []
-    seen_convos = set()
-
-    for s in sent_msgs:
-        try:
-            convo = getattr(s, "conversation_id", None)
-            if not convo:
-                continue
-            convo_key = _conv_to_str(convo)
-            if not convo_key or convo_key in seen_convos:
-                continue
-            seen_convos.add(convo_key)
-
-            last_sent_time = getattr(s, "datetime_sent", None)
-            if not last_sent_time:
+    # Scan a chunk at a time so small limits stop early
+    for i in range(0, len(candidates), PREFETCH_CHUNK_SIZE):
+        chunk = candidates[i:i + PREFETCH_CHUNK_SIZE]
+        stats = _scan_conversations(account, {k: c["convo"] for k, c in chunk}, our_email_lower)
+        for convo_key, conv in chunk:
+            st = stats.get(convo_key)
+            if st is None:
                 continue
+            entry = _unresponded_entry(convo_key, {**conv, **st}, only_external, cutoff_ts)
+            if entry:
+                results.append(entry)
+                if len(results) >= limit:
+                    return results
+    return results
 
-            if last_sent_time > cutoff:
-                continue
 
-            try:
-                convo_inbox = list(account.inbox.filter(conversation_id=convo).order_by('datetime_received'))
-            except Exception:
-                convo_inbox = []
-                try:
-                    for m in account.inbox.all().order_by('datetime_received')[:2000]:
-                        if _conv_to_str(getattr(m, "conversation_id", None)) == convo_key:
-                            convo_inbox.append(m)
-                except Exception:
-                    convo_inbox = []
-
-            replied = False
-            external_email = ""
-            for r in convo_inbox:
-                rtime = getattr(r, "datetime_received", None)
-                if not rtime:
-                    continue
-                if rtime <= last_sent_time:
-                    continue
-                sender_email = (r.sender and getattr(r.sender, "email_address", "")) or ""
-                if sender_email:
-                    if our_email_lower not in sender_email.lower():
-                        replied = True
-                        external_email = sender_email
-                        break
-                    elif not only_external:
-                        replied = True
-                        external_email = sender_email
-                        break
-
-            if not replied:
-                try:
-                    inbox_conv = list(account.inbox.filter(conversation_id=convo))
-                    sent_conv = list(account.sent.filter(conversation_id=convo))
-                    thread_length = len(inbox_conv) + len(sent_conv)
-                except Exception:
-                    thread_length = 1
-
-                results.append({
-                    "subject": (s.subject or "").strip(),
-                    "conversation_id": convo_key,
-                    "last_message_time": last_sent_time.isoformat() if last_sent_time else "",
-                    "last_message_id": getattr(s, "id", None),
-                    "last_changekey": getattr(s, "changekey", None),
-                    "customer_email": external_email or "",
-                    "thread_length": int(thread_length),
-                })
-                if len(results) >= limit:
-                    break
-        except Exception:
-            continue
+def _find_unresponded_incremental(days: int, limit: int, only_external: bool) -> List[Dict[str, Any]]:
+    account = _get_account()
+    our_email_lower = (current_email() or "").lower()
+    path = _unresponded_index_file()
+    with _unresponded_lock:
+        index = _load_unresponded_index(path)
+        stale = (not index or index.get("email") != our_email_lower
+                 or time.time() - index.get("built_at", 0) > UNRESPONDED_REBUILD_HOURS * 3600)
+        if stale:
+            index = _build_unresponded_index(account, our_email_lower, limit)
+        else:
+            _update_unresponded_index(account, index, our_email_lower, limit)
+        _save_unresponded_index(index, path)
 
+    cutoff_ts = time.time() - int(days) * 86400
+    conversations = index["conversations"]
+    results = []
+    for convo_key in sorted(conversations, key=lambda k: conversations[k].get("last_out") or 0, reverse=True):
+        entry = _unresponded_entry(convo_key, conversations[convo_key], only_external, cutoff_ts)
+        if entry:
+            results.append(entry)
+            if len(results) >= limit:
+                break
     return results
 
 
+def _index_record(conv: Dict[str, Any], st: Dict[str, Any]) -> Dict[str, Any]:
+    rec = {k: v for k, v in conv.items() if k != "convo"}
+    rec.update({k: st.get(k) for k in ("in_count", "out_count", "last_in_ext", "last_in_any")})
+    return rec
+
+
+def _build_unresponded_index(account: Account, our_email_lower: str, limit: int) -> Dict[str, Any]:
+    started = time.time()
+    pool_size = max(500, limit * 5)
+    sent_msgs = list(account.sent.all().only(*SENT_LIST_FIELDS).order_by('-datetime_sent')[:pool_size])
+    latest = _sent_conversations(sent_msgs)
+    stats = _scan_conversations(account, {k: c["convo"] for k, c in latest.items()}, our_email_lower)
+    conversations = {k: _index_record(c, stats[k]) for k, c in latest.items() if k in stats}
+    logging.info(f"[unresponded] Index built with {len(conversations)} conversations")
+    # Watermarks use Exchange timestamps, never the local clock (which may run ahead)
+    sent_watermark = max((c["last_out"] for c in latest.values()), default=0.0)
+    inbound_seen = [ts for st in stats.values() for ts, _ in st.get("inbound", [])]
+    return {
+        "email": our_email_lower,
+        "built_at": started,
+        "sent_watermark": sent_watermark,
+        "inbox_watermark": max(inbound_seen + [sent_watermark]),
+        "conversations": conversations,
+    }
+
+
+def _update_unresponded_index(account: Account, index: Dict[str, Any], our_email_lower: str, limit: int) -> None:
+    """Apply mail newer than the watermarks to the index."""
+    conversations = index["conversations"]
+    pool_size = max(500, limit * 5)
+
+    sent_new = list(
+        account.sent.filter(datetime_sent__gt=_ews_datetime(index["sent_watermark"]))
+        .only(*SENT_LIST_FIELDS).order_by('-datetime_sent')[:pool_size]
+    )
+    latest = _sent_conversations(sent_new)
+    unseen = {k: c["convo"] for k, c in latest.items() if k not in conversations}
+    stats = _scan_conversations(account, unseen, our_email_lower) if unseen else {}
+    for convo_key, conv in latest.items():
+        if convo_key in unseen:
+            if convo_key in stats:
+                conversations[convo_key] = _index_record(conv, stats[convo_key])
+            continue
+        rec = conversations[convo_key]
+        rec["out_count"] = rec.get("out_count", 0) + sum(
+            1 for s in sent_new if _conv_to_str(getattr(s, "conversation_id", None)) == convo_key)
+        if conv["last_out"] > (rec.get("last_out") or 0):
+            rec.update({k: v for k, v in conv.items() if k != "convo"})
+    if sent_new:
+        index["sent_watermark"] = max(index["sent_watermark"], max(c["last_out"] for c in latest.values()) if latest else 0)
+
+    inbox_new = account.inbox.filter(datetime_received__gt=_ews_datetime(index["inbox_watermark"])) \
+        .only("conversation_id", *THREAD_PROBE_FIELDS)
+    for m in inbox_new:
+        ts = _ts(getattr(m, "datetime_received", None))
+        if ts:
+            index["inbox_watermark"] = max(index["inbox_watermark"], ts)
+        convo_key = _conv_to_str(getattr(m, "conversation_id", None))
+        rec = conversations.get(convo_key)
+        if rec is None or convo_key in unseen:
+            continue  # conversations we never wrote in do not matter; new ones were scanned above
+        sender_email = (m.sender and getattr(m.sender, "email_address", "")) or ""
+        _note_inbound(rec, ts, sender_email, our_email_lower)
+        rec.pop("inbound", None)
+
+    if len(conversations) > UNRESPONDED_INDEX_MAX:
+        keep = sorted(conversations, key=lambda k: conversations[k].get("last_out") or 0, reverse=True)
+        index["conversations"] = {k: conversations[k] for k in keep[:UNRESPONDED_INDEX_MAX]}
+
+
 def follow_up_unresponded_thread(item_id: str, changekey: str, body_html: str) -> str:
     """
     Send a follow-up inside the conversation thread identified by item_id/changekey.
@@ -1532,22 +2892,123 @@ def get_current_time(tz_name: Optional[str] = None) -> str:
 
 
 # ====================== DOWNLOAD ATTACHMENTS ======================
-def download_attachments(item_id: str, changekey: str, download_dir: Optional[str] = None) -> List[str]:
-    if not download_dir:
-        download_dir = DOWNLOAD_DIR
-    os.makedirs(download_dir, exist_ok=True)
+# Attachments are streamed from GetAttachment in chunks (FileAttachment.fp) while being
+# hashed, then stored content-addressed as <download_dir>/<sha256[:16]>/<name>: the same
+# bytes received again (on any message) resolve to the file already on disk, hard-linked
+# under the new name when it differs. Attachment ids already downloaded in this process are not fetched again at all.
+ATTACHMENT_MAX_BYTES = int(os.getenv("EWS_ATTACHMENT_MAX_BYTES", str(25 * 1024 * 1024)))
+ATTACHMENT_WORKERS = int(os.getenv("EWS_ATTACHMENT_WORKERS", "4"))
+ATTACHMENT_CHUNK_BYTES = 256 * 1024
+
+_downloaded_attachments: "OrderedDict[tuple, str]" = OrderedDict()
+_downloaded_lock = threading.Lock()
+
+
+def _safe_attachment_name(name: Optional[str]) -> str:
+    base = os.path.basename((name or "").replace("\\", "/")).strip().lstrip(".")
+    return base or "attachment"
+
+
+def _store_attachment(att, download_dir: str, max_bytes: int) -> Dict[str, Any]:
+    """Stream one FileAttachment to a temp file, then move it to its content address."""
+    name = _safe_attachment_name(att.name)
+    tmp_dir = os.path.join(download_dir, ".partial")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp = os.path.join(tmp_dir, f"{os.getpid()}-{threading.get_ident()}-{hashlib.sha1(name.encode()).hexdigest()[:8]}")
+    digest, size = hashlib.sha256(), 0
     try:
-        msg = _get_account().inbox.get(id=item_id, changekey=changekey)
-    except Exception:
-        msg = _get_account().inbox.get(id=item_id)
-    saved = []
-    for a in (msg.attachments or []):
-        if isinstance(a, FileAttachment):
-            path = os.path.join(download_dir, a.name)
-            with open(path, "wb") as f:
-                f.write(a.content)
-            saved.append(path)
-    return saved
+        with open(tmp, "wb") as out, att.fp as fp:
+            while True:
+                chunk = fp.read(ATTACHMENT_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"exceeds size cap of {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+        sha = digest.hexdigest()
+        blob_dir = os.path.join(download_dir, sha[:16])
+        with _downloaded_lock:
+            existing = sorted(os.listdir(blob_dir)) if os.path.isdir(blob_dir) else []
+            path = os.path.join(blob_dir, name)
+            if existing:
+                # Same bytes under another name: hard-link them under the requested name
+                if name not in existing:
+                    try:
+                        os.link(os.path.join(blob_dir, existing[0]), path)
+                    except OSError:
+                        os.replace(tmp, path)  # no hard links here: keep the fresh copy
+                return {"name": name, "path": path, "sha256": sha, "size": size, "deduplicated": True}
+            os.makedirs(blob_dir, exist_ok=True)
+            os.replace(tmp, path)
+        return {"name": name, "path": path, "sha256": sha, "size": size, "deduplicated": False}
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def download_attachments_detailed(
+    item_id: str,
+    changekey: str,
+    download_dir: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Download a message's file attachments, several at a time, streamed and deduplicated.
+
+    Returns one dict per attachment: name, path, sha256, size, deduplicated, or
+    name + skipped (reason) for attachments over the size cap, item attachments and failures.
+    """
+    download_dir = download_dir or DOWNLOAD_DIR
+    max_bytes = ATTACHMENT_MAX_BYTES if max_bytes is None else int(max_bytes)
+    os.makedirs(download_dir, exist_ok=True)
+    account = _get_account()
+    msg = _fetch_item(account, item_id, changekey, ["attachments"])
+
+    mailbox = current_email().lower()
+    results: List[Optional[Dict[str, Any]]] = []
+    pending = []
+    for att in (msg.attachments or []):
+        name = _safe_attachment_name(getattr(att, "name", None))
+        if not isinstance(att, FileAttachment):
+            results.append({"name": name, "skipped": "item attachment (not a file)"})
+            continue
+        att_id = getattr(att.attachment_id, "id", None)
+        key = (mailbox, os.path.abspath(download_dir), att_id)
+        with _downloaded_lock:
+            known = _downloaded_attachments.get(key) if att_id else None
+        if known and os.path.exists(known):
+            results.append({"name": name, "path": known, "size": getattr(att, "size", None), "deduplicated": True})
+            continue
+        if getattr(att, "size", None) and att.size > max_bytes:
+            results.append({"name": name, "size": att.size, "skipped": f"exceeds size cap of {max_bytes} bytes"})
+            continue
+        results.append(None)
+        pending.append((len(results) - 1, att, key))
+
+    if pending:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, min(ATTACHMENT_WORKERS, len(pending)))) as pool:
+            futures = [(idx, att, key, pool.submit(_store_attachment, att, download_dir, max_bytes))
+                       for idx, att, key in pending]
+            for idx, att, key, fut in futures:
+                try:
+                    results[idx] = fut.result()
+                    if key[2]:
+                        with _downloaded_lock:
+                            _downloaded_attachments[key] = results[idx]["path"]
+                            while len(_downloaded_attachments) > 2000:
+                                _downloaded_attachments.popitem(last=False)
+                except Exception as e:
+                    logging.warning(f"Attachment download failed for {att.name}: {e}")
+                    results[idx] = {"name": _safe_attachment_name(att.name), "skipped": str(e)}
+    return results
+
+
+def download_attachments(item_id: str, changekey: str, download_dir: Optional[str] = None) -> List[str]:
+    """Download file attachments; returns the local paths (see download_attachments_detailed)."""
+    return [r["path"] for r in download_attachments_detailed(item_id, changekey, download_dir) if r.get("path")]
 
 
 # ====================== DYNAMIC FETCH (single entry for various strategies) ======================
@@ -1692,7 +3153,10 @@ def dynamic_mail_fetch(strategy: str = "filtered", params: Optional[Dict[str, An
             days = int(params.get("days", 0))
             limit = int(params.get("limit", 100))
             only_external = bool(params.get("only_external", True))
-            return {"unresponded_threads": find_unresponded_threads(days=days, limit=limit, only_external=only_external)}
+            incremental = params.get("incremental")
+            return {"unresponded_threads": find_unresponded_threads(
+                days=days, limit=limit, only_external=only_external,
+                incremental=None if incremental is None else bool(incremental))}
 
         msgs = get_messages_filtered(
             sender_name_match_string=params.get("sender_name_match_string"),
@@ -1742,7 +3206,7 @@ def send_new_email(
     """
     account = _get_account()
     
-    if to_email == EMAIL:
+    if to_email == current_email():
         return "Cannot send email to self!"
     
     try:
@@ -1782,6 +3246,7 @@ def send_new_email(
         
         # Send
         msg.send()
+        invalidate_mailbox_conversations()
         
         return f"Email sent successfully to {to_email}" + (f" (CC: {', '.join(cc_emails)})" if cc_emails else "")
     
@@ -1790,6 +3255,27 @@ def send_new_email(
         return f"[Error] Failed to send email: {e}"
 
 
+def _forward_original(account: Account, item_id: str, changekey: Optional[str]):
+    """Subject/read state only: ForwardItem is built server side from the item id."""
+    return _fetch_item(account, item_id, changekey, ["subject", "is_read", "conversation_id"])
+
+
+def _create_forward(original, to_email: str, forward_comment: str,
+                    cc_emails: Optional[List[str]], bcc_emails: Optional[List[str]]):
+    """
+    ForwardItem: Exchange appends the original body and carries the original
+    attachments itself, so only the comment is uploaded.
+    """
+    comment_html = f"<p>{_html.escape(forward_comment)}</p>" if forward_comment else ""
+    return original.create_forward(
+        subject=original.subject or "(No subject)",
+        body=HTMLBody(comment_html),
+        to_recipients=[Mailbox(email_address=to_email)],
+        cc_recipients=[Mailbox(email_address=cc) for cc in (cc_emails or []) if cc] or None,
+        bcc_recipients=[Mailbox(email_address=bcc) for bcc in (bcc_emails or []) if bcc] or None,
+    )
+
+
 def forward_email(
     item_id: str,
     changekey: str,
@@ -1814,45 +3300,27 @@ def forward_email(
     """
     account = _get_account()
     
-    if to_email == EMAIL:
+    if to_email == current_email():
         return "Cannot forward email to self!"
-    
+
     try:
-        # Get original message
-        try:
-            original = account.inbox.get(id=item_id, changekey=changekey) if changekey else account.inbox.get(id=item_id)
-        except Exception:
-            original = account.inbox.get(id=item_id)
-        
-        # Prepare forward comment
-        comment_html = ""
-        if forward_comment:
-            comment_html = f"<p>{_html.escape(forward_comment)}</p><hr>"
-        
-        # Create forward
-        forward = original.create_forward(
-            subject=original.subject or "(No subject)",
-            body=HTMLBody(comment_html + str(original.body)),
-            to_recipients=[Mailbox(email_address=to_email)]
+        # Fetched before queueing too, so a bad id fails now rather than in the outbox
+        original = _forward_original(account, item_id, changekey)
+        queued = _queue_send(
+            "forward_email", item_id=item_id, changekey=changekey, to_email=to_email,
+            forward_comment=forward_comment, cc_emails=cc_emails, bcc_emails=bcc_emails,
         )
-        
-        # Add CC recipients
-        if cc_emails:
-            forward.cc_recipients = [Mailbox(email_address=cc) for cc in cc_emails if cc]
-        
-        # Add BCC recipients
-        if bcc_emails:
-            forward.bcc_recipients = [Mailbox(email_address=bcc) for bcc in bcc_emails if bcc]
-        
-        # Send
-        forward.send()
+        if queued:
+            return queued
+        _create_forward(original, to_email, forward_comment, cc_emails, bcc_emails).send()
+        invalidate_conversation(getattr(original, "conversation_id", None))
         
         # Mark original as read (optional)
-        try:
-            original.is_read = True
-            original.save()
-        except Exception:
-            pass
+        if not original.is_read:
+            try:
+                bulk_mark_as_read([item_id])
+            except Exception:
+                pass
         
         return f"Email forwarded successfully to {to_email}" + (f" (CC: {', '.join(cc_emails)})" if cc_emails else "")
     
@@ -1871,6 +3339,10 @@ def forward_email_with_attachments(
 ) -> str:
     """
     Forward email and ensure all attachments are included, plus add new ones.
+
+    The original's attachments travel with the server-side ForwardItem. With
+    additional files the forward is saved to Drafts first, the files are
+    attached to that draft, and the draft is sent.
     
     Args:
         item_id: ID of the email to forward
@@ -1886,48 +3358,119 @@ def forward_email_with_attachments(
     account = _get_account()
     
     try:
-        # Get original
-        original = account.inbox.get(id=item_id, changekey=changekey) if changekey else account.inbox.get(id=item_id)
-        from html import _html
-        # Create forward
-        comment_html = f"<p>{_html.escape(forward_comment)}</p><hr>" if forward_comment else ""
-        forward = original.create_forward(
-            subject=original.subject or "(No subject)",
-            body=HTMLBody(comment_html + str(original.body)),
-            to_recipients=[Mailbox(email_address=to_email)]
-        )
-        
-        if cc_emails:
-            forward.cc_recipients = [Mailbox(email_address=cc) for cc in cc_emails if cc]
-        
-        # Copy original attachments
-        if original.attachments:
-            for att in original.attachments:
-                if isinstance(att, FileAttachment):
-                    try:
-                        new_att = FileAttachment(name=att.name, content=att.content)
-                        forward.attach(new_att)
-                    except Exception as e:
-                        logging.warning(f"Failed to copy attachment {att.name}: {e}")
-        
-        # Add additional attachments
-        if additional_attachments:
-            for path in additional_attachments:
-                if os.path.isfile(path):
-                    try:
-                        with open(path, "rb") as f:
-                            attachment = FileAttachment(
-                                name=os.path.basename(path),
-                                content=f.read()
-                            )
-                            forward.attach(attachment)
-                    except Exception as e:
-                        logging.warning(f"Failed to attach {path}: {e}")
-        
-        forward.send()
+        original = _forward_original(account, item_id, changekey)
+        forward = _create_forward(original, to_email, forward_comment, cc_emails, None)
+        extra = [p for p in (additional_attachments or []) if os.path.isfile(p)]
+        if not extra:
+            forward.send()
+            invalidate_conversation(getattr(original, "conversation_id", None))
+            return f"Email forwarded with attachments to {to_email}"
+
+        saved = forward.save(account.drafts)
+        draft = _fetch_item(account, saved.id, saved.changekey)
+        for path in extra:
+            try:
+                with open(path, "rb") as f:
+                    draft.attach(FileAttachment(name=os.path.basename(path), content=f.read()))
+            except Exception as e:
+                logging.warning(f"Failed to attach {path}: {e}")
+        draft.send()
+        invalidate_conversation(getattr(original, "conversation_id", None))
         
         return f"Email forwarded with attachments to {to_email}"
     
     except Exception as e:
         logging.exception(f"Failed to forward email with attachments")
-        return f"[Error] {e}"
\ No newline at end of file
+        return f"[Error] {e}"
+
+# ====================== SELF-CHECK ======================
+class _GeneratorFetchAccount:
+    """Stand-in account whose fetch() yields its results, as exchangelib's Account.fetch does."""
+
+    def __init__(self, items: Dict[str, Any]):
+        self.items = items
+
+    def fetch(self, ids, only_fields=None, **kwargs):
+        for item_id, changekey in ids:
+            item = self.items.get(item_id)
+            if item is None or (changekey and changekey != item.changekey):
+                yield LookupError(f"ErrorItemNotFound: {item_id}")
+            else:
+                yield item
+
+    @property
+    def inbox(self):
+        return self
+
+    def get(self, id, changekey=None):
+        item = next(self.fetch([(id, changekey)]))
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+def _self_check():
+    global _get_account
+    import tempfile
+    from types import SimpleNamespace
+    import outbox
+
+    sent = []
+    customer = SimpleNamespace(email_address="customer@example.com", name="Customer")
+    forward = SimpleNamespace(send=lambda: sent.append("forward"))
+    reply = SimpleNamespace(send=lambda: sent.append("reply"))
+    items = {
+        "m1": SimpleNamespace(
+            id="m1", changekey="ck2", body="<p>hello</p>", sender=customer, subject="Quote",
+            is_read=True, conversation_id=None, attachments=[SimpleNamespace(name="note.msg")],
+            create_forward=lambda **kw: forward, create_reply=lambda **kw: reply,
+        ),
+    }
+    real_get_account = _get_account
+    _get_account = lambda: _GeneratorFetchAccount(items)
+    try:
+        # Stale changekey falls back to the bare id; missing items raise instead of indexing
+        assert get_email_html("m1", "ck1") == "<p>hello</p>"
+        try:
+            _fetch_message("gone", None, ("body",))
+            raise AssertionError("missing item was returned")
+        except LookupError:
+            pass
+        assert read_email("gone", "").get("error", "").startswith("Fetch failed")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            assert download_attachments_detailed("m1", "ck1", download_dir=tmp) == [
+                {"name": "note.msg", "skipped": "item attachment (not a file)"}]
+
+            # Replies are validated when queued and delivered by the outbox sender
+            queue = outbox.Outbox(os.path.join(tmp, "outbox.db"), concurrency=1)
+            real_outbox, real_enabled = outbox._outbox, outbox.OUTBOX_ENABLED
+            outbox._outbox, outbox.OUTBOX_ENABLED = queue, True
+            try:
+                assert reply_to_email("gone", "", "<p>x</p>").startswith("[Error] Cannot reply")
+                queued = reply_to_email("m1", "ck1", "<p>Thanks</p>")
+                job_id = queued.split("outbox id ")[1].split(")")[0]
+                deadline = time.time() + 10
+                while queue.status(job_id)["status"] in ("queued", "sending") and time.time() < deadline:
+                    time.sleep(0.05)
+                assert queue.status(job_id)["status"] == "sent", queue.status(job_id)
+            finally:
+                queue.stop()
+                outbox._outbox, outbox.OUTBOX_ENABLED = real_outbox, real_enabled
+
+        token = outbox._replaying.set(True)  # send inline, as the outbox sender does
+        try:
+            assert forward_email("m1", "ck1", "colleague@example.com").startswith("Email forwarded")
+            assert forward_email("gone", "", "colleague@example.com").startswith("[Error]")
+        finally:
+            outbox._replaying.reset(token)
+        assert sent == ["reply", "forward"], sent
+    finally:
+        _get_account = real_get_account
+    print("ews_tools2 self-check passed")
+
+
+if __name__ == "__main__":
+    # Run on the imported module: the outbox sender resolves its send functions there
+    import ews_tools2
+    ews_tools2._self_check()
@@ -0,0 +1,147 @@
+"""
+free_busy.py
+Interval index for free/busy queries (own calendar and attendee availability).
+
+Busy intervals for a horizon are merged once into a sorted, non-overlapping list;
+slot checks are then a binary search (O(log n)) and slot proposals walk the free
+gaps inside each working-hours window (O(events + slots)) instead of testing every
+candidate slot against every event.
+
+Times must be timezone-aware; working hours are evaluated in the rule's timezone.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta, tzinfo
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+
+class BusyIndex:
+    """Sorted, merged busy intervals with binary-search lookups."""
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._starts: List[datetime] = []
+        self._ends: List[datetime] = []
+        merged: List[List[datetime]] = []
+        for s, e in sorted((s, e) for s, e in intervals if s and e and e > s):
+            if merged and s <= merged[-1][1]:
+                if e > merged[-1][1]:
+                    merged[-1][1] = e
+            else:
+                merged.append([s, e])
+        for s, e in merged:
+            self._starts.append(s)
+            self._ends.append(e)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def intervals(self) -> List[Interval]:
+        return list(zip(self._starts, self._ends))
+
+    def union(self, other: "BusyIndex") -> "BusyIndex":
+        return BusyIndex(self.intervals() + other.intervals())
+
+    def add(self, start: datetime, end: datetime) -> None:
+        """Insert one busy interval, merging with any it touches."""
+        if not start or not end or end <= start:
+            return
+        lo = bisect_left(self._ends, start)
+        hi = bisect_right(self._starts, end)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """True if [start, end) overlaps no busy interval (back-to-back is free)."""
+        i = bisect_right(self._ends, start)
+        return i >= len(self._starts) or self._starts[i] >= end
+
+    def gaps(self, start: datetime, end: datetime) -> Iterator[Interval]:
+        """Free sub-intervals of [start, end), in order."""
+        cur = start
+        i = bisect_right(self._ends, start)
+        while cur < end and i < len(self._starts) and self._starts[i] < end:
+            if self._starts[i] > cur:
+                yield cur, self._starts[i]
+            cur = max(cur, self._ends[i])
+            i += 1
+        if cur < end:
+            yield cur, end
+
+
+class WorkingHours:
+    """Daily [start_hour, end_hour) windows on the given weekdays (0=Mon), in tz."""
+
+    def __init__(self, start_hour: int = 9, end_hour: int = 18,
+                 weekdays: Optional[Sequence[int]] = None, tz: Optional[tzinfo] = None):
+        self.start = time(int(start_hour))
+        self.end_hour = int(end_hour)
+        self.weekdays = set(weekdays) if weekdays is not None else set(range(7))
+        self.tz = tz
+
+    def windows(self, start: datetime, end: datetime) -> Iterator[Interval]:
+        """Working windows clipped to [start, end)."""
+        tz = self.tz or start.tzinfo
+        day = start.astimezone(tz).date()
+        last = end.astimezone(tz).date()
+        while day <= last:
+            if day.weekday() in self.weekdays:
+                ws = datetime.combine(day, self.start, tzinfo=tz)
+                we = datetime.combine(day, time(0), tzinfo=tz) + timedelta(hours=self.end_hour)
+                ws, we = max(ws, start), min(we, end)
+                if ws < we:
+                    yield ws, we
+            day += timedelta(days=1)
+
+
+def find_slots(index: BusyIndex, start: datetime, end: datetime, slot_minutes: int = 30,
+               hours: Optional[WorkingHours] = None, max_slots: int = 5) -> List[datetime]:
+    """
+    Slot start times in [start, end) that are free for slot_minutes inside working hours.
+    Candidates sit on a slot_minutes grid anchored at each day's window start.
+    """
+    hours = hours or WorkingHours()
+    tz = hours.tz or start.tzinfo
+    step = timedelta(minutes=max(1, int(slot_minutes)))
+    slots: List[datetime] = []
+    for ws, we in hours.windows(start, end):
+        # Grid anchor in working-hours time: the first window is clipped to `start`,
+        # which may be in another timezone (callers often pass UTC)
+        day_start = datetime.combine(ws.astimezone(tz).date(), hours.start, tzinfo=tz)
+        for gs, ge in index.gaps(ws, we):
+            k = -(-(gs - day_start) // step)  # ceil onto the grid
+            cand = day_start + k * step
+            while cand + step <= ge:
+                slots.append(cand)
+                if len(slots) >= max_slots:
+                    return slots
+                cand += step
+    return slots
+
+
+# ============= SELF-CHECK =============
+def _self_check():
+    from datetime import timezone
+    from zoneinfo import ZoneInfo
+
+    ist = ZoneInfo("Asia/Kolkata")
+    hours = WorkingHours(9, 18, tz=ist)
+    # Start given in UTC (09:30 IST), one meeting 10:00-11:00 IST, 60-minute slots
+    start = datetime(2026, 3, 2, 9, 30, tzinfo=ist).astimezone(timezone.utc)
+    end = datetime(2026, 3, 2, 18, 0, tzinfo=ist).astimezone(timezone.utc)
+    index = BusyIndex([(datetime(2026, 3, 2, 10, 0, tzinfo=ist), datetime(2026, 3, 2, 11, 0, tzinfo=ist))])
+    slots = [s.astimezone(ist).strftime("%H:%M") for s in find_slots(index, start, end, 60, hours, max_slots=3)]
+    assert slots == ["11:00", "12:00", "13:00"], slots
+
+    # Back-to-back meetings leave the boundary free; overlaps do not
+    assert index.is_free(datetime(2026, 3, 2, 11, 0, tzinfo=ist), datetime(2026, 3, 2, 12, 0, tzinfo=ist))
+    assert not index.is_free(datetime(2026, 3, 2, 10, 30, tzinfo=ist), datetime(2026, 3, 2, 11, 30, tzinfo=ist))
+    print("free_busy self-check passed")
+
+
+if __name__ == "__main__":
+    _self_check()
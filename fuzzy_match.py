@@ -0,0 +1,100 @@
+"""
+fuzzy_match.py
+Fuzzy string matching for mail filters (sender, recipients, subject, body).
+
+Scores are exactly difflib.SequenceMatcher(None, candidate.lower(), query.lower()).ratio(),
+the measure get_messages_filtered has always used, so thresholds keep their meaning.
+What changes is the cost of a comparison:
+    - the query is normalized and analysed once (SequenceMatcher caches its index
+      of the second sequence), not once per candidate
+    - candidates are rejected by upper bounds before the quadratic scoring:
+        1. length bound      2*min(la, lb) / (la + lb)          O(1)
+        2. character bound   shared character multiset          O(n)
+      Both are >= the real ratio, so a rejected candidate could never have passed.
+
+Character trigrams are not an upper bound on this ratio, so they are not used to
+reject; using them would change which messages match.
+
+Run `python fuzzy_match.py` for a microbenchmark against the per-call difflib version.
+"""
+
+import difflib
+from typing import Iterable, List, Optional
+
+
+class FuzzyMatcher:
+    """A query prepared once and scored against many candidates."""
+
+    def __init__(self, query: str, threshold: float = 0.90):
+        self.query = (query or "").lower()
+        self.threshold = float(threshold)
+        self._len = len(self.query)
+        self._sm = difflib.SequenceMatcher(None)
+        self._sm.set_seq2(self.query)
+
+    def ratio(self, candidate: str) -> float:
+        """Exact similarity in [0, 1] (0.0 when either side is empty)."""
+        if not candidate or not self.query:
+            return 0.0
+        self._sm.set_seq1(candidate.lower())
+        return self._sm.ratio()
+
+    def matches(self, candidate: str) -> bool:
+        """ratio(candidate) >= threshold, with quick rejects first."""
+        if not candidate or not self.query:
+            return False
+        la = len(candidate)
+        if 2.0 * min(la, self._len) / (la + self._len) < self.threshold:
+            return False
+        sm = self._sm
+        sm.set_seq1(candidate.lower())
+        return sm.quick_ratio() >= self.threshold and sm.ratio() >= self.threshold
+
+    def match_any(self, candidates: Iterable[Optional[str]]) -> bool:
+        """True if any candidate reaches the threshold."""
+        return any(self.matches(c) for c in candidates if c)
+
+    def score_batch(self, candidates: Iterable[Optional[str]]) -> List[float]:
+        """Ratios for a candidate list; quick-rejected candidates score 0.0."""
+        return [self.ratio(c) if self.matches(c or "") else 0.0 for c in candidates]
+
+
+def fuzzy_ratio(a: str, b: str) -> float:
+    """difflib ratio of a against b, case-insensitive (one-off comparison)."""
+    return FuzzyMatcher(b).ratio(a)
+
+
+# ============= MICROBENCHMARK =============
+def _benchmark(n: int = 2000):
+    import random
+    import string
+    import time
+
+    rnd = random.Random(7)
+
+    def word(k):
+        return "".join(rnd.choice(string.ascii_lowercase) for _ in range(k))
+
+    subjects = [" ".join(word(rnd.randint(3, 9)) for _ in range(rnd.randint(3, 9))) for _ in range(n)]
+    senders = [f"{word(5)}.{word(6)}@{word(7)}.com" for _ in range(n)]
+    bodies = [" ".join(word(rnd.randint(2, 10)) for _ in range(400))[:2000] for _ in range(n)]
+    cases = [("subject", subjects, "quarterly invoice"), ("sender", senders, "jayant"), ("body", bodies, "please confirm")]
+
+    def legacy(a, b):
+        return difflib.SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+    print(f"{'field':<8} {'difflib/call':>13} {'FuzzyMatcher':>13} {'speedup':>8}")
+    for name, candidates, query in cases:
+        t0 = time.perf_counter()
+        old = [legacy(c, query) >= 0.9 for c in candidates]
+        t_old = time.perf_counter() - t0
+        matcher = FuzzyMatcher(query, 0.9)
+        t0 = time.perf_counter()
+        new = [matcher.matches(c) for c in candidates]
+        t_new = time.perf_counter() - t0
+        assert old == new, f"{name}: results differ"
+        print(f"{name:<8} {t_old * 1000:>11.1f}ms {t_new * 1000:>11.1f}ms {t_old / max(t_new, 1e-9):>7.1f}x")
+
+
+if __name__ == "__main__":
+    _benchmark()
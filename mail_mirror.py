@@ -0,0 +1,420 @@
+"""
+mail_mirror.py
+Optional local mirror of the inbox and Sent Items with a full-text index.
+
+When MAIL_MIRROR_ENABLED=true, get_messages_filtered (and so dynamic_mail_fetch_tool
+and search_and_fetch_emails) answers from a SQLite database instead of scanning
+Exchange; Exchange is only contacted to act on the returned items.
+
+    - messages: metadata, conversation id, participants and the normalized text
+      body (new content only, see mail_normalizer.py) per item
+    - messages_fts: FTS5 index over subject, body, sender and recipients; the
+      trigram tokenizer gives the same substring semantics as the live search
+    - sync_state: per-folder SyncFolderItems state, so each sync only transfers
+      creates, updates, deletes and read-flag changes since the last one
+
+A search syncs first when the last sync is older than MAIL_MIRROR_SYNC_INTERVAL
+seconds. Size on disk is bounded by MAIL_MIRROR_RETENTION_DAYS and
+MAIL_MIRROR_MAX_MESSAGES (oldest messages are dropped first).
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from fuzzy_match import FuzzyMatcher
+from mail_normalizer import extract_new_content
+
+logger = logging.getLogger(__name__)
+
+MIRROR_ENABLED = os.getenv("MAIL_MIRROR_ENABLED", "false").lower() == "true"
+MIRROR_DB = os.getenv("MAIL_MIRROR_DB", "mail_mirror.db")
+MIRROR_RETENTION_DAYS = int(os.getenv("MAIL_MIRROR_RETENTION_DAYS", "90"))
+MIRROR_MAX_MESSAGES = int(os.getenv("MAIL_MIRROR_MAX_MESSAGES", "20000"))
+MIRROR_SYNC_INTERVAL = int(os.getenv("MAIL_MIRROR_SYNC_INTERVAL", "60"))
+MIRROR_BODY_CHARS = 20000
+# Candidates examined by the local fuzzy fallback (no network cost)
+MIRROR_FUZZY_WINDOW = 2000
+
+MIRROR_FOLDERS = ("inbox", "sent")
+SYNC_FIELDS = (
+    "subject", "sender", "datetime_received", "conversation_id", "is_read", "has_attachments",
+    "to_recipients", "cc_recipients",
+)
+
+
+def _quote(term: str) -> str:
+    """FTS5 string literal."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _addresses(recipients) -> List[str]:
+    out = []
+    for r in recipients or []:
+        for part in (getattr(r, "name", None), getattr(r, "email_address", None)):
+            if part:
+                out.append(part)
+    return out
+
+
+class MailMirror:
+    """SQLite mirror of one mailbox."""
+
+    def __init__(self, db_path: str = MIRROR_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.trigram = True
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA busy_timeout=10000")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id TEXT PRIMARY KEY, changekey TEXT, folder TEXT, conversation_id TEXT, subject TEXT, "
+                "sender_email TEXT, sender_name TEXT, sender TEXT, recipients TEXT, received REAL, "
+                "received_iso TEXT, is_read INTEGER, has_attachments INTEGER, body TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_received ON messages(folder, received)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (folder TEXT PRIMARY KEY, state TEXT, synced_at REAL)")
+            fts_cols = "subject, body, sender, recipients, content='messages', content_rowid='rowid'"
+            try:
+                conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5({fts_cols}, tokenize='trigram')")
+            except sqlite3.OperationalError:
+                # SQLite < 3.34: word tokens with prefix queries instead of substrings
+                self.trigram = False
+                conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5({fts_cols})")
+            conn.executescript(
+                "CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN "
+                "INSERT INTO messages_fts(rowid, subject, body, sender, recipients) "
+                "VALUES (new.rowid, new.subject, new.body, new.sender, new.recipients); END;"
+                "CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN "
+                "INSERT INTO messages_fts(messages_fts, rowid, subject, body, sender, recipients) "
+                "VALUES ('delete', old.rowid, old.subject, old.body, old.sender, old.recipients); END;"
+                "CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN "
+                "INSERT INTO messages_fts(messages_fts, rowid, subject, body, sender, recipients) "
+                "VALUES ('delete', old.rowid, old.subject, old.body, old.sender, old.recipients); "
+                "INSERT INTO messages_fts(rowid, subject, body, sender, recipients) "
+                "VALUES (new.rowid, new.subject, new.body, new.sender, new.recipients); END;"
+            )
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE name='messages_fts'").fetchone()
+            self.trigram = bool(row and "trigram" in (row["sql"] or ""))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ----- sync -----
+    def last_synced(self) -> float:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT synced_at FROM sync_state").fetchall()
+            stamps = [r["synced_at"] or 0 for r in rows]
+            return min(stamps) if len(stamps) == len(MIRROR_FOLDERS) else 0.0
+        finally:
+            conn.close()
+
+    def sync(self, force: bool = False) -> Dict[str, int]:
+        """
+        Bring the mirror up to date with Exchange (incremental after the first run).
+
+        Returns:
+            Counts of applied changes per kind
+        """
+        with self._lock:
+            if not force and time.time() - self.last_synced() < MIRROR_SYNC_INTERVAL:
+                return {}
+            from ews_tools2 import _get_account
+            account = _get_account()
+            totals: Dict[str, int] = {}
+            for folder_name in MIRROR_FOLDERS:
+                for k, v in self._sync_folder(account, folder_name).items():
+                    totals[k] = totals.get(k, 0) + v
+            self._prune()
+            if any(totals.values()):
+                logger.info(f"[mirror] Synced {self.db_path}: {totals}")
+            return totals
+
+    def _sync_folder(self, account, folder_name: str) -> Dict[str, int]:
+        from ews_tools2 import _load_fields, BODY_FIELDS
+        folder = getattr(account, folder_name)
+        conn = self._connect()
+        counts = {"created": 0, "updated": 0, "deleted": 0, "read_flags": 0}
+        try:
+            row = conn.execute("SELECT state FROM sync_state WHERE folder = ?", (folder_name,)).fetchone()
+            state = row["state"] if row else None
+            oldest = time.time() - MIRROR_RETENTION_DAYS * 86400
+            upserts = []
+            for change_type, item in folder.sync_items(sync_state=state, only_fields=list(SYNC_FIELDS)):
+                if change_type in ("create", "update"):
+                    received = getattr(item, "datetime_received", None)
+                    if received is None or received.timestamp() < oldest:
+                        continue
+                    upserts.append(item)
+                    counts["created" if change_type == "create" else "updated"] += 1
+                elif change_type == "delete":
+                    conn.execute("DELETE FROM messages WHERE id = ?", (getattr(item, "id", None),))
+                    counts["deleted"] += 1
+                elif change_type == "read_flag_change":
+                    item_id, is_read = item
+                    conn.execute("UPDATE messages SET is_read = ? WHERE id = ?", (int(bool(is_read)), getattr(item_id, "id", None)))
+                    counts["read_flags"] += 1
+
+            # Bodies only for new items, in bulk; updates keep the stored body
+            known = {r["id"] for r in conn.execute(
+                "SELECT id FROM messages WHERE id IN (%s)" % ",".join("?" * len(upserts)),
+                [m.id for m in upserts],
+            )} if upserts else set()
+            bodies = _load_fields(account, [m for m in upserts if m.id not in known], BODY_FIELDS)
+            for m in upserts:
+                self._upsert(conn, folder_name, m, bodies.get(m.id), keep_body=m.id in known)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (folder, state, synced_at) VALUES (?, ?, ?)",
+                (folder_name, folder.item_sync_state, time.time()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return counts
+
+    def _upsert(self, conn: sqlite3.Connection, folder_name: str, m, loaded, keep_body: bool):
+        from ews_tools2 import _conv_to_str
+        sender_email = (m.sender and getattr(m.sender, "email_address", None)) or ""
+        sender_name = (m.sender and getattr(m.sender, "name", None)) or ""
+        recipients = _addresses(getattr(m, "to_recipients", None)) + _addresses(getattr(m, "cc_recipients", None))
+        received = m.datetime_received
+        values = {
+            "id": m.id,
+            "changekey": m.changekey,
+            "folder": folder_name,
+            "conversation_id": _conv_to_str(getattr(m, "conversation_id", None)),
+            "subject": m.subject or "",
+            "sender_email": sender_email,
+            "sender_name": sender_name,
+            "sender": f"{sender_name} {sender_email}".strip(),
+            "recipients": " ".join(recipients),
+            "received": received.timestamp() if received else 0,
+            "received_iso": received.isoformat() if received else None,
+            "is_read": int(bool(getattr(m, "is_read", False))),
+            "has_attachments": int(bool(getattr(m, "has_attachments", False))),
+        }
+        if keep_body:
+            cols = ", ".join(f"{k} = ?" for k in values if k != "id")
+            conn.execute(f"UPDATE messages SET {cols} WHERE id = ?", [v for k, v in values.items() if k != "id"] + [m.id])
+        else:
+            body_text = getattr(loaded, "text_body", None) or ""
+            values["body"] = extract_new_content(body_text)[:MIRROR_BODY_CHARS]
+            conn.execute(
+                f"INSERT OR REPLACE INTO messages ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                list(values.values()),
+            )
+
+    def _prune(self):
+        """Apply the retention window and message cap."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM messages WHERE received < ?", (time.time() - MIRROR_RETENTION_DAYS * 86400,))
+            conn.execute(
+                "DELETE FROM messages WHERE rowid IN (SELECT rowid FROM messages ORDER BY received DESC LIMIT -1 OFFSET ?)",
+                (MIRROR_MAX_MESSAGES,),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ----- search -----
+    def _fts_clause(self, column: str, terms: List[str]) -> Optional[str]:
+        """MATCH expression for any of `terms` in `column` (None if a term is too short for trigrams)."""
+        parts = []
+        for t in terms:
+            if self.trigram:
+                if len(t) < 3:
+                    return None
+                parts.append(f"{column}:{_quote(t)}")
+            else:
+                parts.append(f"{column}:{_quote(t)}*")
+        return "(" + " OR ".join(parts) + ")" if parts else None
+
+    def search(
+        self,
+        sender_terms: Optional[List[str]] = None,
+        sender_domain: str = "",
+        recipient_terms: Optional[List[str]] = None,
+        subject: str = "",
+        body: str = "",
+        read: Optional[bool] = None,
+        has_attachments: Optional[bool] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        fuzzy_threshold: float = 0.90,
+        limit: int = 50,
+        folder: str = "inbox",
+    ) -> List[Dict[str, Any]]:
+        """
+        get_messages_filtered-shaped results, newest first: substring matches from the
+        full-text index, topped up by the fuzzy matcher over recent messages.
+        """
+        sender_terms = [t for t in (sender_terms or []) if t]
+        recipient_terms = [t for t in (recipient_terms or []) if t]
+        where = ["folder = ?"]
+        params: List[Any] = [folder]
+        if read is not None:
+            where.append("is_read = ?")
+            params.append(int(bool(read)))
+        if has_attachments is not None:
+            where.append("has_attachments = ?")
+            params.append(int(bool(has_attachments)))
+        if date_from:
+            where.append("received >= ?")
+            params.append(date_from.timestamp())
+        if date_to:
+            where.append("received <= ?")
+            params.append(date_to.timestamp())
+        base_where, base_params = list(where), list(params)
+
+        # Substring criteria: FTS where possible, instr() for terms shorter than a trigram
+        criteria = [
+            ("sender", sender_terms),
+            ("sender", ["@" + sender_domain.lstrip("@")] if sender_domain else []),
+            ("recipients", recipient_terms),
+            ("subject", [subject] if subject else []),
+            ("body", [body] if body else []),
+        ]
+        match_parts = []
+        for column, terms in criteria:
+            if not terms:
+                continue
+            clause = self._fts_clause(column, terms)
+            if clause:
+                match_parts.append(clause)
+            else:
+                where.append("(" + " OR ".join(f"instr(lower({column}), ?) > 0" for _ in terms) + ")")
+                params.extend(t.lower() for t in terms)
+        if match_parts:
+            where.append("rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+            params.append(" AND ".join(match_parts))
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT * FROM messages WHERE {' AND '.join(where)} ORDER BY received DESC LIMIT ?",
+                params + [int(limit)],
+            ).fetchall()
+            results = [self._to_result(r) for r in rows]
+            if len(results) >= limit or not any(terms for _, terms in criteria) or fuzzy_threshold >= 1.0:
+                return results
+
+            # Fuzzy top-up over recent messages (local, so a wider window than the live search)
+            seen = {r["id"] for r in results}
+            recent = conn.execute(
+                f"SELECT * FROM messages WHERE {' AND '.join(base_where)} ORDER BY received DESC LIMIT ?",
+                base_params + [MIRROR_FUZZY_WINDOW],
+            ).fetchall()
+        finally:
+            conn.close()
+
+        sender_ms = [FuzzyMatcher(t, fuzzy_threshold) for t in sender_terms]
+        recipient_ms = [FuzzyMatcher(t, fuzzy_threshold) for t in recipient_terms]
+        subject_m = FuzzyMatcher(subject, fuzzy_threshold)
+        body_m = FuzzyMatcher(body, fuzzy_threshold)
+        for r in recent:
+            if r["id"] in seen:
+                continue
+            if sender_domain and ("@" + sender_domain.lstrip("@").lower()) not in (r["sender_email"] or "").lower():
+                continue
+            if sender_ms and not any(m.match_any([r["sender_name"], r["sender_email"]]) or
+                                     m.query in (r["sender"] or "").lower() for m in sender_ms):
+                continue
+            if recipient_ms and not any(m.match_any((r["recipients"] or "").split()) or
+                                        m.query in (r["recipients"] or "").lower() for m in recipient_ms):
+                continue
+            if subject and subject.lower() not in (r["subject"] or "").lower() and not subject_m.matches(r["subject"]):
+                continue
+            if body and body.lower() not in (r["body"] or "").lower() and not body_m.matches((r["body"] or "")[:2000]):
+                continue
+            results.append(self._to_result(r))
+            if len(results) >= limit:
+                break
+        return results
+
+    @staticmethod
+    def _to_result(r: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": r["id"],
+            "changekey": r["changekey"],
+            "subject": r["subject"] or "",
+            "sender_email": r["sender_email"] or "",
+            "sender_name": r["sender_name"] or "",
+            "received": r["received_iso"],
+            "is_read": bool(r["is_read"]),
+            "has_attachments": bool(r["has_attachments"]),
+            "conversation_id": r["conversation_id"],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            count = conn.execute("SELECT COUNT(*) AS n FROM messages").fetchone()["n"]
+        finally:
+            conn.close()
+        size = sum(os.path.getsize(p) for p in (self.db_path, self.db_path + "-wal") if os.path.exists(p))
+        return {"messages": count, "bytes": size, "last_synced": self.last_synced(), "trigram": self.trigram}
+
+
+# ============= SINGLETONS =============
+_mirrors: Dict[str, MailMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def mirror_db_path(mailbox_id: Optional[str] = None) -> str:
+    """Database file for a mailbox (MAIL_MIRROR_DB for the default mailbox)."""
+    if not mailbox_id:
+        return MIRROR_DB
+    root, ext = os.path.splitext(MIRROR_DB)
+    return f"{root}_{mailbox_id}{ext}"
+
+
+def get_mail_mirror() -> MailMirror:
+    """Mirror of the mailbox in the current ews_tools2 mailbox context."""
+    from ews_tools2 import current_mailbox
+    mailbox = current_mailbox()
+    path = mirror_db_path((mailbox or {}).get("id"))
+    with _mirrors_lock:
+        if path not in _mirrors:
+            _mirrors[path] = MailMirror(path)
+        return _mirrors[path]
+
+
+def search_mirror(**criteria) -> Optional[List[Dict[str, Any]]]:
+    """
+    MailMirror.search() after a throttled incremental sync.
+
+    Returns:
+        Results, or None when the mirror is disabled or has never synced (caller searches live)
+    """
+    if not MIRROR_ENABLED:
+        return None
+    try:
+        mirror = get_mail_mirror()
+        try:
+            mirror.sync()
+        except Exception as e:
+            logger.warning(f"[mirror] Sync failed, answering from the last synced state: {e}")
+        if not mirror.last_synced():
+            return None
+        return mirror.search(**criteria)
+    except Exception as e:
+        logger.warning(f"[mirror] Search failed: {e}")
+        return None
@@ -0,0 +1,316 @@
+"""
+mail_normalizer.py
+Reduce email bodies to the content each message actually adds.
+
+Replies carry the whole quoted history below them, so feeding raw bodies of a
+thread to the LLM repeats earlier messages over and over. The pipeline here:
+    1. HTML: drops blockquotes / Outlook and Gmail quote containers, then converts to text
+    2. cuts at the first quote header ("On ... wrote:", Outlook "From:/Sent:" blocks,
+       "-----Original Message-----", underscore separators)
+    3. drops '>'-prefixed quoted lines
+    4. removes signatures ("-- ", sign-offs near the end, "Sent from my ...")
+    5. removes legal disclaimers / confidentiality notices
+If stripping leaves nothing (e.g. a bare forward), the unstripped text is returned.
+
+body_to_text() is the single HTML-to-text conversion used by the ews_tools2 fetch
+paths; results are cached per (item id, changekey).
+"""
+
+import os
+import re
+import html as _html
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import List, Dict, Any, Optional
+
+# ============= PATTERNS =============
+_ON_WROTE_RE = re.compile(r"^\s*(On|Am|Le|El)\s.{0,300}(wrote|schrieb|a écrit|escribió)\s*:\s*$", re.IGNORECASE)
+_ORIGINAL_MSG_RE = re.compile(r"^\s*-{2,}\s*(Original Message|Forwarded message|Reply message)\s*-{2,}\s*$", re.IGNORECASE)
+_UNDERSCORE_SEP_RE = re.compile(r"^\s*_{10,}\s*$")
+_HEADER_FROM_RE = re.compile(r"^\s*\**\s*From\s*:\**\s*\S", re.IGNORECASE)
+_HEADER_FIELD_RE = re.compile(r"^\s*\**\s*(Sent|Date|To|Cc|Subject)\s*:", re.IGNORECASE)
+
+_SIG_DELIM_RE = re.compile(r"^\s*--\s*$")
+_SENT_FROM_RE = re.compile(r"^\s*(Sent from my|Sent from Mail for|Get Outlook for)\b", re.IGNORECASE)
+_SIGN_OFF_RE = re.compile(
+    r"^\s*(best|kind|warm|many)?\s*(regards|wishes|thanks|thank you|thanks\s*(&|and)\s*regards|sincerely|cheers|br)\s*[,!.]?\s*$",
+    re.IGNORECASE,
+)
+# Sign-offs are only treated as a signature start this close to the end
+_SIGN_OFF_MAX_TAIL_LINES = 8
+
+_DISCLAIMER_RE = re.compile(
+    r"(disclaimer\s*:?|confidentiality notice|this e-?mail (and any attachments )?(is|are) (strictly )?confidential|"
+    r"intended (solely|only) for the (use of the )?(individual|addressee|person)|"
+    r"if you are not the intended recipient|please consider the environment before printing)",
+    re.IGNORECASE,
+)
+
+_HTML_QUOTE_START_RE = re.compile(
+    r"<(div|span)[^>]*\b(id=[\"']?(divRplyFwdMsg|appendonsend)|class=[\"']?[^\"'>]*(gmail_quote|OutlookMessageHeader|yahoo_quoted|moz-cite-prefix))[^>]*>"
+    r"|<hr[^>]*\bid=[\"']?stopSpelling[^>]*>",
+    re.IGNORECASE,
+)
+_BLOCKQUOTE_RE = re.compile(r"<blockquote\b.*?</blockquote>", re.IGNORECASE | re.DOTALL)
+_WS_RE = re.compile(r"[ \t\r\n\f\v]+")
+
+
+# ============= HTML =============
+def strip_html_quotes(body_html: str) -> str:
+    """Remove quoted history containers from an HTML body (keeps what precedes them)."""
+    if not body_html:
+        return ""
+    m = _HTML_QUOTE_START_RE.search(body_html)
+    if m:
+        body_html = body_html[:m.start()]
+    return _BLOCKQUOTE_RE.sub("", body_html)
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Single pass over the HTML: entities are decoded by the parser, whitespace is
+    collapsed as a browser would, block elements become line breaks, table cells
+    are joined with " | ", list items get "- ", links keep their target and
+    blockquote lines are '>'-prefixed so strip_quoted_text() can drop them.
+    """
+
+    _SKIP = {"script", "style", "head", "title"}
+    _PARAGRAPH = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol", "blockquote", "pre", "hr", "dl"}
+    _BLOCK = {"div", "tr", "li", "section", "article", "header", "footer", "dt", "dd", "caption"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self.line: List[str] = []
+        self.skip = 0
+        self.pre = 0
+        self.quote = 0
+        self.cells = 0
+        self.href: Optional[str] = None
+        self.link_text: List[str] = []
+
+    def _flush(self, force: bool = False):
+        raw = "".join(self.line)
+        self.line = []
+        text = raw.rstrip() if self.pre else raw.strip()
+        if text or force:
+            self.lines.append(("> " * self.quote + text).rstrip())
+
+    def _gap(self):
+        self._flush()
+        if self.lines and self.lines[-1].replace(">", "").strip():
+            self.lines.append(("> " * self.quote).rstrip())
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self.skip += 1
+        elif tag == "br":
+            self._flush(force=True)
+        elif tag in ("td", "th"):
+            if self.cells:
+                self.line.append(" | ")
+            self.cells += 1
+        elif tag == "a":
+            self.href = dict(attrs).get("href") or ""
+            self.link_text = []
+        elif tag in self._PARAGRAPH:
+            self._gap()
+            if tag == "blockquote":
+                self.quote += 1
+            elif tag == "pre":
+                self.pre += 1
+        elif tag in self._BLOCK:
+            self._flush()
+            if tag == "tr":
+                self.cells = 0
+            elif tag == "li":
+                self.line.append("- ")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self.skip = max(0, self.skip - 1)
+        elif tag == "a" and self.href is not None:
+            href, text = self.href, "".join(self.link_text).strip()
+            self.href = None
+            if href.startswith(("http://", "https://")) and href not in text:
+                self.line.append(f" ({href})")
+        elif tag in self._PARAGRAPH:
+            if tag == "blockquote":
+                self._flush()
+                self.quote = max(0, self.quote - 1)
+                if self.lines and not self.lines[-1].replace(">", "").strip():
+                    self.lines[-1] = ("> " * self.quote).rstrip()
+            elif tag == "pre":
+                self._flush()
+                self.pre = max(0, self.pre - 1)
+            self._gap()
+        elif tag in self._BLOCK:
+            self._flush()
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        data = data.replace("\xa0", " ")
+        if self.pre:
+            parts = data.split("\n")
+            for i, part in enumerate(parts):
+                if i:
+                    self._flush(force=True)
+                self.line.append(part)
+        else:
+            data = _WS_RE.sub(" ", data)
+            if not self.line or "".join(self.line).endswith(" "):
+                data = data.lstrip()
+            self.line.append(data)
+        if self.href is not None:
+            self.link_text.append(data)
+
+    def text(self) -> str:
+        self.close()
+        self._flush()
+        return _collapse_blank_lines("\n".join(self.lines))
+
+
+def html_to_text(body_html: str) -> str:
+    """Plain-text rendering of an HTML body (tables, lists, links and entities handled)."""
+    if not body_html:
+        return ""
+    parser = _TextExtractor()
+    try:
+        parser.feed(body_html)
+    except Exception:
+        return _html.unescape(re.sub(r"<[^>]+>", " ", body_html)).strip()
+    return parser.text()
+
+
+# ============= BODY TEXT CACHE =============
+# Converted bodies keyed by (item id, changekey): a message is converted once per
+# version no matter how many fetch paths (read, prefetch, threads) return it.
+_TEXT_CACHE_SIZE = int(os.getenv("MAIL_TEXT_CACHE_SIZE", "2000"))
+_text_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_text_lock = threading.Lock()
+
+
+def body_to_text(body: Optional[str], is_html: bool = True, cache_key: Optional[tuple] = None) -> str:
+    """Compact text of a message body; cached when cache_key (item id, changekey) is given."""
+    if cache_key and all(cache_key):
+        with _text_lock:
+            cached = _text_cache.get(cache_key)
+            if cached is not None:
+                _text_cache.move_to_end(cache_key)
+                return cached
+    text = html_to_text(body or "") if is_html else _collapse_blank_lines(body or "")
+    if cache_key and all(cache_key):
+        with _text_lock:
+            _text_cache[cache_key] = text
+            while len(_text_cache) > _TEXT_CACHE_SIZE:
+                _text_cache.popitem(last=False)
+    return text
+
+
+# ============= TEXT =============
+def _is_outlook_header(lines: List[str], i: int) -> bool:
+    """'From: ...' followed within a few lines by Sent/Date/To/Subject fields."""
+    if not _HEADER_FROM_RE.match(lines[i]):
+        return False
+    fields = sum(1 for line in lines[i + 1:i + 6] if _HEADER_FIELD_RE.match(line))
+    return fields >= 2
+
+
+def strip_quoted_text(text: str) -> str:
+    """Cut a plain-text body at the first quote header and drop '>' quoted lines."""
+    if not text:
+        return ""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    cut = len(lines)
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        joined = stripped + " " + lines[i + 1].strip() if i + 1 < len(lines) else stripped
+        if (
+            _ON_WROTE_RE.match(stripped)
+            or (stripped.lower().startswith("on ") and _ON_WROTE_RE.match(joined))
+            or _ORIGINAL_MSG_RE.match(stripped)
+            or _UNDERSCORE_SEP_RE.match(stripped)
+            or _is_outlook_header(lines, i)
+        ):
+            cut = i
+            break
+    kept = [line for line in lines[:cut] if not line.lstrip().startswith(">")]
+    return "\n".join(kept)
+
+
+def strip_signature(text: str) -> str:
+    """Remove signature blocks, mobile footers and legal disclaimers."""
+    if not text:
+        return ""
+    lines = text.split("\n")
+
+    for i, line in enumerate(lines):
+        if _SIG_DELIM_RE.match(line) or _SENT_FROM_RE.match(line):
+            lines = lines[:i]
+            break
+
+    # Disclaimers usually follow the message; cut from the first one in the lower half
+    for i, line in enumerate(lines):
+        if i >= len(lines) // 2 and _DISCLAIMER_RE.search(line):
+            lines = lines[:i]
+            break
+
+    non_empty = [i for i, line in enumerate(lines) if line.strip()]
+    for i in non_empty[-_SIGN_OFF_MAX_TAIL_LINES:]:
+        if _SIGN_OFF_RE.match(lines[i]):
+            lines = lines[:i]
+            break
+    return "\n".join(lines)
+
+
+def _collapse_blank_lines(text: str) -> str:
+    return re.sub(r"\n\s*\n(\s*\n)+", "\n\n", text or "").strip()
+
+
+def extract_new_content(body_text: str = "", body_html: str = "") -> str:
+    """
+    The content a message adds to its thread, without quoted history,
+    signature or disclaimer. Prefers HTML when given (quote containers are
+    reliable there), otherwise works on the plain text.
+    """
+    if body_html:
+        original = html_to_text(body_html)
+        text = html_to_text(strip_html_quotes(body_html))
+    else:
+        original = body_text or ""
+        text = original
+    cleaned = _collapse_blank_lines(strip_signature(strip_quoted_text(text)))
+    return cleaned or _collapse_blank_lines(original)
+
+
+def normalize_mail_body(mail: Dict[str, Any]) -> str:
+    """extract_new_content() for a mail dict as returned by ews_tools2."""
+    if not isinstance(mail, dict):
+        return ""
+    body_text = mail.get("body_text") or ""
+    body_html = mail.get("body_html") or ""
+    if not body_text and not body_html:
+        body = mail.get("body") or ""
+        if "<" in body and ">" in body:
+            body_html = body
+        else:
+            body_text = body
+    return extract_new_content(body_text, body_html)
+
+
+def build_thread_context(thread: List[Dict[str, Any]], max_messages: int = 6,
+                         max_chars_per_message: Optional[int] = None) -> str:
+    """Thread transcript for prompts: one block of new content per message."""
+    parts = []
+    for t in (thread or [])[:max_messages]:
+        who = t.get("sender_email") or t.get("sender_name") or "Unknown"
+        when = t.get("received") or ""
+        content = normalize_mail_body(t)
+        if max_chars_per_message and len(content) > max_chars_per_message:
+            content = content[:max_chars_per_message] + "…"
+        parts.append(f"{who} @ {when}:\n{content}\n---")
+    return "\n".join(parts)
@@ -0,0 +1,120 @@
+"""
+mailbox_registry.py
+Mailboxes served by the autopilot, read from ews_accounts.json.
+
+Each entry of ews_accounts.json describes one Exchange mailbox:
+    {"id", "name", "email", "host", optional "username", "password",
+     "autopilot_enabled", "max_actions", "max_actions_per_hour"}
+
+Passwords are not required in the file; they are resolved in order from the
+entry's "password", the EWS_PASSWORD_<ID> env var (ID upper-cased, non
+alphanumerics as '_'), or EWS_PASSWORD when the entry is the EWS_EMAIL mailbox.
+
+AUTOPILOT_MAILBOXES selects what the autopilot sweeps:
+    (unset)      - the single mailbox configured by EWS_EMAIL/EWS_PASSWORD/EWS_HOST
+    active       - the active_account_id entry
+    all          - every entry with autopilot_enabled != false
+    id1,id2,...  - the listed entries (ids or email addresses)
+"""
+
+import os
+import re
+import json
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTS_FILE = os.getenv("EWS_ACCOUNTS_FILE", "ews_accounts.json")
+
+
+def _load_accounts_file(path: str = ACCOUNTS_FILE) -> Dict[str, Any]:
+    try:
+        p = Path(path)
+        if p.exists():
+            data = json.loads(p.read_text(encoding="utf-8"))
+            if isinstance(data, dict):
+                return data
+    except Exception as e:
+        logger.warning(f"[mailboxes] Failed to read {path}: {e}")
+    return {"accounts": [], "active_account_id": None}
+
+
+def _password_env_name(account_id: str) -> str:
+    return "EWS_PASSWORD_" + re.sub(r"[^A-Za-z0-9]", "_", account_id or "").upper()
+
+
+def _resolve_password(entry: Dict[str, Any]) -> str:
+    if entry.get("password"):
+        return entry["password"]
+    from_env = os.getenv(_password_env_name(entry.get("id", "")), "")
+    if from_env:
+        return from_env
+    if (entry.get("email") or "").lower() == os.getenv("EWS_EMAIL", "").lower():
+        return os.getenv("EWS_PASSWORD", "")
+    return ""
+
+
+def to_mailbox(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Normalize an ews_accounts.json entry into a mailbox dict (None if unusable)."""
+    email = (entry.get("email") or "").strip()
+    if not email:
+        return None
+    password = _resolve_password(entry)
+    if not password:
+        logger.warning(
+            f"[mailboxes] No password for {email}; set {_password_env_name(entry.get('id', ''))} to enable it"
+        )
+        return None
+    account_id = entry.get("id") or email
+    return {
+        "id": account_id,
+        "name": entry.get("name") or email,
+        "email": email,
+        "username": entry.get("username") or email,
+        "password": password,
+        "host": entry.get("host") or os.getenv("EWS_HOST", ""),
+        "max_actions": entry.get("max_actions"),
+        "max_actions_per_hour": entry.get("max_actions_per_hour"),
+    }
+
+
+def list_mailboxes(path: str = ACCOUNTS_FILE) -> List[Dict[str, Any]]:
+    """All usable mailboxes from the accounts file."""
+    data = _load_accounts_file(path)
+    mailboxes = []
+    for entry in data.get("accounts") or []:
+        mb = to_mailbox(entry)
+        if mb:
+            mb["autopilot_enabled"] = entry.get("autopilot_enabled", True) is not False
+            mailboxes.append(mb)
+    return mailboxes
+
+
+def get_autopilot_mailboxes(selection: Optional[str] = None, path: str = ACCOUNTS_FILE) -> List[Optional[Dict[str, Any]]]:
+    """
+    Mailboxes the autopilot should sweep (see AUTOPILOT_MAILBOXES).
+
+    Returns:
+        List of mailbox dicts; [None] means the single env-configured mailbox
+    """
+    selection = (selection if selection is not None else os.getenv("AUTOPILOT_MAILBOXES", "")).strip()
+    if not selection:
+        return [None]
+
+    data = _load_accounts_file(path)
+    mailboxes = list_mailboxes(path)
+    if selection.lower() == "active":
+        active_id = data.get("active_account_id")
+        chosen = [mb for mb in mailboxes if mb["id"] == active_id]
+    elif selection.lower() == "all":
+        chosen = [mb for mb in mailboxes if mb.get("autopilot_enabled")]
+    else:
+        wanted = {s.strip().lower() for s in selection.split(",") if s.strip()}
+        chosen = [mb for mb in mailboxes if mb["id"].lower() in wanted or mb["email"].lower() in wanted]
+
+    if not chosen:
+        logger.warning(f"[mailboxes] AUTOPILOT_MAILBOXES={selection!r} matched no usable mailbox; using EWS_EMAIL")
+        return [None]
+    return chosen
@@ -45,7 +45,7 @@ from agent_tools import ALL_TOOLS
 from autopilot import (
     get_autopilot_rules, set_autopilot_rules,
     get_autopilot_period_minutes, set_autopilot_period_minutes,
-    autopilot_once, _load_state, _save_state, _DEFAULT_RULES
+    autopilot_sweep_mailboxes, _load_state, _save_state, _DEFAULT_RULES
 )
 from action_handlers import (
     handle_action, generate_action_from_llm,
@@ -352,15 +352,9 @@ def reload_credentials() -> bool:
         # Reload environment variables from .env file
         load_dotenv(override=True)
         
-        # Update ews_tools2 runtime globals
+        # Update ews_tools2 runtime globals (pooled account is rebuilt only if they changed)
         import ews_tools2
-        ews_tools2.EMAIL = os.getenv("EWS_EMAIL", "")
-        ews_tools2.PASSWORD = os.getenv("EWS_PASSWORD", "")
-        ews_tools2.EXCHANGE_HOST = os.getenv("EWS_HOST", "")
-        
-        # Clear cached account to force reconnection with new credentials
-        ews_tools2._account = None
-        ews_tools2._account_config = None
+        ews_tools2.refresh_credentials_from_env()
         
         logging.info(f"[reload_credentials] Credentials reloaded for: {ews_tools2.EMAIL}")
         return True
@@ -625,7 +619,7 @@ with st.sidebar:
         if st.button("▶️ Run Now (Manual)", use_container_width=True):
             with st.spinner("Running autopilot..."):
                 try:
-                    logs = autopilot_once()
+                    logs = autopilot_sweep_mailboxes()
                     st.session_state.autopilot_logs.extend(logs)
                     st.success(f"✅ Processed {len(logs)} items")
                 except Exception as e:
@@ -711,13 +705,14 @@ def execute_custom_action_plan(
 # ==========================================
 # TABBED INTERFACE
 # ==========================================
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
     "💬 Chatbox",
     "📚 Knowledge Base",
     "⚙️ Autopilot Rules", 
     "📊 Autopilot Activity",
     "🎯 Action Plans",
-    "🔌 Connection Settings"
+    "🔌 Connection Settings",
+    "⚡ Performance"
 ])
 
 # ==========================================
@@ -1261,14 +1256,39 @@ with tab4:
     st.markdown("## 📊 Autopilot Activity Logs")
     st.markdown("Recent actions taken by the autopilot system")
     
-    st_data = _load_state()
-    summaries = st_data.get("autopilot_summaries", [])[:20]
+    from autopilot import get_autopilot_activity
+    
+    fcol1, fcol2, fcol3 = st.columns(3)
+    with fcol1:
+        activity_sender = st.text_input("Sender contains", key="activity_sender")
+    with fcol2:
+        activity_rule = st.text_input("Rule ID", key="activity_rule")
+    with fcol3:
+        activity_action = st.text_input("Action", key="activity_action", placeholder="react-processed")
+    
+    # Cursor stack for newest-first paging (None = first page)
+    activity_filters = (activity_sender, activity_rule, activity_action)
+    if st.session_state.get("activity_filters") != activity_filters:
+        st.session_state["activity_filters"] = activity_filters
+        st.session_state["activity_cursors"] = [None]
+    cursors = st.session_state.setdefault("activity_cursors", [None])
+    
+    page = get_autopilot_activity(
+        limit=10,
+        cursor=cursors[-1],
+        sender=activity_sender or None,
+        rule=activity_rule or None,
+        action=activity_action or None,
+    )
+    summaries = page.get("items", [])
     
     if summaries:
-        for s in summaries[:10]:
+        for s in summaries:
             with st.expander(f"⏰ {s.get('time', '')} — {s.get('subject', '')}"):
                 st.markdown(f"**From:** {s.get('from', '')}")
                 st.markdown(f"**Action:** `{s.get('action')}`")
+                if s.get("rules"):
+                    st.markdown(f"**Rules:** {', '.join(s['rules'])}")
                 
                 col1, col2 = st.columns(2)
                 with col1:
@@ -1280,6 +1300,16 @@ with tab4:
     else:
         st.info("No autopilot actions recorded yet")
     
+    pcol1, pcol2 = st.columns(2)
+    with pcol1:
+        if len(cursors) > 1 and st.button("⬅️ Newer", key="activity_newer"):
+            cursors.pop()
+            st.rerun()
+    with pcol2:
+        if page.get("next_cursor") and st.button("Older ➡️", key="activity_older"):
+            cursors.append(page["next_cursor"])
+            st.rerun()
+    
     st.markdown("---")
     st.markdown("### 📝 All Logs")
     
@@ -1643,6 +1673,69 @@ with tab6:
             "4. Use '📥 Fetch Emails' to test retrieval"
         )
 
+# ==========================================
+# TAB 7: AUTOPILOT PERFORMANCE
+# ==========================================
+with tab7:
+    st.markdown("## ⚡ Autopilot Performance")
+    st.markdown("Per-sweep timing breakdown, agent usage and EWS load")
+    
+    from autopilot_perf import get_perf_records, summarize_perf
+    
+    perf_limit = st.slider("Sweeps to show", min_value=10, max_value=500, value=100, step=10, key="perf_limit")
+    perf_records = get_perf_records(limit=perf_limit)
+    
+    if perf_records:
+        perf_summary = summarize_perf(perf_records)
+        mcol1, mcol2, mcol3, mcol4 = st.columns(4)
+        mcol1.metric("Avg sweep", f"{perf_summary['avg_sweep_s']:.1f}s")
+        mcol2.metric("p95 sweep", f"{perf_summary['p95_sweep_s']:.1f}s")
+        mcol3.metric("Avg agent / email", f"{perf_summary['avg_agent_s']:.1f}s")
+        mcol4.metric("EWS requests", perf_summary["ews_requests"])
+        mcol1.metric("Emails (agent)", perf_summary["emails"])
+        mcol2.metric("LLM calls", perf_summary["llm_calls"])
+        mcol3.metric("Tokens", perf_summary["tokens"])
+        mcol4.metric("Tool calls", perf_summary["tool_calls"])
+        
+        st.markdown("### ⏱️ Sweep time by phase (seconds)")
+        phase_names = sorted({k for r in perf_records for k in (r.get("phases") or {})})
+        st.bar_chart({
+            name: [(r.get("phases") or {}).get(name, 0.0) for r in perf_records]
+            for name in phase_names
+        })
+        
+        st.markdown("### 📈 Total sweep time (seconds)")
+        st.line_chart({"total_s": [r.get("total_s", 0.0) for r in perf_records]})
+        
+        st.markdown("### 🧾 Recent sweeps")
+        for r in reversed(perf_records[-10:]):
+            started = datetime.fromtimestamp(r.get("ts", 0)).strftime("%Y-%m-%d %H:%M:%S")
+            with st.expander(f"{started} — {r.get('total_s', 0):.1f}s — {r.get('status', '')}"):
+                st.json({"phases": r.get("phases"), "counters": r.get("counters"), "emails": r.get("emails")})
+    else:
+        st.info("No sweep performance records yet")
+
+    from outbox import OUTBOX_ENABLED, get_outbox
+    if OUTBOX_ENABLED:
+        st.markdown("### 📤 Outbox")
+        outbox_stats = get_outbox().stats()
+        ocol1, ocol2, ocol3, ocol4 = st.columns(4)
+        ocol1.metric("Queued", outbox_stats["counts"].get("queued", 0))
+        ocol2.metric("Sending", outbox_stats["counts"].get("sending", 0))
+        ocol3.metric("Sent", outbox_stats["counts"].get("sent", 0))
+        ocol4.metric("Failed", outbox_stats["counts"].get("failed", 0))
+        with st.expander("Recent outbound sends"):
+            st.json(get_outbox().recent(limit=20))
+
+    from ews_throttle import get_throttle_stats
+    st.markdown("### 🚦 EWS rate limiter")
+    throttle_stats = get_throttle_stats()
+    tcol1, tcol2, tcol3, tcol4 = st.columns(4)
+    tcol1.metric("Requests", throttle_stats["requests"])
+    tcol2.metric("Waited (s)", throttle_stats["wait_seconds"])
+    tcol3.metric("Throttled", throttle_stats["throttled"])
+    tcol4.metric("Paused for (s)", throttle_stats["paused_for_seconds"])
+
 # ==========================================
 # AUTOPILOT PERIODIC SWEEP
 # ==========================================
@@ -1666,7 +1759,7 @@ if st.session_state.get(AUTO_KEY):
             with st.spinner("🤖 Running autopilot sweep..."):
                 try:
                     # Execute email autopilot (rules) with hands_free state
-                    logs = autopilot_once(hands_free=hands_free)
+                    logs = autopilot_sweep_mailboxes(hands_free=hands_free)
                     st.session_state.autopilot_logs.extend(logs)
                     
                     # Check if autopilot still enabled after email processing
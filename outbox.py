@@ -0,0 +1,310 @@
+"""
+outbox.py
+Durable outbound mail queue with a background sender.
+
+When OUTBOX_ENABLED=true, reply_to_email, send_mail, send_follow_up and
+forward_email (ews_tools2) no longer call SendItem inside the agent's tool call:
+the fully composed request (function + arguments + mailbox) is written to a
+SQLite queue and the tool returns a queued id at once. A daemon sender drains
+the queue with OUTBOX_CONCURRENCY parallel sends and retries failures with
+exponential backoff (OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE seconds, doubling).
+Jobs left "sending" by a crashed process are picked up again after
+OUTBOX_STALE_SECONDS; the sender refreshes the jobs it has in flight well within
+that window, so a slow live send (e.g. waiting out an EWS back-off) is never
+claimed twice.
+
+Drafts are never queued; they are cheap and callers want the result.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+OUTBOX_DB = os.getenv("OUTBOX_DB", "outbox.db")
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "30"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+OUTBOX_STALE_SECONDS = float(os.getenv("OUTBOX_STALE_SECONDS", "600"))
+
+# Functions the sender may replay (name -> ews_tools2 attribute)
+SENDERS = ("reply_to_email", "send_mail", "send_follow_up", "forward_email")
+
+# Set while the sender replays a job, so the ews_tools2 function sends instead of re-queuing
+_replaying: ContextVar[bool] = ContextVar("outbox_replaying", default=False)
+
+
+def outbox_active() -> bool:
+    """True when sends from this context should be queued."""
+    return OUTBOX_ENABLED and not _replaying.get()
+
+
+class Outbox:
+    """SQLite-backed queue of outbound sends plus the background sender."""
+
+    def __init__(self, db_path: str = OUTBOX_DB, concurrency: int = OUTBOX_CONCURRENCY):
+        self.db_path = db_path
+        self.concurrency = max(1, int(concurrency))
+        self._mailboxes: Dict[str, Dict[str, Any]] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._inflight = threading.Semaphore(self.concurrency)
+        self._inflight_ids: set = set()
+        self._inflight_lock = threading.Lock()
+        self._last_touch = 0.0
+        self._init_db()
+
+    # ----- storage -----
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id TEXT PRIMARY KEY, func TEXT NOT NULL, payload TEXT NOT NULL,"
+                " mailbox_id TEXT, mailbox_email TEXT, status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL,"
+                " last_error TEXT, result TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox(status, next_attempt_at)")
+        finally:
+            conn.close()
+
+    # ----- producer side -----
+    def enqueue(self, func: str, kwargs: Dict[str, Any], mailbox: Optional[Dict[str, Any]] = None) -> str:
+        """Persist one send and wake the sender; returns the queued id."""
+        if func not in SENDERS:
+            raise ValueError(f"Unsupported outbox function '{func}'")
+        job_id = uuid.uuid4().hex[:16]
+        now = time.time()
+        mailbox_id = (mailbox or {}).get("id")
+        if mailbox_id:
+            self._mailboxes[mailbox_id] = mailbox
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO outbox (id, func, payload, mailbox_id, mailbox_email, status, attempts,"
+                " next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'queued', 0, ?, ?, ?)",
+                (job_id, func, json.dumps(kwargs, default=str), mailbox_id, (mailbox or {}).get("email"),
+                 now, now, now),
+            )
+        finally:
+            conn.close()
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Delivery status of one queued send."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT id, func, mailbox_email, status, attempts, next_attempt_at, last_error, result,"
+                " created_at, updated_at FROM outbox WHERE id=?", (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        keys = ("id", "func", "mailbox", "status", "attempts", "next_attempt_at", "last_error", "result",
+                "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status IN ('queued', 'sending')").fetchone()[0]
+        finally:
+            conn.close()
+        return {"counts": counts, "oldest_pending_age_seconds": round(time.time() - oldest, 1) if oldest else 0}
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            ids = [r[0] for r in conn.execute("SELECT id FROM outbox ORDER BY created_at DESC LIMIT ?", (int(limit),))]
+        finally:
+            conn.close()
+        return [s for s in (self.status(i) for i in ids) if s]
+
+    # ----- sender side -----
+    def _claim(self, limit: int) -> List[tuple]:
+        """Atomically move due jobs (and stale 'sending' ones) to 'sending'."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, func, payload, mailbox_id, attempts FROM outbox"
+                " WHERE (status='queued' AND next_attempt_at<=?) OR (status='sending' AND updated_at<?)"
+                " ORDER BY next_attempt_at LIMIT ?",
+                (now, now - OUTBOX_STALE_SECONDS, int(limit)),
+            ).fetchall()
+            for r in rows:
+                conn.execute("UPDATE outbox SET status='sending', updated_at=? WHERE id=?", (now, r[0]))
+            conn.execute("COMMIT")
+            with self._inflight_lock:
+                self._inflight_ids.update(r[0] for r in rows)
+            return rows
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _touch_inflight(self):
+        """Keep in-flight jobs from looking stale to other senders."""
+        now = time.time()
+        if now - self._last_touch < OUTBOX_STALE_SECONDS / 4:
+            return
+        with self._inflight_lock:
+            ids = list(self._inflight_ids)
+        self._last_touch = now
+        if not ids:
+            return
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"UPDATE outbox SET updated_at=? WHERE status='sending' AND id IN ({','.join('?' * len(ids))})",
+                (now, *ids),
+            )
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: str, attempts: int, ok: bool, detail: str):
+        now = time.time()
+        conn = self._connect()
+        try:
+            if ok:
+                conn.execute("UPDATE outbox SET status='sent', attempts=?, result=?, last_error=NULL, updated_at=?"
+                             " WHERE id=?", (attempts, detail, now, job_id))
+            elif attempts >= OUTBOX_MAX_ATTEMPTS:
+                conn.execute("UPDATE outbox SET status='failed', attempts=?, last_error=?, updated_at=? WHERE id=?",
+                             (attempts, detail, now, job_id))
+            else:
+                retry_at = now + OUTBOX_RETRY_BASE * (2 ** (attempts - 1))
+                conn.execute("UPDATE outbox SET status='queued', attempts=?, last_error=?, next_attempt_at=?,"
+                             " updated_at=? WHERE id=?", (attempts, detail, retry_at, now, job_id))
+        finally:
+            conn.close()
+
+    def _mailbox_for(self, mailbox_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not mailbox_id:
+            return None
+        if mailbox_id not in self._mailboxes:
+            from mailbox_registry import list_mailboxes
+            for mb in list_mailboxes():
+                self._mailboxes[mb["id"]] = mb
+        mailbox = self._mailboxes.get(mailbox_id)
+        if mailbox is None:
+            raise RuntimeError(f"Mailbox '{mailbox_id}' is no longer configured")
+        return mailbox
+
+    def _send(self, row: tuple):
+        job_id, func, payload, mailbox_id, attempts = row
+        attempts += 1
+        token = _replaying.set(True)
+        try:
+            import ews_tools2
+            from ews_throttle import ews_priority
+            with ews_tools2.use_mailbox(self._mailbox_for(mailbox_id)), ews_priority("background"):
+                result = getattr(ews_tools2, func)(**json.loads(payload))
+            result = str(result)
+            if result.startswith("[Error"):
+                raise RuntimeError(result)
+            self._finish(job_id, attempts, True, result)
+            logger.info(f"[outbox] {job_id} {func} sent (attempt {attempts})")
+        except Exception as e:
+            self._finish(job_id, attempts, False, str(e)[:1000])
+            logger.warning(f"[outbox] {job_id} {func} attempt {attempts}/{OUTBOX_MAX_ATTEMPTS} failed: {e}")
+        finally:
+            _replaying.reset(token)
+            with self._inflight_lock:
+                self._inflight_ids.discard(job_id)
+            self._inflight.release()
+
+    def drain_once(self) -> int:
+        """Dispatch every due job the concurrency limit allows; returns the number dispatched."""
+        dispatched = 0
+        while True:
+            if not self._inflight.acquire(blocking=False):
+                break
+            rows = self._claim(1)
+            if not rows:
+                self._inflight.release()
+                break
+            self._pool.submit(self._send, rows[0])
+            dispatched += 1
+        return dispatched
+
+    def start(self):
+        """Start the background sender (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._pool = self._pool or ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="outbox-send")
+
+        def _loop():
+            while not self._stop.is_set():
+                try:
+                    self._touch_inflight()
+                    self.drain_once()
+                except Exception as e:
+                    logger.warning(f"[outbox] Drain failed: {e}")
+                self._wake.wait(OUTBOX_POLL_INTERVAL)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=_loop, name="outbox-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Stop the sender after in-flight sends finish (queued jobs stay in the database)."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        if self._pool:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Process-wide outbox with a running sender."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+            _outbox.start()
+    return _outbox
+
+
+def enqueue_send(func: str, kwargs: Dict[str, Any], mailbox: Optional[Dict[str, Any]] = None) -> str:
+    """Queue a send; returns the agent-facing confirmation with the queued id."""
+    job_id = get_outbox().enqueue(func, kwargs, mailbox)
+    return f"Queued for sending (outbox id {job_id}); delivery happens in the background"
+
+
+def outbox_status(job_id: str) -> Optional[Dict[str, Any]]:
+    return get_outbox().status(job_id)
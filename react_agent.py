@@ -6,6 +6,7 @@ ReAct (Reasoning + Acting) Agent Implementation with Streaming Support
 import json
 import logging
 import re
+import time
 from typing import Dict, Any, Optional, List, Callable, Generator
 from datetime import datetime
 from dataclasses import dataclass
@@ -43,6 +44,8 @@ class ReActAgent:
         self.tools = tools
         self.tool_map = {tool.name: tool for tool in tools}
         self.system_prompt = system_prompt
+        # Counters for the most recent run (LLM calls, tokens, tool calls and time)
+        self.last_run_stats: Dict[str, Any] = self._new_run_stats()
         
         # ReAct prompt template - VERY STRICT FORMAT
         self.react_prompt_template = """You are a helpful AI Sales Assistant using the ReAct (Reasoning + Acting) framework.
@@ -215,8 +218,48 @@ Continue (or Final Answer if done):
         
         return data
     
+    @staticmethod
+    def _new_run_stats() -> Dict[str, Any]:
+        return {
+            "llm_calls": 0,
+            "llm_seconds": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "tool_calls": 0,
+            "tool_seconds": 0.0,
+            "tools": {},
+        }
+
+    def _record_llm_usage(self, response, elapsed: float):
+        """Add one LLM call (and its token usage, when reported) to the run stats."""
+        stats = self.last_run_stats
+        stats["llm_calls"] += 1
+        stats["llm_seconds"] += elapsed
+        usage = getattr(response, "usage_metadata", None) or {}
+        if not usage:
+            token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+            usage = {
+                "input_tokens": token_usage.get("prompt_tokens", 0),
+                "output_tokens": token_usage.get("completion_tokens", 0),
+            }
+        stats["prompt_tokens"] += int(usage.get("input_tokens") or 0)
+        stats["completion_tokens"] += int(usage.get("output_tokens") or 0)
+
     def _execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
         """Execute a tool and return cleaned observation"""
+        started = time.perf_counter()
+        try:
+            return self._execute_tool_inner(tool_name, tool_input)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = self.last_run_stats
+            stats["tool_calls"] += 1
+            stats["tool_seconds"] += elapsed
+            per_tool = stats["tools"].setdefault(tool_name, {"calls": 0, "seconds": 0.0})
+            per_tool["calls"] += 1
+            per_tool["seconds"] += elapsed
+
+    def _execute_tool_inner(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
         try:
             if tool_name not in self.tool_map:
                 available = ", ".join(self.tool_map.keys())
@@ -300,6 +343,7 @@ Continue (or Final Answer if done):
         time_context = f"**CURRENT TIME:** {current_time.strftime('%A, %B %d, %Y at %I:%M %p %Z')}\n\n"
         
         iteration = 0
+        self.last_run_stats = self._new_run_stats()
         
         while iteration < max_iterations:
             iteration += 1
@@ -326,10 +370,12 @@ Continue (or Final Answer if done):
                 from langchain_core.messages import HumanMessage
                 
                 # CRITICAL: Stop before LLM can generate fake Observations
+                llm_started = time.perf_counter()
                 response = self.llm.invoke(
                     [HumanMessage(content=full_prompt)],
                     stop=["Observation:", "\nObservation"]
                 )
+                self._record_llm_usage(response, time.perf_counter() - llm_started)
                 llm_output = response.content.strip()
                 logger.debug(f"[ReAct] LLM output: {llm_output[:200]}")
             except Exception as e:
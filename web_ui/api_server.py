@@ -21,8 +21,10 @@ from agent_tools import ALL_TOOLS
 from autopilot import (
     get_autopilot_rules, set_autopilot_rules,
     get_autopilot_period_minutes, set_autopilot_period_minutes,
-    autopilot_once, _load_state, _save_state,
-    get_autopilot_service_enabled, set_autopilot_service_enabled
+    autopilot_sweep_mailboxes, _load_state, _save_state,
+    get_autopilot_service_enabled, set_autopilot_service_enabled,
+    get_triage_config, set_triage_config, get_triage_counters,
+    get_queue_config, set_queue_config, get_autopilot_activity
 )
 from rag_manager import (
     get_active_collection, set_active_collection
@@ -339,6 +341,9 @@ def add_rule():
         "builtin": False,
         "priority": data.get("priority", 2)
     }
+    if data.get("keywords"):
+        # Optional applicability keywords used to prefilter rules per email
+        new_rule["keywords"] = [str(k) for k in data["keywords"] if k]
     
     rules.append(new_rule)
     set_autopilot_rules(rules)
@@ -354,10 +359,59 @@ def delete_rule(rule_id):
 
 @app.route('/api/autopilot/activity', methods=['GET'])
 def get_activity():
-    """Get autopilot activity logs"""
-    state = _load_state()
-    summaries = state.get("autopilot_summaries", [])[:20]
-    return jsonify(summaries)
+    """
+    Get autopilot activity logs (newest first).
+    Query params: limit, cursor, sender, rule, action
+    """
+    page = get_autopilot_activity(
+        limit=request.args.get('limit', 20, type=int),
+        cursor=request.args.get('cursor', type=int),
+        sender=request.args.get('sender') or None,
+        rule=request.args.get('rule') or None,
+        action=request.args.get('action') or None,
+    )
+    return jsonify(page)
+
+@app.route('/api/autopilot/performance', methods=['GET'])
+def get_performance():
+    """
+    Get per-sweep performance records (oldest first) and aggregates.
+    Query params: limit (default 100)
+    """
+    from autopilot_perf import get_perf_records, summarize_perf
+    records = get_perf_records(limit=request.args.get('limit', 100, type=int))
+    return jsonify({"summary": summarize_perf(records), "records": records})
+
+@app.route('/api/autopilot/triage', methods=['GET'])
+def get_triage():
+    """Get triage configuration and per-route counters"""
+    return jsonify({"config": get_triage_config(), "counters": get_triage_counters()})
+
+@app.route('/api/autopilot/triage', methods=['PUT'])
+def update_triage():
+    """Update triage configuration"""
+    data = request.json or {}
+    config = data.get('config')
+    if not isinstance(config, dict):
+        return jsonify({"error": "'config' must be an object"}), 400
+    set_triage_config(config)
+    return jsonify({"success": True})
+
+@app.route('/api/autopilot/queue', methods=['GET'])
+def get_queue():
+    """Get work queue depth, oldest-item age (all mailboxes, or ?mailbox=<id>) and scoring configuration"""
+    from autopilot_queue import get_queue_stats
+    return jsonify({"stats": get_queue_stats(request.args.get('mailbox')), "config": get_queue_config()})
+
+@app.route('/api/autopilot/queue', methods=['PUT'])
+def update_queue():
+    """Update work queue scoring configuration"""
+    data = request.json or {}
+    config = data.get('config')
+    if not isinstance(config, dict):
+        return jsonify({"error": "'config' must be an object"}), 400
+    set_queue_config(config)
+    return jsonify({"success": True})
 
 @app.route('/api/autopilot/service/status', methods=['GET'])
 def service_status():
@@ -434,7 +488,7 @@ def toggle_service():
 def run_manual():
     """Manually trigger autopilot"""
     try:
-        logs = autopilot_once()
+        logs = autopilot_sweep_mailboxes()
         return jsonify({"success": True, "logs": logs})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
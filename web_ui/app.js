@@ -112,6 +112,7 @@ function initTabs() {
             if (tabName === 'knowledge') loadKnowledgeBase();
             if (tabName === 'rules') loadAutopilotRules();
             if (tabName === 'activity') loadAutopilotActivity();
+            if (tabName === 'performance') loadAutopilotPerformance();
             if (tabName === 'plans') loadActionPlans();
             if (tabName === 'connection') loadConnectionInfo();
         });
@@ -661,14 +662,34 @@ function initAutopilotRules() {
 }
 
 // ========== AUTOPILOT ACTIVITY ==========
-async function loadAutopilotActivity() {
+let activityCursor = null;
+
+function initAutopilotActivity() {
+    document.getElementById('activityFilterBtn').addEventListener('click', () => loadAutopilotActivity());
+    document.getElementById('activityMoreBtn').addEventListener('click', () => loadAutopilotActivity(true));
+}
+
+async function loadAutopilotActivity(append = false) {
     try {
-        const summaries = await api.get('/api/autopilot/activity');
+        const params = new URLSearchParams({ limit: 20 });
+        const sender = document.getElementById('activitySender').value.trim();
+        const rule = document.getElementById('activityRule').value.trim();
+        const action = document.getElementById('activityAction').value.trim();
+        if (sender) params.set('sender', sender);
+        if (rule) params.set('rule', rule);
+        if (action) params.set('action', action);
+        if (append && activityCursor) params.set('cursor', activityCursor);
+
+        const page = await api.get(`/api/autopilot/activity?${params.toString()}`);
+        const summaries = page.items || [];
+        activityCursor = page.next_cursor;
 
         const container = document.getElementById('activitySummaries');
-        container.innerHTML = '';
+        const moreBtn = document.getElementById('activityMoreBtn');
+        if (!append) container.innerHTML = '';
+        moreBtn.classList.toggle('hidden', !activityCursor);
 
-        if (summaries.length === 0) {
+        if (!append && summaries.length === 0) {
             container.innerHTML = '<p class="info-message">No autopilot actions recorded yet</p>';
             return;
         }
@@ -684,6 +705,7 @@ async function loadAutopilotActivity() {
                 <div class="expander-content">
                     <p><strong>From:</strong> ${escapeHtml(summary.from || '')}</p>
                     <p><strong>Action:</strong> <code>${summary.action || ''}</code></p>
+                    ${(summary.rules || []).length ? `<p><strong>Rules:</strong> ${escapeHtml(summary.rules.join(', '))}</p>` : ''}
                     <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem; margin-top: 1rem;">
                         <div>
                             <p><strong>Email Content:</strong></p>
@@ -704,6 +726,56 @@ async function loadAutopilotActivity() {
     }
 }
 
+// ========== AUTOPILOT PERFORMANCE ==========
+async function loadAutopilotPerformance() {
+    try {
+        const data = await api.get('/api/autopilot/performance?limit=100');
+        const summary = data.summary || {};
+        const records = data.records || [];
+
+        const summaryEl = document.getElementById('perfSummary');
+        const sweepsEl = document.getElementById('perfSweeps');
+        sweepsEl.innerHTML = '';
+
+        if (!summary.sweeps) {
+            summaryEl.textContent = 'No sweep performance records yet';
+            return;
+        }
+
+        const phases = Object.entries(summary.avg_phase_s || {})
+            .map(([name, secs]) => `${escapeHtml(name)}: ${secs}s`).join(' · ');
+        summaryEl.innerHTML = `
+            <p><strong>${summary.sweeps}</strong> sweeps — avg <strong>${summary.avg_sweep_s}s</strong>,
+               p95 <strong>${summary.p95_sweep_s}s</strong>, avg agent/email <strong>${summary.avg_agent_s}s</strong></p>
+            <p>Emails: ${summary.emails} · LLM calls: ${summary.llm_calls} · Tokens: ${summary.tokens} ·
+               Tool calls: ${summary.tool_calls} · EWS requests: ${summary.ews_requests}</p>
+            <p><strong>Avg phase time:</strong> ${phases || 'n/a'}</p>
+        `;
+
+        const maxTotal = Math.max(...records.map(r => r.total_s || 0), 0.001);
+        records.slice().reverse().slice(0, 30).forEach(record => {
+            const item = document.createElement('div');
+            item.className = 'expander';
+            const started = new Date((record.ts || 0) * 1000).toLocaleString();
+            const width = Math.round(((record.total_s || 0) / maxTotal) * 100);
+            item.innerHTML = `
+                <div class="expander-header" onclick="this.parentElement.classList.toggle('expanded')">
+                    <span>⏰ ${started} — ${record.total_s}s — ${escapeHtml(record.status || '')}</span>
+                    <span style="flex: 1; margin: 0 1rem;"><span style="display: inline-block; height: 6px; width: ${width}%; background: currentColor; opacity: 0.4;"></span></span>
+                    <span>▶</span>
+                </div>
+                <div class="expander-content">
+                    <pre class="code-block">${escapeHtml(JSON.stringify({ phases: record.phases, counters: record.counters, emails: record.emails }, null, 2))}</pre>
+                </div>
+            `;
+            sweepsEl.appendChild(item);
+        });
+
+    } catch (error) {
+        showToast(`Error loading performance: ${error.message}`, 'error');
+    }
+}
+
 // ========== ACTION PLANS ==========
 async function loadActionPlans() {
     try {
@@ -1144,6 +1216,7 @@ document.addEventListener('DOMContentLoaded', () => {
     initChat();
     initKnowledgeBase();
     initAutopilotRules();
+    initAutopilotActivity();
     initActionPlans();
     initConnectionSettings();
     initSidebar();